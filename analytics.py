@@ -0,0 +1,213 @@
+"""
+人工客服插件 - 统计分析
+按小时、按客服累计请求、接入、消息等计数，内存中使用固定大小的滚动小时桶，
+定期写入磁盘；过期的小时桶合并为按天汇总，统计查询无需扫描原始日志
+"""
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+
+# 状态变化事件 → 计数项
+EVENT_COUNTERS = {
+    "transfer": "requests",
+    "queue": "requests",
+    "accept": "accepted",
+    "reject": "rejected",
+    "cancel": "abandoned",
+    "user_end": "ended",
+    "end": "ended",
+    "timeout": "timed_out",
+    "queue_timeout": "queue_timed_out",
+    "blacklist": "blacklisted",
+}
+
+# 计数项的显示名称（按显示顺序排列）
+COUNTER_NAMES = {
+    "requests": "转人工请求",
+    "accepted": "接入",
+    "rejected": "拒绝",
+    "abandoned": "用户放弃",
+    "ended": "正常结束",
+    "timed_out": "对话超时",
+    "queue_timed_out": "排队超时",
+    "blacklisted": "拉黑",
+    "msg_to_user": "客服→用户消息",
+    "msg_to_servicer": "用户→客服消息",
+    "translations": "翻译调用",
+}
+
+
+class AnalyticsStore:
+    """按小时滚动的统计存储
+
+    autoload=False 时由调用方通过 load_async() 在线程中加载数据文件，加载前记录的计数会与文件中的
+    计数合并，保存推迟到加载完成后进行。
+    """
+
+    def __init__(
+        self,
+        data_file: str | None = None,
+        hours: int = 8 * 24,
+        daily_retention: int = 90,
+        save_interval: float = 300,
+        autoload: bool = True,
+    ):
+        self.data_file = data_file
+        self.hours = hours
+        self.daily_retention = daily_retention
+        self.save_interval = save_interval
+        # 滚动小时桶：第 i 个槽位保存 小时序号 % hours == i 的那一小时，{客服QQ号: Counter}
+        self._slot_hours: list[int] = [-1] * hours
+        self._slots: list[dict[str, Counter]] = [{} for _ in range(hours)]
+        # 按天汇总：{"YYYY-MM-DD": {客服QQ号: {计数项: 数量}}}
+        self._daily: dict[str, dict[str, dict[str, int]]] = {}
+        self._task: asyncio.Task | None = None
+        self._dirty = False
+        self._loaded = False
+        if autoload:
+            self.load()
+
+    # ---------- 记录 ----------
+
+    def record_event(self, event_type: str, servicer_id: str | None = None):
+        """记录一次状态变化事件"""
+        counter = EVENT_COUNTERS.get(event_type)
+        if counter:
+            self.incr(counter, servicer_id)
+
+    def incr(self, counter: str, servicer_id: str | None = None, amount: int = 1):
+        """累加当前小时的计数"""
+        hour = int(time.time() // 3600)
+        slot = hour % self.hours
+        if self._slot_hours[slot] != hour:
+            # 槽位中是更早的小时，合并到按天汇总后复用
+            self._archive_slot(slot)
+            self._slot_hours[slot] = hour
+        self._slots[slot].setdefault(servicer_id or "", Counter())[counter] += amount
+        self._dirty = True
+
+        if self.data_file and (self._task is None or self._task.done()):
+            try:
+                self._task = asyncio.get_running_loop().create_task(self._run())
+            except RuntimeError:
+                pass
+
+    def _archive_slot(self, slot: int):
+        hour = self._slot_hours[slot]
+        if hour >= 0 and self._slots[slot]:
+            day = time.strftime("%Y-%m-%d", time.localtime(hour * 3600))
+            self._add_daily(day, self._slots[slot])
+        self._slots[slot] = {}
+
+    def _add_daily(self, day: str, servicers: dict):
+        daily = self._daily.setdefault(day, {})
+        for servicer_id, counters in servicers.items():
+            totals = daily.setdefault(servicer_id, {})
+            for counter, value in counters.items():
+                totals[counter] = totals.get(counter, 0) + value
+        # 只保留最近的按天汇总
+        for old_day in sorted(self._daily)[:-self.daily_retention]:
+            del self._daily[old_day]
+
+    # ---------- 查询 ----------
+
+    def summarize(self, since: float) -> dict[str, Counter]:
+        """汇总 since 时间戳之后各客服的计数（按整点小时对齐）"""
+        since_hour = int(since // 3600)
+        current_hour = int(time.time() // 3600)
+        result: dict[str, Counter] = {}
+        for slot, hour in enumerate(self._slot_hours):
+            if since_hour <= hour <= current_hour and hour > current_hour - self.hours:
+                for servicer_id, counters in self._slots[slot].items():
+                    result.setdefault(servicer_id, Counter()).update(counters)
+        return result
+
+    # ---------- 持久化 ----------
+
+    async def _run(self):
+        """后台定期保存"""
+        while True:
+            await asyncio.sleep(self.save_interval)
+            await self.save_async()
+
+    async def save_async(self):
+        # 数据文件尚未加载时不能保存，否则会覆盖文件中的历史计数
+        if self._dirty and self._loaded:
+            self._dirty = False
+            data = self._snapshot()
+            await asyncio.to_thread(self._write, data)
+
+    async def close(self):
+        """停止后台任务并保存（插件卸载时调用）"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.save_async()
+
+    def _snapshot(self) -> dict:
+        hours = {
+            str(hour): {sid: dict(counters) for sid, counters in self._slots[slot].items()}
+            for slot, hour in enumerate(self._slot_hours)
+            if hour >= 0 and self._slots[slot]
+        }
+        # 按天汇总在写入线程中序列化期间仍可能被合并修改，同样需要复制
+        daily = {
+            day: {sid: dict(counters) for sid, counters in servicers.items()}
+            for day, servicers in self._daily.items()
+        }
+        return {"version": 1, "hours": hours, "daily": daily}
+
+    def _write(self, data: dict):
+        if not self.data_file:
+            return
+        tmp_file = f"{self.data_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, self.data_file)
+
+    def load(self):
+        """从数据文件加载（同步读取，事件循环中请使用 load_async）"""
+        self._merge(self._read_data_file())
+        self._loaded = True
+
+    async def load_async(self):
+        """在线程中读取数据文件，再在事件循环中与已记录的计数合并
+
+        数据文件无法解析时将其另存为 .broken 文件后重新抛出异常，已记录的计数保留，之后可以正常保存。
+        """
+        try:
+            self._merge(await asyncio.to_thread(self._read_data_file))
+        except Exception:
+            await asyncio.to_thread(self._set_aside_data_file)
+            raise
+        finally:
+            self._loaded = True
+
+    def _read_data_file(self) -> dict:
+        if not self.data_file or not os.path.exists(self.data_file):
+            return {}
+        with open(self.data_file, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _set_aside_data_file(self):
+        if self.data_file and os.path.exists(self.data_file):
+            os.replace(self.data_file, f"{self.data_file}.broken")
+
+    def _merge(self, data: dict):
+        for day, servicers in data.get("daily", {}).items():
+            self._add_daily(day, servicers)
+        current_hour = int(time.time() // 3600)
+        for hour_text, servicers in sorted(data.get("hours", {}).items(), key=lambda item: int(item[0])):
+            hour = int(hour_text)
+            slot = hour % self.hours
+            if hour <= current_hour - self.hours or hour < self._slot_hours[slot]:
+                # 已超出滚动窗口（或槽位已被更新的小时占用）的小时直接合并到按天汇总
+                self._add_daily(time.strftime("%Y-%m-%d", time.localtime(hour * 3600)), servicers)
+                continue
+            if self._slot_hours[slot] != hour:
+                self._archive_slot(slot)
+                self._slot_hours[slot] = hour
+            for servicer_id, counters in servicers.items():
+                self._slots[slot].setdefault(servicer_id, Counter()).update(counters)
@@ -0,0 +1,82 @@
+"""
+人工客服插件 - 审计日志
+记录转人工、接入、拒绝、结束、超时、拉黑等状态变化，
+先写入内存环形缓冲区，由后台任务批量写入按大小轮转的 JSONL 文件，记录时不阻塞事件循环
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+
+class AuditLogger:
+    """审计日志记录器"""
+
+    def __init__(
+        self,
+        log_dir: str,
+        flush_interval: float = 5.0,
+        buffer_size: int = 10000,
+        max_bytes: int = 5 * 1024 * 1024,
+        backup_count: int = 5,
+    ):
+        self.log_dir = str(log_dir)
+        self.log_file = os.path.join(self.log_dir, "audit.jsonl")
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        # 环形缓冲区：写入速度跟不上时丢弃最旧的记录，内存占用有上限
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._task: asyncio.Task | None = None
+        self.dropped_count = 0
+
+    def emit(self, event_type: str, **fields):
+        """记录一条事件（只写入内存，立即返回）"""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped_count += 1
+        self._buffer.append({"ts": round(time.time(), 3), "event": event_type, **fields})
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """后台定期批量写入"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """将缓冲区中的记录写入文件"""
+        if not self._buffer:
+            return
+        batch = []
+        while self._buffer:
+            batch.append(self._buffer.popleft())
+        await asyncio.to_thread(self._write, batch)
+
+    async def close(self):
+        """停止后台任务并写入剩余记录（插件卸载时调用）"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def _write(self, batch: list[dict]):
+        os.makedirs(self.log_dir, exist_ok=True)
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) >= self.max_bytes:
+            self._rotate()
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            for record in batch:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _rotate(self):
+        """轮转日志：audit.jsonl → audit.jsonl.1 → audit.jsonl.2 ...，超出保留数量的删除"""
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.log_file}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.log_file}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.log_file, f"{self.log_file}.1")
+        else:
+            os.remove(self.log_file)
@@ -0,0 +1,125 @@
+"""
+人工客服插件 - 审计日志报表
+离线统计审计日志中的排队等待时长和对话处理时长分位数
+
+用法：python audit_report.py <审计日志目录或文件> [...]
+"""
+import glob
+import json
+import math
+import os
+import sys
+from collections import defaultdict
+
+# 结束一次对话的事件类型
+END_EVENTS = {"end", "user_end", "timeout", "blacklist"}
+# 结束等待（未被接入）的事件类型
+ABANDON_EVENTS = {"cancel", "reject", "queue_timeout", "blacklist"}
+
+
+def collect_files(paths: list[str]) -> list[str]:
+    """收集日志文件，按从旧到新排列（audit.jsonl.N 越大越旧）"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "audit.jsonl*")))
+        else:
+            files.append(path)
+
+    def age(file: str) -> int:
+        suffix = file.rsplit(".", 1)[-1]
+        return int(suffix) if suffix.isdigit() else 0
+
+    return sorted(set(files), key=age, reverse=True)
+
+
+def read_records(files: list[str]):
+    for file in files:
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """最近秩法计算分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def build_report(records) -> dict:
+    """统计等待时长和处理时长
+
+    等待时长：用户转人工（或加入排队）到客服接入
+    处理时长：客服接入到对话结束（客服结束、用户结束、超时或被拉黑）
+    """
+    waiting_since: dict[str, float] = {}
+    accepted_at: dict[str, tuple[float, str]] = {}
+    wait_times: dict[str, list[float]] = defaultdict(list)
+    handle_times: dict[str, list[float]] = defaultdict(list)
+    counts: dict[str, int] = defaultdict(int)
+
+    for record in records:
+        event_type = record.get("event")
+        user_id = str(record.get("user_id", ""))
+        ts = record.get("ts", 0)
+        counts[event_type] += 1
+
+        if event_type in ("transfer", "queue"):
+            # 同一次请求可能先转人工再排队，以最早时间为准
+            waiting_since.setdefault(user_id, ts)
+        elif event_type == "accept":
+            servicer_id = str(record.get("servicer_id", ""))
+            if user_id in waiting_since:
+                wait_times[servicer_id].append(ts - waiting_since.pop(user_id))
+            accepted_at[user_id] = (ts, servicer_id)
+        if event_type in END_EVENTS and user_id in accepted_at:
+            started, servicer_id = accepted_at.pop(user_id)
+            handle_times[servicer_id].append(ts - started)
+        if event_type in ABANDON_EVENTS:
+            waiting_since.pop(user_id, None)
+
+    return {"counts": dict(counts), "wait": dict(wait_times), "handle": dict(handle_times)}
+
+
+def format_report(report: dict) -> str:
+    lines = ["事件计数："]
+    for event_type, count in sorted(report["counts"].items()):
+        lines.append(f"  {event_type}: {count}")
+
+    for title, key in (("排队等待时长（秒）", "wait"), ("对话处理时长（秒）", "handle")):
+        lines.append(f"\n{title}：")
+        groups = dict(report[key])
+        groups["全部"] = [value for values in report[key].values() for value in values]
+        for servicer_id, values in groups.items():
+            if not values:
+                continue
+            lines.append(
+                f"  {servicer_id}: n={len(values)} "
+                f"p50={percentile(values, 50):.1f} p90={percentile(values, 90):.1f} "
+                f"p99={percentile(values, 99):.1f} max={max(values):.1f}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv: list[str]) -> int:
+    if not argv:
+        print(__doc__.strip())
+        return 1
+    files = collect_files(argv)
+    if not files:
+        print("未找到审计日志文件")
+        return 1
+    print(format_report(build_report(read_records(files))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,16 @@
+"""
+基准测试公共代码：将插件目录注册为包，模块之间的相对导入可以正常解析
+"""
+import sys
+import types
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+PACKAGE_NAME = "human_service"
+
+
+def register_plugin_package():
+    if PACKAGE_NAME not in sys.modules:
+        package = types.ModuleType(PACKAGE_NAME)
+        package.__path__ = [str(PLUGIN_DIR)]
+        sys.modules[PACKAGE_NAME] = package
@@ -0,0 +1,60 @@
+"""
+活动沉默模式规则基准测试：模拟混合消息流，测量每条消息的判定耗时
+
+用法：python benchmarks/bench_silence_rules.py [消息数量]
+"""
+import random
+import sys
+import time
+
+from _support import register_plugin_package
+
+register_plugin_package()
+
+from human_service.silence_rules import SilenceRuleEngine  # noqa: E402
+
+# 目标吞吐量（条/秒）
+TARGET_RATE = 10_000
+
+
+def build_engine(active_users: int = 200) -> SilenceRuleEngine:
+    sessions = {str(100000 + i): {"status": "connected"} for i in range(active_users)}
+    selections = {str(200000 + i): {} for i in range(active_users // 4)}
+    return SilenceRuleEngine(
+        True,
+        [str(900 + i) for i in range(10)],
+        (sessions, selections, {}),
+        ["签到", "天气", "点歌"],
+        ["/", "#"],
+    )
+
+
+def build_events(count: int, seed: int = 0) -> list[tuple[str, str]]:
+    """生成混合消息：普通聊天、本插件命令、放行的其他命令、客服和会话中用户的消息"""
+    rng = random.Random(seed)
+    texts = ["你好", "在吗", "/转人工", "/天气 北京", "#签到", "/签到成功", "哈哈哈哈哈哈" * 5, "/kfhelp"]
+    senders = [str(300000 + i) for i in range(5000)] + [str(100000 + i) for i in range(50)] + ["900"]
+    return [(rng.choice(senders), rng.choice(texts)) for _ in range(count)]
+
+
+def run(count: int = 100_000) -> float:
+    """返回每秒可判定的消息数"""
+    engine = build_engine()
+    events = build_events(count)
+    should_block = engine.should_block
+    started = time.perf_counter()
+    for sender_id, text in events:
+        should_block(sender_id, text)
+    elapsed = time.perf_counter() - started
+    return count / elapsed
+
+
+def main(argv: list[str]) -> int:
+    count = int(argv[0]) if argv else 100_000
+    rate = run(count)
+    print(f"{count} 条消息，{1_000_000 / rate:.2f} µs/条，{rate:,.0f} 条/秒（目标 {TARGET_RATE:,} 条/秒）")
+    return 0 if rate >= TARGET_RATE else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
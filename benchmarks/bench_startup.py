@@ -0,0 +1,150 @@
+"""
+插件启动基准测试：测量导入 main 模块和构造插件实例的耗时，并检查可选组件是否被提前加载
+
+未安装 AstrBot 时使用最小的桩模块代替；插件目录中没有 managers/helpers 包时也使用桩模块，
+此时只能测得插件自身代码的开销，脚本以非零状态退出。
+
+用法：python benchmarks/bench_startup.py [构造次数]
+"""
+import importlib
+import importlib.util
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+
+from _support import PACKAGE_NAME, PLUGIN_DIR, register_plugin_package
+
+# 未启用翻译时不应在启动阶段加载的第三方模块
+LAZY_THIRD_PARTY = ("openai",)
+# 关闭对应功能时不应在启动阶段加载的插件模块
+LAZY_MODULES = (
+    "blacklist_store",
+    "nickname_resolver",
+    "coalescer",
+    "audit_log",
+    "analytics",
+    "quick_reply",
+    "shared_state",
+    "profiler",
+)
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+def install_astrbot_stubs(data_dir: Path):
+    """安装 AstrBot 桩模块（只包含插件导入和构造时用到的名称）"""
+    import logging
+
+    def passthrough(*args, **kwargs):
+        return lambda func: func
+
+    class Star:
+        def __init__(self, context):
+            self.context = context
+
+    class StarTools:
+        @staticmethod
+        def get_data_dir(name):
+            return data_dir
+
+    class Component:
+        def __init__(self, *args, **kwargs):
+            pass
+
+    event_filter = types.SimpleNamespace(
+        command=passthrough,
+        event_message_type=passthrough,
+        EventMessageType=types.SimpleNamespace(ALL="all"),
+    )
+    for name in (
+        "astrbot", "astrbot.core", "astrbot.core.config", "astrbot.core.message",
+        "astrbot.core.platform", "astrbot.core.platform.sources", "astrbot.core.platform.sources.aiocqhttp",
+    ):
+        _module(name, __path__=[])
+    _module("astrbot.api", logger=logging.getLogger("astrbot"), __path__=[])
+    _module("astrbot.api.event", filter=event_filter)
+    _module("astrbot.api.star", Context=object, Star=Star, StarTools=StarTools, register=passthrough)
+    _module("astrbot.core.config.astrbot_config", AstrBotConfig=dict)
+    _module("astrbot.core.message.components", Plain=Component, Reply=Component)
+    _module("astrbot.core.message.message_event_result", MessageChain=list)
+    _module("astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event", AiocqhttpMessageEvent=object)
+
+
+class _StubManager:
+    def __init__(self, *args, **kwargs):
+        self.servicer_queue = {}
+        self.session_map = {}
+        self.selection_map = {}
+        self.blacklist_view_selection = {}
+        self.timers = {}
+
+
+# managers/helpers 包的桩（只包含 main 导入的名称）
+_STUB_PACKAGES = {
+    "managers": ("QueueManager", "SessionManager", "TimeoutManager", "CommandHandler", "TranslationService"),
+    "helpers": ("HelpTextBuilder", "MessageRouter", "ChatHistoryExporter"),
+}
+
+
+def install_manager_stubs() -> list[str]:
+    """插件目录中没有 managers/helpers 包时安装桩模块，返回使用了桩的包名"""
+    stubbed = []
+    for package, names in _STUB_PACKAGES.items():
+        if (PLUGIN_DIR / package).is_dir():
+            continue
+        _module(f"{PACKAGE_NAME}.{package}", __path__=[], **{name: _StubManager for name in names})
+        stubbed.append(package)
+    return stubbed
+
+
+class StubContext:
+    def get_config(self):
+        return {"admins_id": ["10000"], "wake_prefix": ["/"]}
+
+
+def run(count: int = 200) -> dict:
+    data_dir = Path(tempfile.mkdtemp(prefix="human_service_bench_"))
+    register_plugin_package()
+    if importlib.util.find_spec("astrbot") is None:
+        install_astrbot_stubs(data_dir)
+    stubbed = install_manager_stubs()
+
+    started = time.perf_counter()
+    main = importlib.import_module(f"{PACKAGE_NAME}.main")
+    import_seconds = time.perf_counter() - started
+
+    config = {"servicers_id": ["10001", "10002"], "enable_translation": False}
+    started = time.perf_counter()
+    for _ in range(count):
+        main.HumanServicePlugin(StubContext(), config)
+    init_seconds = (time.perf_counter() - started) / count
+
+    loaded = [name for name in LAZY_MODULES if f"{PACKAGE_NAME}.{name}" in sys.modules]
+    loaded += [name for name in LAZY_THIRD_PARTY if name in sys.modules]
+    return {"import": import_seconds, "init": init_seconds, "loaded": loaded, "stubbed": stubbed}
+
+
+def main(argv: list[str]) -> int:
+    result = run(int(argv[0]) if argv else 200)
+    print(f"导入 main：{result['import'] * 1000:.1f} ms")
+    print(f"构造插件：{result['init'] * 1000:.3f} ms/次")
+    if result["loaded"]:
+        print(f"❌ 启动时加载了可选模块：{', '.join(result['loaded'])}")
+        return 1
+    if result["stubbed"]:
+        # 桩包没有真实的 __init__，无法反映 managers/helpers 包在导入时加载的模块（如翻译服务的 openai）
+        print(f"❌ 插件目录中没有 {', '.join(result['stubbed'])} 包，以上结果基于桩模块，不代表真实插件")
+        return 2
+    print("✅ 启动时未加载任何可选模块")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,322 @@
+"""
+人工客服插件 - 黑名单存储
+基于集合的黑名单引擎，支持共用/独立黑名单、临时拉黑、批量导入导出和持久化
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from itertools import islice
+from pathlib import Path
+
+
+class BlacklistStore:
+    """黑名单存储
+
+    所有名单保存在 {范围: {QQ号: 到期时间戳}} 中，范围为 SHARED（共用名单）或客服QQ号，
+    到期时间为0表示永久拉黑。另维护 {QQ号: {范围}} 反向索引，
+    判断某个用户被哪些客服拉黑只需一次字典查询。
+
+    修改后不立即写盘：在事件循环中运行时，save_delay 秒内的多次修改合并为一次保存，
+    由后台任务在线程中写入名单快照。autoload=False 时由调用方通过 load_async() 在线程中加载，
+    加载完成前的修改会保留，保存推迟到加载完成后进行，不会覆盖尚未读取的数据文件。
+    """
+
+    SHARED = "*"
+    # 导出文件的首行标记，带有该标记的文件中 "QQ号,到期时间戳" 才按导出格式解析
+    EXPORT_HEADER = "# human_service blacklist export v1"
+
+    def __init__(
+        self,
+        servicers_id: list[str],
+        share_blacklist: bool,
+        data_file: Path | None = None,
+        save_delay: float = 1.0,
+        autoload: bool = True,
+    ):
+        self.servicers_id = servicers_id
+        self.share_blacklist = share_blacklist
+        self.data_file = data_file
+        self.save_delay = save_delay
+        self._lists: dict[str, dict[str, float]] = {}
+        self._index: dict[str, set[str]] = {}
+        self._dirty = False
+        self._save_task: asyncio.Task | None = None
+        self._loaded = False
+        if autoload:
+            self.load()
+
+    # ---------- 查询 ----------
+
+    def _scope(self, servicer_id: str | None) -> str:
+        """根据共用设置得到写入的名单范围"""
+        if self.share_blacklist or not servicer_id:
+            return self.SHARED
+        return str(servicer_id)
+
+    def get_scopes(self, user_id: str) -> set[str]:
+        """获取拉黑了该用户的所有名单范围（会顺带清理已到期的条目）"""
+        scopes = self._index.get(str(user_id))
+        if not scopes:
+            return set()
+
+        now = time.time()
+        expired = [
+            scope for scope in scopes
+            if 0 < self._lists[scope][str(user_id)] <= now
+        ]
+        for scope in expired:
+            self._discard(str(user_id), scope)
+        if expired:
+            self.save()
+        return self._index.get(str(user_id), set())
+
+    def is_blacklisted(self, user_id: str, servicer_id: str = None) -> bool:
+        """检查用户是否被拉黑
+
+        共用名单中的用户对所有客服都生效；指定客服时还检查该客服的独立名单。
+        未指定客服且为独立黑名单时，仅当所有客服都拉黑了该用户才视为拉黑。
+        """
+        scopes = self.get_scopes(user_id)
+        if not scopes:
+            return False
+        if self.SHARED in scopes:
+            return True
+        if servicer_id:
+            return str(servicer_id) in scopes
+        return not self.share_blacklist and all(str(sid) in scopes for sid in self.servicers_id)
+
+    def filter_servicers(self, user_id: str, servicer_ids: list[str]) -> list[str]:
+        """返回未拉黑该用户的客服列表"""
+        scopes = self.get_scopes(user_id)
+        if not scopes:
+            return list(servicer_ids)
+        if self.SHARED in scopes:
+            return []
+        return [sid for sid in servicer_ids if str(sid) not in scopes]
+
+    def get_blacklist(self, servicer_id: str = None) -> list[str]:
+        """获取名单中的全部QQ号"""
+        self.purge_expired()
+        return list(self._lists.get(self._scope(servicer_id), {}))
+
+    def get_count(self, servicer_id: str = None) -> int:
+        self.purge_expired()
+        return len(self._lists.get(self._scope(servicer_id), {}))
+
+    def get_page(self, servicer_id: str = None, page: int = 1, page_size: int = 20) -> tuple[list[str], int]:
+        """分页获取名单，返回 (本页QQ号列表, 总页数)"""
+        self.purge_expired()
+        entries = self._lists.get(self._scope(servicer_id), {})
+        total_pages = max(1, (len(entries) + page_size - 1) // page_size)
+        page = min(max(page, 1), total_pages)
+        start = (page - 1) * page_size
+        return list(islice(entries, start, start + page_size)), total_pages
+
+    def get_expire_time(self, user_id: str, servicer_id: str = None) -> float:
+        """获取拉黑到期时间戳，0表示永久，不在名单中返回-1"""
+        return self._lists.get(self._scope(servicer_id), {}).get(str(user_id), -1)
+
+    # ---------- 修改 ----------
+
+    def add(self, user_id: str, servicer_id: str = None, duration: int = 0):
+        """拉黑用户，duration 为拉黑时长（秒），0表示永久"""
+        self._add(str(user_id), self._scope(servicer_id), time.time() + duration if duration > 0 else 0)
+        self.save()
+
+    def remove(self, user_id: str, servicer_id: str = None) -> bool:
+        """取消拉黑，用户不在名单中时返回False"""
+        removed = self._discard(str(user_id), self._scope(servicer_id))
+        if removed:
+            self.save()
+        return removed
+
+    def purge_expired(self) -> int:
+        """清理所有已到期的临时拉黑，返回清理数量"""
+        now = time.time()
+        expired = [
+            (user_id, scope)
+            for scope, entries in self._lists.items()
+            for user_id, expire_at in entries.items()
+            if 0 < expire_at <= now
+        ]
+        for user_id, scope in expired:
+            self._discard(user_id, scope)
+        if expired:
+            self.save()
+        return len(expired)
+
+    def _add(self, user_id: str, scope: str, expire_at: float):
+        self._lists.setdefault(scope, {})[user_id] = expire_at
+        self._index.setdefault(user_id, set()).add(scope)
+
+    def _discard(self, user_id: str, scope: str) -> bool:
+        entries = self._lists.get(scope)
+        if not entries or user_id not in entries:
+            return False
+        del entries[user_id]
+        scopes = self._index.get(user_id)
+        if scopes is not None:
+            scopes.discard(scope)
+            if not scopes:
+                del self._index[user_id]
+        return True
+
+    # ---------- 批量导入导出 ----------
+
+    @classmethod
+    def parse_import_file(cls, path: str, duration: int = 0) -> tuple[list[tuple[str, float]], int]:
+        """解析导入文件（只读取文件，不修改名单，可在线程中执行）
+
+        每行一个QQ号，也可用逗号或空白分隔；首行为 EXPORT_HEADER 的导出文件中，
+        "QQ号,到期时间戳" 会保留原到期时间，已到期的条目跳过。
+        返回 ([(QQ号, 到期时间戳)], 跳过的无效条目数量)
+        """
+        now = time.time()
+        default_expire = now + duration if duration > 0 else 0
+        entries = []
+        skipped = 0
+        export_format = False
+
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f):
+                line = line.strip()
+                if line_no == 0 and line == cls.EXPORT_HEADER:
+                    export_format = True
+                    continue
+                if not line or line.startswith("#"):
+                    continue
+
+                if export_format and (match := re.fullmatch(r"(\d+)\s*,\s*(\d+(?:\.\d+)?)", line)):
+                    expire_at = float(match.group(2))
+                    if expire_at <= now:
+                        skipped += 1
+                    else:
+                        entries.append((match.group(1), expire_at))
+                    continue
+
+                for token in re.split(r"[\s,，;；]+", line):
+                    if token.isdigit():
+                        entries.append((token, default_expire))
+                    elif token:
+                        skipped += 1
+        return entries, skipped
+
+    def apply_import(self, entries: list[tuple[str, float]], servicer_id: str = None) -> int:
+        """将解析出的条目加入名单，返回导入数量"""
+        scope = self._scope(servicer_id)
+        for user_id, expire_at in entries:
+            self._add(user_id, scope, expire_at)
+        if entries:
+            self.save()
+        return len(entries)
+
+    def import_file(self, path: str, servicer_id: str = None, duration: int = 0) -> tuple[int, int]:
+        """解析并导入文件，返回 (导入数量, 跳过的无效条目数量)"""
+        entries, skipped = self.parse_import_file(path, duration)
+        return self.apply_import(entries, servicer_id), skipped
+
+    def export_lines(self, servicer_id: str = None) -> list[str]:
+        """生成导出内容（首行为 EXPORT_HEADER，其后每行 QQ号 或 QQ号,到期时间戳）"""
+        self.purge_expired()
+        entries = self._lists.get(self._scope(servicer_id), {})
+        lines = [
+            f"{user_id},{int(expire_at)}" if expire_at else user_id
+            for user_id, expire_at in entries.items()
+        ]
+        return [self.EXPORT_HEADER, *lines]
+
+    @staticmethod
+    def write_export(path: str, lines: list[str]) -> int:
+        """写入导出文件（可在线程中执行），返回导出的QQ号数量"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return len(lines) - 1
+
+    def export_file(self, path: str, servicer_id: str = None) -> int:
+        """导出名单到文本文件，返回导出数量"""
+        return self.write_export(path, self.export_lines(servicer_id))
+
+    # ---------- 持久化 ----------
+
+    def load(self):
+        """从数据文件加载黑名单（同步读取，事件循环中请使用 load_async）"""
+        self._lists = {}
+        self._index = {}
+        self._merge(self._read_data_file())
+        self._loaded = True
+
+    async def load_async(self):
+        """在线程中读取数据文件，再在事件循环中合并到名单（名单中已有的条目保持不变）
+
+        数据文件无法解析时将其另存为 .broken 文件后重新抛出异常，名单保留已有内容，之后可以正常保存。
+        """
+        try:
+            self._merge(await asyncio.to_thread(self._read_data_file))
+        except Exception:
+            await asyncio.to_thread(self._set_aside_data_file)
+            raise
+        finally:
+            self._loaded = True
+            if self._dirty:
+                self.save()
+
+    def _read_data_file(self) -> dict:
+        if not self.data_file or not os.path.exists(self.data_file):
+            return {}
+        with open(self.data_file, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _set_aside_data_file(self):
+        if self.data_file and os.path.exists(self.data_file):
+            os.replace(self.data_file, f"{self.data_file}.broken")
+
+    def _merge(self, data: dict):
+        for scope, entries in data.get("lists", {}).items():
+            current = self._lists.get(scope, {})
+            for user_id, expire_at in entries.items():
+                if str(user_id) not in current:
+                    self._add(str(user_id), scope, float(expire_at))
+
+    def save(self):
+        """标记名单已修改；在事件循环中运行时延迟合并保存，否则立即写入（加载完成前只做标记）"""
+        self._dirty = True
+        if not self._loaded:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._dirty = False
+            self._write(self._snapshot())
+            return
+        if self._save_task is None or self._save_task.done():
+            self._save_task = loop.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(self.save_delay)
+        # 同一时间只有这一个任务写文件，写入期间的新修改在下一轮保存
+        while self._dirty:
+            self._dirty = False
+            await asyncio.to_thread(self._write, self._snapshot())
+
+    async def flush(self):
+        """等待未完成的保存（插件卸载时调用）"""
+        if self._save_task and not self._save_task.done():
+            await self._save_task
+        if self._dirty and self._loaded:
+            self._dirty = False
+            await asyncio.to_thread(self._write, self._snapshot())
+
+    def _snapshot(self) -> dict:
+        """在事件循环中复制名单，写入线程不会读到正在修改的字典"""
+        return {scope: dict(entries) for scope, entries in self._lists.items()}
+
+    def _write(self, lists: dict):
+        """保存黑名单（先写临时文件再替换，避免写入中断损坏数据）"""
+        if not self.data_file:
+            return
+        tmp_file = f"{self.data_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "lists": lists}, f, ensure_ascii=False)
+        os.replace(tmp_file, self.data_file)
@@ -0,0 +1,296 @@
+"""
+人工客服插件 - 缓存容器
+提供有界内存的去重、过期等缓存结构
+"""
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from collections.abc import Callable, MutableMapping
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+class MessageDeduplicator:
+    """消息去重器：记录最近处理过的消息ID，丢弃重复投递
+
+    使用按插入顺序排列的有序字典，最旧的记录总在最前面，
+    检查、插入、淘汰均为O(1)，容量和存活时间双重限制内存。
+    """
+
+    def __init__(self, max_size: int = 4096, ttl: float = 600):
+        self.max_size = max_size
+        self.ttl = ttl
+        # {message_key: 首次出现时间}
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self.duplicate_count = 0
+
+    def is_duplicate(self, message_key: str) -> bool:
+        """检查消息是否已处理过，未处理过则记录下来"""
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        if message_key in self._seen:
+            self.duplicate_count += 1
+            return True
+
+        self._seen[message_key] = now
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def _evict_expired(self, now: float):
+        """从最旧的一端清理过期记录"""
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.ttl:
+                break
+            del self._seen[key]
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class ExpiringDict(MutableMapping):
+    """带过期时间和容量上限的字典
+
+    读取时惰性清理过期条目，另可调用 purge() 定期批量清理；
+    超出容量时淘汰最早写入的条目。所有淘汰都会计入 evicted_count。
+    条目因过期被清理时调用 on_expire(key, value)。
+    条目只记录写入时间，过期时间按当前 ttl 计算，修改 ttl 对已有条目同样生效。
+    """
+
+    def __init__(self, ttl: float = 300, max_size: int = 10000, on_expire: Callable | None = None):
+        # ttl <= 0 表示不过期，仅受容量限制
+        self.ttl = ttl
+        self.max_size = max_size
+        self.on_expire = on_expire
+        # {key: (value, 写入时间)}，按写入顺序排列
+        self._data: OrderedDict = OrderedDict()
+        self.evicted_count = 0
+
+    def _written_before(self) -> float:
+        """写入时间早于该时刻的条目已过期"""
+        return time.monotonic() - self.ttl if self.ttl > 0 else float("-inf")
+
+    def _is_expired(self, key) -> bool:
+        item = self._data.get(key)
+        if item is not None and item[1] <= self._written_before():
+            del self._data[key]
+            self.evicted_count += 1
+            if self.on_expire:
+                self.on_expire(key, item[0])
+            return True
+        return False
+
+    def __setitem__(self, key, value):
+        if key in self._data:
+            del self._data[key]
+        self._data[key] = (value, time.monotonic())
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evicted_count += 1
+
+    def __getitem__(self, key):
+        if self._is_expired(key):
+            raise KeyError(key)
+        return self._data[key][0]
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._data and not self._is_expired(key)
+
+    def __iter__(self):
+        self.purge()
+        return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def purge(self) -> int:
+        """清理所有过期条目，返回本次清理的数量"""
+        written_before = self._written_before()
+        expired = 0
+        # 条目按写入顺序排列，遇到未过期的即可停止
+        while self._data:
+            key, (value, written_at) = next(iter(self._data.items()))
+            if written_at > written_before:
+                break
+            del self._data[key]
+            expired += 1
+            self.evicted_count += 1
+            if self.on_expire:
+                self.on_expire(key, value)
+        return expired
+
+
+class TTLCache:
+    """带存活时间的LRU缓存
+
+    命中时刷新最近使用顺序，超出容量时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, ttl: float = 3600, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        # {key: (value, 过期时间)}，按最近使用顺序排列
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None or item[1] <= time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def set(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class MediaSegmentCache:
+    """媒体消息段缓存（按内容标识寻址）
+
+    缓存图片、语音、视频、文件等组件转换后的OneBot消息段。发送成功后可记录平台返回的
+    文件标识（set_reference），重复转发同一媒体时按引用发送，无需再次上传；
+    平台不接受引用时调用 disable_references() 停止使用引用，转换后的消息段仍然保留。
+    按消息段的估算大小限制总内存，超出时淘汰最久未使用的条目。
+    """
+
+    # 参与缓存的组件类型
+    MEDIA_TYPES = ("Image", "Record", "Video", "File")
+    # 能标识媒体内容的组件属性（平台文件标识、链接或本地路径），至少有一项时才参与缓存
+    IDENTITY_FIELDS = ("file_unique", "file_id", "url", "path", "file_")
+    # 图片和语音的 file 是按内容生成的文件名，可以标识内容；视频和文件的 file 只是显示名称
+    CONTENT_NAMED_TYPES = ("Image", "Record")
+    # 链接中每次都会变化、不能用于标识内容的参数
+    VOLATILE_PARAMS = {"rkey", "term", "is_origin"}
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # {key: (segment, size, 平台文件引用消息段或None)}，按最近使用顺序排列
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 是否记录和使用平台文件引用，平台不接受按引用发送时关闭
+        self.references_enabled = True
+
+    @classmethod
+    def make_key(cls, component) -> str | None:
+        """根据组件生成缓存键，非媒体组件或无法标识内容时返回None
+
+        键由组件的全部属性生成，任一影响消息段的属性不同都不会共用缓存。
+        只读取实例属性而不用 getattr：File 组件的 file 属性在文件未下载时会同步下载。
+        """
+        component_type = type(component).__name__
+        if component_type not in cls.MEDIA_TYPES:
+            return None
+        fields = {k: v for k, v in vars(component).items() if not k.startswith("_")}
+
+        identity = cls.IDENTITY_FIELDS
+        if component_type in cls.CONTENT_NAMED_TYPES:
+            identity += ("file",)
+        if not any(fields.get(field) and isinstance(fields[field], str) for field in identity):
+            return None
+
+        for field in ("url", "file"):
+            value = fields.get(field)
+            if isinstance(value, str) and value.startswith(("http://", "https://")):
+                fields[field] = cls._strip_volatile_params(value)
+        payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+        return f"{component_type}:{digest}"
+
+    @classmethod
+    def _strip_volatile_params(cls, url: str) -> str:
+        """去掉链接中会变化的签名参数（如QQ图片链接的rkey），保留文件标识参数"""
+        parts = urlsplit(url)
+        if not parts.query:
+            return url
+        query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in cls.VOLATILE_PARAMS]
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+    def get(self, key: str, reference: bool = False) -> dict | None:
+        """获取缓存的消息段（返回副本，调用方可以放心修改）
+
+        reference=True 时优先返回平台文件引用消息段。
+        """
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        if reference and item[2] and self.references_enabled:
+            return copy.deepcopy(item[2])
+        return copy.deepcopy(item[0])
+
+    def put(self, key: str, segment: dict):
+        size = len(json.dumps(segment, ensure_ascii=False, default=str))
+        if size > self.max_bytes:
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        self._data[key] = (copy.deepcopy(segment), size, None)
+        self.total_bytes += size
+        self._shrink()
+
+    def _shrink(self):
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._data.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def has_reference(self, key: str) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[2] is not None and self.references_enabled
+
+    def set_reference(self, key: str, reference: dict):
+        """为已缓存的消息段记录平台文件引用（消息段类型不一致时忽略）"""
+        item = self._data.get(key)
+        if item is None or not self.references_enabled or item[0].get("type") != reference.get("type"):
+            return
+        size = len(json.dumps(reference, ensure_ascii=False, default=str))
+        self._data[key] = (item[0], item[1] + size, reference)
+        self.total_bytes += size
+        self._shrink()
+
+    def disable_references(self):
+        """停止使用平台文件引用并清除已记录的引用"""
+        self.references_enabled = False
+        for key, (segment, size, reference) in list(self._data.items()):
+            if reference is not None:
+                reference_size = len(json.dumps(reference, ensure_ascii=False, default=str))
+                self._data[key] = (segment, size - reference_size, None)
+                self.total_bytes -= reference_size
+
+    @staticmethod
+    def make_reference(segment: dict) -> dict | None:
+        """根据平台返回的消息段（get_msg 的结果）生成按文件标识引用的消息段
+
+        base64 内容和带有时效签名的链接不能作为引用，返回None。
+        """
+        data = segment.get("data") or {}
+        file = data.get("file")
+        if not isinstance(file, str) or not file or file.startswith(("base64://", "http://", "https://")):
+            return None
+        return {"type": segment.get("type"), "data": {"file": file}}
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,152 @@
+"""
+人工客服插件 - 消息合并发送
+在短时间窗口内缓冲同一会话的连续消息，合并为一条消息或合并转发，减少OneBot API调用
+"""
+import asyncio
+import inspect
+import time
+
+from .utils import extract_text_from_message, is_pure_text_message
+
+
+class MessageCoalescer:
+    """按会话缓冲消息并合并发送
+
+    空闲时的消息立即发送；距上次发送不足一个窗口的消息进入缓冲，
+    窗口结束后按原顺序一次性发出，每条消息的译文紧跟在原文之后。
+    消息在加入时即占好位置，译文可以是尚未完成的任务，发送时再等待，
+    因此后到的消息即使先翻译完成也不会排到前面。窗口长度固定为 window_ms。
+    """
+
+    # 缓冲状态数量超过该值时清理空闲会话
+    PRUNE_THRESHOLD = 1024
+
+    def __init__(self, window_ms: int = 300, max_batch: int = 20):
+        self.window = max(window_ms, 0) / 1000
+        self.max_batch = max(max_batch, 1)
+        # {key: {"items": [(message, translation)], "task": Task | None, "last_sent": float,
+        #        "lock": Lock, "send": ..., "forward": ...}}
+        self._buffers: dict[str, dict] = {}
+
+    async def add(self, key: str, message, translation: str | None, send, forward):
+        """加入一条待发送消息
+
+        Args:
+            key: 会话标识（同一目标的消息使用相同的key）
+            message: OneBot格式消息
+            translation: 该消息的译文，没有则为None；也可以是返回译文的任务，发送时再等待
+            send: 发送单条消息的协程函数 send(message)
+            forward: 发送合并转发的协程函数 forward(contents)
+        """
+        state = self._buffers.get(key)
+        if state is None:
+            if len(self._buffers) >= self.PRUNE_THRESHOLD:
+                self._prune()
+            # 同一会话的发送串行执行，先加入的消息（包括等待译文时）先发出
+            state = {"items": [], "task": None, "last_sent": 0.0, "lock": asyncio.Lock()}
+            self._buffers[key] = state
+
+        # 始终使用最新的发送函数（对应最新的bot连接）
+        state["send"] = send
+        state["forward"] = forward
+
+        now = time.monotonic()
+        if not state["items"] and now - state["last_sent"] >= self.window:
+            # 会话空闲，立即发送
+            state["last_sent"] = now
+            await self._deliver(state, [(message, translation)])
+            return
+
+        state["items"].append((message, translation))
+        if len(state["items"]) >= self.max_batch:
+            await self.flush(key)
+        elif state["task"] is None:
+            state["task"] = asyncio.create_task(self._flush_later(key))
+
+    async def flush(self, key: str):
+        """立即发送某个会话缓冲中的全部消息"""
+        state = self._buffers.get(key)
+        if not state:
+            return
+
+        task = state["task"]
+        state["task"] = None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+        items = state["items"]
+        if not items:
+            return
+        state["items"] = []
+        state["last_sent"] = time.monotonic()
+        await self._deliver(state, items)
+
+    async def flush_all(self):
+        """发送所有会话的缓冲消息（插件卸载时调用）"""
+        for key in list(self._buffers):
+            await self.flush(key)
+
+    async def _flush_later(self, key: str):
+        await asyncio.sleep(self.window)
+        await self.flush(key)
+
+    async def _deliver(self, state: dict, items: list):
+        async with state["lock"]:
+            send = state["send"]
+
+            if len(items) == 1:
+                # 单条消息先发原文，再等待译文
+                message, translation = items[0]
+                await send(message)
+                translation = await self._resolve(translation)
+                if translation:
+                    await send(f"[翻译] {translation}")
+                return
+
+            items = [(message, await self._resolve(translation)) for message, translation in items]
+            await self._deliver_batch(state, items)
+
+    @staticmethod
+    async def _resolve(translation) -> str | None:
+        if not inspect.isawaitable(translation):
+            return translation
+        try:
+            return await translation
+        except Exception:
+            # 翻译失败不影响原文发送
+            return None
+
+    async def _deliver_batch(self, state: dict, items: list):
+        send = state["send"]
+
+        # 纯文本消息合并为一条，原文与译文逐条配对
+        if all(is_pure_text_message(message) for message, _ in items):
+            lines = []
+            for message, translation in items:
+                lines.append(extract_text_from_message(message))
+                if translation:
+                    lines.append(f"[翻译] {translation}")
+            await send("\n".join(lines))
+            return
+
+        # 包含图片等富媒体时使用合并转发
+        contents = []
+        for message, translation in items:
+            contents.append(message)
+            if translation:
+                contents.append(f"[翻译] {translation}")
+        try:
+            await state["forward"](contents)
+        except Exception:
+            # 合并转发失败时逐条发送，保证消息不丢失
+            for content in contents:
+                await send(content)
+
+    def _prune(self):
+        """清理没有待发送消息的空闲会话"""
+        now = time.monotonic()
+        for key in [
+            k for k, s in self._buffers.items()
+            if not s["items"] and s["task"] is None and not s["lock"].locked() and now - s["last_sent"] >= self.window
+        ]:
+            del self._buffers[key]
@@ -0,0 +1,35 @@
+"""
+人工客服插件 - 会话锁
+按用户/客服分段加锁，保证同一会话的状态变更不会在 await 期间被其他事件打断
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class StripedLockRegistry:
+    """分段锁注册表
+
+    固定数量的锁按键的哈希分段复用，内存占用与用户数量无关；
+    不同会话大概率落在不同分段上，可以完全并行处理。
+    同时锁定多个键时按分段序号依次获取，避免相互等待造成死锁。
+    """
+
+    def __init__(self, stripes: int = 64):
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+
+    def _stripe(self, key) -> int:
+        return hash(str(key)) % len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, *keys):
+        """锁定一个或多个键（用户QQ号、客服QQ号），空值会被忽略"""
+        stripes = sorted({self._stripe(key) for key in keys if key})
+        acquired = []
+        try:
+            for stripe in stripes:
+                await self._locks[stripe].acquire()
+                acquired.append(stripe)
+            yield
+        finally:
+            for stripe in reversed(acquired):
+                self._locks[stripe].release()
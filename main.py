@@ -1,8 +1,16 @@
+import asyncio
+import json
+import os
 import re
+import socket
+import time
+from collections import Counter
+from functools import cached_property
+from astrbot.api import logger
 from astrbot.api.event import filter
-from astrbot.api.star import Context, Star, register
+from astrbot.api.star import Context, Star, StarTools, register
 from astrbot.core.config.astrbot_config import AstrBotConfig
-from astrbot.core.message.components import Reply
+from astrbot.core.message.components import Plain, Reply
 from astrbot.core.message.message_event_result import MessageChain
 from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
     AiocqhttpMessageEvent,
@@ -15,27 +23,34 @@ from .utils import (
     add_prefix_to_message,
     add_suffix_to_message,
     replace_with_random_text,
+    parse_duration,
+    format_duration,
 )
 
 # 导入管理器类
 from .managers import (
     QueueManager,
-    BlacklistManager,
     SessionManager,
     TimeoutManager,
-    TranslationService,
     CommandHandler,
-    SilenceModeManager,
 )
 
 # 导入辅助工具类
 from .helpers import (
     HelpTextBuilder,
-    BlacklistFormatter,
-    ChatHistoryExporter,
     MessageRouter,
 )
 
+# 导入缓存容器
+from .caches import MessageDeduplicator, ExpiringDict, MediaSegmentCache
+
+# 导入活动沉默模式规则
+from .silence_rules import SilenceRuleEngine
+
+# 导入会话锁
+from .locks import StripedLockRegistry
+from .session_index import DeliveryTarget, SessionMap, delivery_target
+
 
 @register(
     "astrbot_plugin_human_service",
@@ -45,83 +60,487 @@ from .helpers import (
     "https://github.com/Zhalslar/astrbot_plugin_human_service",
 )
 class HumanServicePlugin(Star):
+    # 查看黑名单每页显示的人数
+    BLACKLIST_PAGE_SIZE = 20
+    # 支持的翻译语言
+    SUPPORTED_LANGUAGES = ("中文", "英文", "日文")
+    # 性能分析的默认时长和最长时长（秒）
+    PROFILE_DEFAULT_SECONDS = 60
+    # 没有人工服务的群聊消息最多每隔多少秒触发一次超时检查
+    IDLE_CHECK_INTERVAL = 1.0
+    PROFILE_MAX_SECONDS = 600
+    
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
         
-        # 客服QQ号列表
-        self.servicers_id: list[str] = config.get("servicers_id", [])
-        if not self.servicers_id:
+        # 插件数据目录（黑名单等持久化数据）
+        self.data_dir = StarTools.get_data_dir("astrbot_plugin_human_service")
+        
+        # 读取并应用配置
+        self.config = config
+        settings = self._read_settings(config)
+        for error in self._validate_settings(settings):
+            logger.warning(f"[人工客服] 配置项有误：{error}")
+        self._apply_settings(settings)
+        
+        # 初始化管理器（黑名单、翻译服务、昵称缓存等可选组件在首次使用时创建）
+        self.queue_manager = QueueManager(self.servicers_id)
+        self.session_manager = SessionManager()
+        # 会话字典同时维护群号索引，没有进行中会话的群聊消息可直接丢弃
+        self.session_manager.session_map = SessionMap()
+        # 客服选择和黑名单查看选择状态会过期，避免放弃选择的用户被永久拦截
+        self.session_manager.selection_map = ExpiringDict(self.selection_timeout, on_expire=self._on_selection_expired)
+        self.session_manager.blacklist_view_selection = ExpiringDict(self.selection_timeout)
+        self.timeout_manager = TimeoutManager(self.conversation_timeout, self.timeout_warning_seconds)
+        
+        # 命令处理器
+        self.command_handler = CommandHandler(self)
+        
+        # 活动沉默模式规则（启动时编译，逐条消息只做哈希查询）
+        self.silence_rules = SilenceRuleEngine(
+            self.enable_silence_mode,
+            self.servicers_id,
+            (self.session_map, self.selection_map, self.blacklist_view_selection),
+            self.silence_allowed_commands,
+            context.get_config().get("wake_prefix", ["/"]),
+        )
+        
+        # 消息路由器
+        self.message_router = MessageRouter(self)
+        
+        # 会话锁：同一用户/客服的状态变更串行执行，不同会话互不影响
+        self.session_locks = StripedLockRegistry()
+        
+        # 消息合并发送器
+        self.message_coalescer = self._build_message_coalescer()
+        
+        # 重复投递消息去重（OneBot重连或桥接重发时同一消息可能到达多次）
+        self.message_deduplicator = MessageDeduplicator()
+        
+        # 媒体消息段缓存（重复转发的图片、文件等直接复用转换结果）
+        self.media_cache = MediaSegmentCache()
+        
+        # 进行中的性能分析（未开启时为None，不产生任何开销）
+        self.profiler = None
+        self._profiler_task = None
+        
+        # 聊天记录：{user_id: [{"sender": "user/servicer", "name": "xxx", "message": "xxx", "time": "xxx"}]}
+        self.chat_history = {}
+        
+        # 在线程中加载数据文件的任务：{存储名: Task}
+        self._load_tasks: dict[str, asyncio.Task] = {}
+        
+        # 上次执行超时检查的时间（time.monotonic）
+        self._last_checks = 0.0
+    
+    def _read_settings(self, config: dict) -> dict:
+        """从配置中读取全部设置项（不修改插件状态）"""
+        settings = {}
+        
+        # 客服QQ号列表（复制一份，避免修改配置对象本身）
+        servicers_id = [str(sid) for sid in config.get("servicers_id", [])]
+        if not servicers_id:
             # 默认使用管理员作为客服
-            for admin_id in context.get_config()["admins_id"]:
+            for admin_id in self.context.get_config()["admins_id"]:
                 if admin_id.isdigit():
-                    self.servicers_id.append(admin_id)
+                    servicers_id.append(admin_id)
+        settings["servicers_id"] = servicers_id
         
         # 客服名称列表
         servicers_names = config.get("servicers_names", [])
         
         # 客服配置：{qq: name}，将两个列表合并为字典
-        self.servicers_config: dict[str, str] = {}
-        for i, sid in enumerate(self.servicers_id):
+        servicers_config: dict[str, str] = {}
+        for i, sid in enumerate(servicers_id):
             # 如果有对应的名称就用，否则用QQ号
             if i < len(servicers_names) and servicers_names[i]:
-                self.servicers_config[str(sid)] = servicers_names[i]
+                servicers_config[sid] = servicers_names[i]
             else:
-                self.servicers_config[str(sid)] = str(sid)
-        
-        self.enable_servicer_selection = config.get("enable_servicer_selection", True)
-        self.enable_chat_history = config.get("enable_chat_history", False)
-        self.share_blacklist = config.get("share_blacklist", True)
-        self.enable_silence_mode = config.get("enable_silence_mode", False)
-        self.message_prefix = config.get("message_prefix", "")
-        self.message_suffix = config.get("message_suffix", "")
-        self.enable_random_reply = config.get("enable_random_reply", False)
-        self.random_reply_chars = config.get("random_reply_chars", "哈基米")
+                servicers_config[sid] = sid
+        settings["servicers_config"] = servicers_config
+        
+        settings["enable_servicer_selection"] = config.get("enable_servicer_selection", True)
+        settings["enable_chat_history"] = config.get("enable_chat_history", False)
+        settings["share_blacklist"] = config.get("share_blacklist", True)
+        settings["enable_silence_mode"] = config.get("enable_silence_mode", False)
+        settings["silence_allowed_commands"] = list(config.get("silence_allowed_commands", []))
+        settings["message_prefix"] = config.get("message_prefix", "")
+        settings["message_suffix"] = config.get("message_suffix", "")
+        settings["enable_random_reply"] = config.get("enable_random_reply", False)
+        settings["random_reply_chars"] = config.get("random_reply_chars", "哈基米")
         
         # 翻译配置
-        self.enable_translation = config.get("enable_translation", False)
-        self.translation_main_language = config.get("translation_main_language", "中文")
-        self.translation_target_language = config.get("translation_target_language", "英文")
-        self.openai_api_key = config.get("openai_api_key", "")
-        self.openai_base_url = config.get("openai_base_url", "https://api.openai.com/v1")
-        self.openai_model = config.get("openai_model", "gpt-3.5-turbo")
+        settings["enable_translation"] = config.get("enable_translation", False)
+        settings["translation_main_language"] = config.get("translation_main_language", "中文")
+        settings["translation_target_language"] = config.get("translation_target_language", "英文")
+        settings["openai_api_key"] = config.get("openai_api_key", "")
+        settings["openai_base_url"] = config.get("openai_base_url", "https://api.openai.com/v1")
+        settings["openai_model"] = config.get("openai_model", "gpt-3.5-turbo")
         
         # 时间限制配置（秒）
-        self.conversation_timeout = config.get("conversation_timeout", 0)
-        self.queue_timeout = config.get("queue_timeout", 0)
-        self.timeout_warning_seconds = config.get("timeout_warning_seconds", 120)
+        settings["conversation_timeout"] = config.get("conversation_timeout", 0)
+        settings["queue_timeout"] = config.get("queue_timeout", 0)
+        settings["timeout_warning_seconds"] = config.get("timeout_warning_seconds", 120)
+        settings["selection_timeout"] = config.get("selection_timeout", 300)
         
-        # 初始化管理器
-        self.queue_manager = QueueManager(self.servicers_id)
-        self.blacklist_manager = BlacklistManager(self.servicers_id, self.share_blacklist)
-        self.session_manager = SessionManager()
-        self.timeout_manager = TimeoutManager(self.conversation_timeout, self.timeout_warning_seconds)
+        # 消息合并发送配置
+        settings["enable_message_coalescing"] = config.get("enable_message_coalescing", False)
+        settings["coalescing_window_ms"] = config.get("coalescing_window_ms", 300)
         
-        # 翻译服务
-        if self.enable_translation and self.openai_api_key:
-            self.translation_service = TranslationService(
-                self.openai_api_key,
-                self.openai_base_url,
-                self.openai_model
-            )
-        else:
-            self.translation_service = None
+        # 审计日志配置
+        settings["enable_audit_log"] = config.get("enable_audit_log", True)
         
-        # 命令处理器
-        self.command_handler = CommandHandler(self)
+        # 统计配置
+        settings["enable_analytics"] = config.get("enable_analytics", True)
         
-        # 活动沉默模式管理器
-        self.silence_mode_manager = SilenceModeManager(self.enable_silence_mode, self.servicers_id)
+        # 多实例共享状态配置（数据库路径为空时不启用）
+        settings["shared_state_db"] = config.get("shared_state_db", "")
+        settings["shared_state_instance"] = config.get("shared_state_instance", "")
+        return settings
+    
+    def _validate_settings(self, settings: dict) -> list[str]:
+        """校验设置项，返回错误信息列表（为空表示校验通过）"""
+        errors = []
+        
+        if not settings["servicers_id"]:
+            errors.append("未配置客服QQ号，且全局配置中没有可用的管理员")
+        for sid in settings["servicers_id"]:
+            if not sid.isdigit():
+                errors.append(f"客服QQ号 {sid} 格式不正确")
+        
+        for key in (
+            "conversation_timeout", "queue_timeout", "timeout_warning_seconds",
+            "selection_timeout", "coalescing_window_ms",
+        ):
+            value = settings[key]
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                errors.append(f"{key} 必须是非负整数，当前为 {value!r}")
+        
+        for key in ("translation_main_language", "translation_target_language"):
+            if settings[key] not in self.SUPPORTED_LANGUAGES:
+                errors.append(f"{key} 不支持 {settings[key]!r}，可选：{'、'.join(self.SUPPORTED_LANGUAGES)}")
+        return errors
+    
+    def _apply_settings(self, settings: dict):
+        """将设置项写入插件属性"""
+        for key, value in settings.items():
+            if key == "servicers_id" and hasattr(self, "servicers_id"):
+                # 各管理器持有同一个列表对象，原地修改保证它们同步看到新的客服列表
+                self.servicers_id[:] = value
+            else:
+                setattr(self, key, value)
+    
+    def _load_config_from_disk(self) -> dict:
+        """从配置文件重新读取插件配置，读取失败时使用内存中的配置"""
+        config_path = getattr(self.config, "config_path", None)
+        if config_path and os.path.exists(config_path):
+            with open(config_path, encoding="utf-8-sig") as f:
+                return json.load(f)
+        return dict(self.config)
+    
+    def _build_message_coalescer(self):
+        if not self.enable_message_coalescing:
+            return None
+        from .coalescer import MessageCoalescer
         
-        # 消息路由器
-        self.message_router = MessageRouter(self)
+        return MessageCoalescer(self.coalescing_window_ms)
+    
+    @cached_property
+    def translation_service(self):
+        """翻译服务（首次翻译时创建，未启用翻译时为None）"""
+        if not (self.enable_translation and self.openai_api_key):
+            return None
+        from .managers import TranslationService
         
-        # 聊天记录：{user_id: [{"sender": "user/servicer", "name": "xxx", "message": "xxx", "time": "xxx"}]}
-        self.chat_history = {}
+        return TranslationService(self.openai_api_key, self.openai_base_url, self.openai_model)
+    
+    @cached_property
+    def blacklist_manager(self):
+        """黑名单存储（首次使用时在线程中加载数据文件，需要准确判断时先 await _blacklist_ready()）"""
+        from .blacklist_store import BlacklistStore
+        
+        store = BlacklistStore(
+            self.servicers_id, self.share_blacklist, self.data_dir / "blacklist.json", autoload=False
+        )
+        self._load_in_background("blacklist", "黑名单", store)
+        return store
+    
+    async def _blacklist_ready(self):
+        """等待黑名单数据文件加载完成（拉黑判断、名单命令等需要完整名单时调用）"""
+        self.blacklist_manager  # 首次访问时创建存储并开始加载
+        await self._wait_loaded("blacklist")
+    
+    @cached_property
+    def audit_log(self):
+        """审计日志（首次记录时创建）"""
+        from .audit_log import AuditLogger
+        
+        return AuditLogger(self.data_dir / "audit")
+    
+    @cached_property
+    def analytics(self):
+        """统计存储（首次记录时在线程中加载数据文件，加载前的计数会合并进去）"""
+        from .analytics import AnalyticsStore
+        
+        store = AnalyticsStore(self.data_dir / "analytics.json", autoload=False)
+        self._load_in_background("analytics", "统计", store)
+        return store
+    
+    def _load_in_background(self, key: str, name: str, store):
+        """在线程中加载存储的数据文件，不阻塞事件循环
+
+        读取失败时记录日志并继续使用空存储（原文件另存为 .broken），统计、黑名单等数据问题不会影响消息处理。
+        """
+        async def load():
+            try:
+                await store.load_async()
+            except Exception as e:
+                logger.error(f"[人工客服] {name}数据文件 {store.data_file} 读取失败，已另存为 .broken 并使用空数据：{e}")
+        
+        try:
+            self._load_tasks[key] = asyncio.get_running_loop().create_task(load())
+        except RuntimeError:
+            # 不在事件循环中（如脚本直接调用）时同步加载
+            asyncio.run(load())
+    
+    async def _wait_loaded(self, key: str):
+        task = self._load_tasks.get(key)
+        if task and not task.done():
+            await asyncio.shield(task)
+    
+    def _record_event(self, event_type: str, user_id: str, servicer_id: str | None = None, **fields):
+        """记录状态变化到统计和审计日志"""
+        if self.enable_analytics:
+            self.analytics.record_event(event_type, servicer_id)
+        if self.enable_audit_log:
+            self.audit_log.emit(event_type, user_id=str(user_id), servicer_id=servicer_id or "", **fields)
+    
+    @property
+    def shared_state(self):
+        """已连接的多实例共享状态（未配置共享数据库、尚未连接或连接失败时为None，供同步代码查询）"""
+        return self.__dict__.get("_shared_state")
+    
+    async def _connect_shared_state(self):
+        """获取多实例共享状态，首次调用时连接数据库（多个调用方等待同一次连接）"""
+        if not self.shared_state_db:
+            return None
+        task = self.__dict__.get("_shared_state_task")
+        if task is None:
+            task = self._shared_state_task = asyncio.create_task(self._open_shared_state())
+        return await asyncio.shield(task)
+    
+    async def _open_shared_state(self):
+        """在线程中打开共享数据库，失败时记录日志并按未启用共享状态运行（配置变更后重试）"""
+        from .shared_state import SharedStateStore
+        
+        instance_id = self.shared_state_instance or f"{socket.gethostname()}:{os.getpid()}"
+        db_path = os.path.expanduser(self.shared_state_db)
+        try:
+            store = await asyncio.to_thread(SharedStateStore, db_path, instance_id)
+        except Exception as e:
+            logger.error(f"[人工客服] 共享状态数据库 {db_path} 打开失败，将按单实例运行：{e}")
+            return None
+        store.start(self._shared_lease_keys, self._shared_queue_entries)
+        self._shared_state = store
+        logger.info(f"[人工客服] 已启用多实例共享状态：{store.db_path}（实例 {instance_id}）")
+        return store
+    
+    async def _close_shared_state(self):
+        """关闭共享状态连接（释放本实例的租约和排队记录）"""
+        task = self.__dict__.pop("_shared_state_task", None)
+        store = await task if task else None
+        self.__dict__.pop("_shared_state", None)
+        if store:
+            await store.close()
+    
+    def _shared_lease_keys(self) -> set[str]:
+        """本实例应持有的租约：有会话、正在选择或排队的用户，以及正在服务的客服"""
+        from .shared_state import SharedStateStore
+        
+        user_ids = set(self.session_map) | set(self.selection_map)
+        user_ids.update(user_id for user_id, _ in self._shared_queue_entries())
+        keys = {SharedStateStore.user_key(user_id) for user_id in user_ids}
+        keys.update(
+            SharedStateStore.servicer_key(session["servicer_id"])
+            for session in self.session_map.values()
+            if session.get("status") == "connected"
+        )
+        return keys
+    
+    def _shared_queue_entries(self) -> list[tuple[str, str]]:
+        """本地队列中的 (用户QQ号, 客服QQ号)，按入队先后排列"""
+        return [
+            (str(item["user_id"]), servicer_id)
+            for servicer_id, queue in self.servicer_queue.items()
+            for item in queue
+        ]
+    
+    async def _claim_shared_user(self, user_id: str, state: str) -> bool:
+        """获取用户的共享租约，用户已由其他实例处理时返回False（未启用共享状态时总是成功）"""
+        store = await self._connect_shared_state()
+        if not store:
+            return True
+        owner = await store.claim(store.user_key(user_id), state)
+        return owner == store.instance_id
+    
+    async def _claim_shared_servicer(self, servicer_id: str, user_id: str) -> bool:
+        """获取客服的共享租约，客服正在其他实例中服务时返回False（未启用共享状态时总是成功）"""
+        store = await self._connect_shared_state()
+        if not store:
+            return True
+        owner = await store.claim(store.servicer_key(servicer_id), user_id)
+        return owner == store.instance_id
+    
+    async def _release_shared(self, user_id: str, servicer_id: str | None = None):
+        """释放用户（及客服）的共享租约"""
+        store = await self._connect_shared_state()
+        if not store:
+            return
+        keys = [store.user_key(user_id)]
+        if servicer_id:
+            keys.append(store.servicer_key(servicer_id))
+        await store.release(*keys)
+    
+    @cached_property
+    def quick_replies(self):
+        """快捷回复存储（首次使用时在线程中加载数据文件，使用前先 await _quick_replies_ready()）"""
+        from .quick_reply import QuickReplyStore
+        
+        store = QuickReplyStore(self.data_dir / "quick_replies.json", autoload=False)
+        self._load_in_background("quick_replies", "快捷回复", store)
+        return store
+    
+    async def _quick_replies_ready(self):
+        """等待快捷回复数据文件加载完成"""
+        self.quick_replies  # 首次访问时创建存储并开始加载
+        await self._wait_loaded("quick_replies")
+    
+    @cached_property
+    def nickname_resolver(self):
+        """昵称缓存（黑名单显示、队列通知等共用，首次使用时创建）"""
+        from .nickname_resolver import NicknameResolver
+        
+        return NicknameResolver()
+    
+    async def reload_config(self, config: dict) -> tuple[list[str], list[str]]:
+        """热重载配置：校验新配置，只更新受影响的管理器，进行中的会话保持不变
+
+        Returns:
+            (变更说明列表, 错误信息列表)，有错误时不做任何修改
+        """
+        settings = self._read_settings(config)
+        errors = self._validate_settings(settings)
+        
+        # 仍有会话或排队的客服不能移除
+        removed_servicers = [sid for sid in self.servicers_id if sid not in settings["servicers_id"]]
+        for sid in removed_servicers:
+            if self.is_servicer_busy(sid) or self.queue_manager.get_size(sid):
+                errors.append(f"客服 {self.get_servicer_name(sid)}({sid}) 仍有进行中的对话或排队用户，暂不能移除")
+        if errors:
+            return [], errors
+        
+        changed = {key for key, value in settings.items() if getattr(self, key) != value}
+        if not changed:
+            return [], []
+        
+        changes = []
+        for key in sorted(changed):
+            if key == "servicers_id":
+                added_servicers = [sid for sid in settings["servicers_id"] if sid not in self.servicers_id]
+                changes.append(f"客服列表：新增 {added_servicers or '无'}，移除 {removed_servicers or '无'}")
+            elif key == "openai_api_key":
+                changes.append("openai_api_key 已更新")
+            elif key != "servicers_config":
+                changes.append(f"{key}：{getattr(self, key)!r} → {settings[key]!r}")
+        
+        previous_limits = (self.conversation_timeout, self.timeout_warning_seconds)
+        async with self.session_locks.hold(*self.servicers_id, *settings["servicers_id"]):
+            self._apply_settings(settings)
+            
+            # 队列：为新客服创建队列，移除已下线客服的空队列
+            if "servicers_id" in changed:
+                for sid in self.servicers_id:
+                    self.servicer_queue.setdefault(sid, [])
+                for sid in removed_servicers:
+                    self.servicer_queue.pop(sid, None)
+            
+            # 黑名单：共用设置（尚未加载时无需处理）
+            if "blacklist_manager" in self.__dict__:
+                self.blacklist_manager.share_blacklist = self.share_blacklist
+            
+            # 计时器：在原实例上使用新的时间限制，进行中对话的计时和已提醒状态保持不变
+            if changed & {"conversation_timeout", "timeout_warning_seconds"}:
+                self._update_timeout_limits(previous_limits)
+            
+            # 翻译服务：客户端配置变化时丢弃旧实例，下次翻译时按新配置创建
+            if changed & {"enable_translation", "openai_api_key", "openai_base_url", "openai_model"}:
+                self.__dict__.pop("translation_service", None)
+            
+            # 活动沉默模式：重新编译规则
+            if changed & {"enable_silence_mode", "silence_allowed_commands", "servicers_id"}:
+                self.silence_rules.compile(
+                    self.enable_silence_mode,
+                    self.servicers_id,
+                    self.silence_allowed_commands,
+                    self.context.get_config().get("wake_prefix", ["/"]),
+                )
+            
+            # 选择状态有效期
+            self.selection_map.ttl = self.selection_timeout
+            self.blacklist_view_selection.ttl = self.selection_timeout
+        
+        # 共享状态：关闭旧连接（释放租约），下次使用时按新配置连接并重新获取租约
+        if changed & {"shared_state_db", "shared_state_instance"}:
+            await self._close_shared_state()
+        
+        # 消息合并发送：先发出旧缓冲中的消息再切换
+        if changed & {"enable_message_coalescing", "coalescing_window_ms"}:
+            if self.message_coalescer:
+                await self.message_coalescer.flush_all()
+            self.message_coalescer = self._build_message_coalescer()
+        
+        logger.info(f"[人工客服] 配置已热重载：{'；'.join(changes)}")
+        return changes, []
+    
+    def _update_timeout_limits(self, previous_limits: tuple[int, int]):
+        """将新的时间限制写入现有计时器
+
+        TimeoutManager 只在构造时接收时间限制：分别用新旧限制构造实例，
+        取值不同的属性即保存限制的属性，只把这些属性写回现有实例。
+        """
+        old = vars(TimeoutManager(*previous_limits))
+        new = vars(TimeoutManager(self.conversation_timeout, self.timeout_warning_seconds))
+        for name, value in new.items():
+            if old.get(name) != value:
+                setattr(self.timeout_manager, name, value)
+    
+    async def terminate(self):
+        """插件卸载时发送缓冲中的消息，并停止进行中的性能分析"""
+        if self.message_coalescer:
+            await self.message_coalescer.flush_all()
+        if self.profiler:
+            await self._finish_profiling()
+        # 数据文件加载完成后才能保存，否则会覆盖未读取的数据
+        for key in list(self._load_tasks):
+            await self._wait_loaded(key)
+        if "blacklist_manager" in self.__dict__:
+            await self.blacklist_manager.flush()
+        if "quick_replies" in self.__dict__:
+            await self.quick_replies.flush()
+        if "audit_log" in self.__dict__:
+            await self.audit_log.close()
+        if "analytics" in self.__dict__:
+            await self.analytics.close()
+        await self._close_shared_state()
     
     def get_servicer_name(self, servicer_id: str) -> str:
         """获取客服名称，如果没有配置则返回QQ号"""
         return self.servicers_config.get(servicer_id, servicer_id)
     
+    def get_user_display(self, user_id: str) -> str:
+        """获取用户显示文本：已知昵称时为 昵称(QQ号)，否则为QQ号"""
+        return self.nickname_resolver.display(user_id)
+    
     # 兼容性属性访问器
     @property
     def session_map(self):
@@ -152,14 +571,21 @@ class HumanServicePlugin(Star):
     def is_user_blacklisted(self, user_id: str, servicer_id: str = None) -> bool:
         return self.blacklist_manager.is_blacklisted(user_id, servicer_id)
     
-    def add_to_blacklist(self, user_id: str, servicer_id: str):
-        self.blacklist_manager.add(user_id, servicer_id)
+    def add_to_blacklist(self, user_id: str, servicer_id: str, duration: int = 0):
+        self.blacklist_manager.add(user_id, servicer_id, duration)
     
     def remove_from_blacklist(self, user_id: str, servicer_id: str) -> bool:
         return self.blacklist_manager.remove(user_id, servicer_id)
     
+    def get_unblocked_servicers(self, user_id: str) -> list[str]:
+        """获取未拉黑该用户的客服（一次查询完成所有客服的判断）"""
+        return self.blacklist_manager.filter_servicers(user_id, self.servicers_id)
+    
     def is_servicer_busy(self, servicer_id: str) -> bool:
-        return self.session_manager.is_servicer_busy(servicer_id)
+        if self.session_manager.is_servicer_busy(servicer_id):
+            return True
+        # 同一客服可能正在其他机器人账号中服务用户
+        return bool(self.shared_state) and servicer_id in self.shared_state.remote_busy_servicers
     
     def add_to_queue(self, servicer_id: str, user_id: str, user_name: str, group_id: str):
         return self.queue_manager.add(servicer_id, user_id, user_name, group_id)
@@ -174,6 +600,8 @@ class HumanServicePlugin(Star):
         """使用OpenAI API翻译文本"""
         if not self.translation_service:
             return None
+        if self.enable_analytics:
+            self.analytics.incr("translations")
         return await self.translation_service.translate(text, target_language)
     
     async def check_conversation_timeout(self, event: AiocqhttpMessageEvent):
@@ -201,7 +629,7 @@ class HumanServicePlugin(Star):
                 if servicer_id:
                     await self.send(
                         event,
-                        message=f"⏰ 提醒：与用户 {user_id} 的对话将在 {remaining_seconds} 秒后自动结束",
+                        message=f"⏰ 提醒：与用户 {self.get_user_display(user_id)} 的对话将在 {remaining_seconds} 秒后自动结束",
                         user_id=servicer_id,
                     )
                 
@@ -214,12 +642,22 @@ class HumanServicePlugin(Star):
     
     async def _timeout_conversation(self, event: AiocqhttpMessageEvent, user_id: str):
         """处理对话超时"""
-        session = self.session_manager.get_session(user_id)
-        if not session or session.get("status") != "connected":
-            return
+        async with self.session_locks.hold(user_id):
+            session = self.session_manager.get_session(user_id)
+            if not session or session.get("status") != "connected":
+                return
+            
+            servicer_id = session.get("servicer_id")
+            group_id = session.get("group_id")
+            
+            # 清理会话和数据
+            self.session_manager.delete_session(user_id)
+            self.timeout_manager.stop_timer(user_id)
+            if user_id in self.chat_history:
+                del self.chat_history[user_id]
         
-        servicer_id = session.get("servicer_id")
-        group_id = session.get("group_id")
+        self._record_event("timeout", user_id, servicer_id)
+        await self._release_shared(user_id, servicer_id)
         
         # 通知用户
         await self.send(
@@ -229,25 +667,107 @@ class HumanServicePlugin(Star):
             user_id=user_id,
         )
         
-        # 清理会话和数据
-        self.session_manager.delete_session(user_id)
-        self.timeout_manager.stop_timer(user_id)
-        if user_id in self.chat_history:
-            del self.chat_history[user_id]
-        
         # 使用CommandHandler处理队列中的下一位
         if servicer_id:
             has_next = await self.command_handler.prepare_next_user_from_queue(
-                event, servicer_id, f"⏰ 与用户 {user_id} 的对话已超时自动结束"
+                event, servicer_id, f"⏰ 与用户 {self.get_user_display(user_id)} 的对话已超时自动结束"
             )
             
             if not has_next:
                 await self.send(
                     event,
-                    message=f"⏰ 与用户 {user_id} 的对话已超时自动结束\n📋 当前队列为空",
+                    message=(
+                        f"⏰ 与用户 {self.get_user_display(user_id)} 的对话已超时自动结束\n"
+                        f"{await self._queue_empty_tip(servicer_id)}"
+                    ),
                     user_id=servicer_id,
                 )
     
+    def _on_selection_expired(self, user_id: str, selection: dict):
+        """客服选择超时未完成，计为用户放弃（租约由后台同步释放）"""
+        self._record_event("cancel", user_id, stage="selection_timeout")
+    
+    def check_selection_timeout(self):
+        """清理过期的客服选择和黑名单查看选择状态"""
+        if self.selection_timeout <= 0:
+            return
+        
+        expired_selections = self.selection_map.purge()
+        expired_views = self.blacklist_view_selection.purge()
+        if expired_selections or expired_views:
+            logger.info(
+                f"[人工客服] 已清理过期选择状态：客服选择 {expired_selections} 个，黑名单查看 {expired_views} 个"
+                f"（累计 {self.selection_map.evicted_count + self.blacklist_view_selection.evicted_count} 个）"
+            )
+    
+    async def check_shared_changes(self, event: AiocqhttpMessageEvent):
+        """处理其他实例发来的变更通知（黑名单同步、排队用户分配）"""
+        store = await self._connect_shared_state()
+        if not store:
+            return
+        
+        pending = store.pending_changes
+        if pending:
+            await self._blacklist_ready()
+        while pending:
+            change = pending.popleft()
+            kind = change["kind"]
+            if kind == "blacklist_add":
+                # 用户租约通常在其他实例中，需要在本实例结束其对话或排队
+                await self._apply_blacklist(event, change["user_id"], change["servicer_id"], change["duration"])
+            elif kind == "blacklist_remove":
+                self.remove_from_blacklist(change["user_id"], change["servicer_id"])
+            elif kind == "dispatch":
+                await self._accept_dispatch(event, change["user_id"], change["servicer_id"])
+    
+    async def _publish_shared(self, kind: str, **payload):
+        """通知其他实例（未启用共享状态时忽略）"""
+        store = await self._connect_shared_state()
+        if store:
+            await store.publish(kind, **payload)
+    
+    async def _queue_empty_tip(self, servicer_id: str) -> str:
+        """本地队列为空时，尝试从共享队列中为客服分配其他实例中排队的用户"""
+        store = await self._connect_shared_state()
+        if store and not self.is_servicer_busy(servicer_id):
+            entry = await store.dequeue(servicer_id)
+            if entry:
+                await store.publish(
+                    "dispatch", entry["instance_id"], user_id=entry["user_id"], servicer_id=servicer_id
+                )
+                return "📋 当前队列为空，已为您分配其他客服账号中排队的用户，请留意该账号的接入提醒"
+        return "📋 当前队列为空"
+    
+    async def _accept_dispatch(self, event: AiocqhttpMessageEvent, user_id: str, servicer_id: str):
+        """其他实例的客服空闲，将本实例排队中的用户转为等待该客服接入"""
+        async with self.session_locks.hold(user_id, servicer_id):
+            item = next(
+                (item for item in self.servicer_queue.get(servicer_id, []) if str(item["user_id"]) == user_id),
+                None,
+            )
+            # 用户可能已取消排队或已由本实例的客服接入
+            if item is None or user_id in self.session_map:
+                return
+            self.remove_from_queue(user_id)
+            self.session_manager.create_session(user_id, {
+                "servicer_id": "",
+                "status": "waiting",
+                "group_id": item["group_id"],
+            })
+        
+        await self.send(
+            event,
+            message="📋 已轮到您，正在等待客服👤接入...",
+            group_id=item["group_id"],
+            user_id=user_id,
+        )
+        nickname = self.nickname_resolver.get_cached(user_id) or "用户"
+        await self.send(
+            event,
+            message=f"{nickname}({user_id}) 请求转人工（排队已轮到）",
+            user_id=servicer_id,
+        )
+    
     async def check_queue_timeout(self, event: AiocqhttpMessageEvent):
         """检查排队是否超时"""
         if self.queue_timeout <= 0:
@@ -258,6 +778,8 @@ class HumanServicePlugin(Star):
         
         # 通知超时用户
         for item in timeout_users:
+            self._record_event("queue_timeout", item["user_id"], item.get("servicer_id"))
+            await self._release_shared(item["user_id"])
             await self.send(
                 event,
                 message=(
@@ -274,97 +796,142 @@ class HumanServicePlugin(Star):
         send_name = event.get_sender_name()
         group_id = event.get_group_id() or "0"
 
-        # 使用CommandHandler进行前置检查
-        success, error_msg, _ = await self.command_handler.handle_transfer_to_human(event, sender_id, send_name, group_id)
-        if not success:
-            yield event.plain_result(error_msg)
-            return
-
-        # 如果启用了客服选择且有多个客服
-        if self.enable_servicer_selection and len(self.servicers_id) > 1:
-            # 获取可用客服并格式化列表
-            available_servicers = self.command_handler.get_available_servicers(sender_id)
+        # 拉黑判断需要完整的名单
+        await self._blacklist_ready()
+        
+        # 前置检查和状态写入在锁内完成，避免同一用户的重复请求交错
+        async with self.session_locks.hold(sender_id):
+            # 多实例部署时，同一用户只能在一个机器人账号中请求人工
+            claimed = await self._claim_shared_user(sender_id, "transfer")
+            if not claimed:
+                success, error_msg = False, "⚠ 您已在其他客服账号发起人工请求，请在该账号中继续"
+            else:
+                # 使用CommandHandler进行前置检查
+                success, error_msg, _ = await self.command_handler.handle_transfer_to_human(
+                    event, sender_id, send_name, group_id
+                )
+            if not success:
+                mode = "error"
+            # 如果启用了客服选择且有多个客服
+            elif self.enable_servicer_selection and len(self.servicers_id) > 1:
+                mode = "select"
+                # 获取可用客服并格式化列表
+                # 一次反向索引查询得到未拉黑该用户的全部客服
+                available_servicers = self.get_unblocked_servicers(sender_id)
+                if available_servicers:
+                    servicer_list_items, available_servicers = self.command_handler.format_servicer_list(available_servicers)
+                    self.selection_map[sender_id] = {
+                        "status": "selecting",
+                        "group_id": group_id,
+                        "name": send_name,
+                        "available_servicers": available_servicers
+                    }
+            else:
+                # 单客服模式
+                target_servicer = self.servicers_id[0] if len(self.servicers_id) == 1 else None
+                if target_servicer and self.is_servicer_busy(target_servicer):
+                    # 客服忙碌，加入队列
+                    mode = "queue"
+                    self.add_to_queue(target_servicer, sender_id, send_name, group_id)
+                    position = self.get_queue_position(target_servicer, sender_id)
+                    queue_count = self.queue_manager.get_size(target_servicer)
+                else:
+                    # 客服空闲，创建会话
+                    mode = "wait"
+                    self.session_manager.create_session(sender_id, {
+                        "servicer_id": "",
+                        "status": "waiting",
+                        "group_id": group_id,
+                    })
             
+            # 请求未成立时释放刚获取的租约（用户在本实例中已有会话、选择或排队时仍需保留）
+            if claimed and (mode == "error" or (mode == "select" and not available_servicers)):
+                if self.shared_state and self.shared_state.user_key(sender_id) not in self._shared_lease_keys():
+                    await self._release_shared(sender_id)
+
+        if mode in ("queue", "wait") or (mode == "select" and available_servicers):
+            self._record_event(
+                "queue" if mode == "queue" else "transfer",
+                sender_id,
+                target_servicer if mode == "queue" else None,
+                group_id=group_id,
+                mode=mode,
+            )
+        
+        if mode == "error":
+            yield event.plain_result(error_msg)
+        elif mode == "select":
             if not available_servicers:
                 yield event.plain_result("⚠ 当前没有可用的客服")
                 return
             
-            servicer_list_items, available_servicers = self.command_handler.format_servicer_list(available_servicers)
-            
-            self.selection_map[sender_id] = {
-                "status": "selecting",
-                "group_id": group_id,
-                "name": send_name,
-                "available_servicers": available_servicers
-            }
-            
             servicer_list = "\n".join(servicer_list_items)
             yield event.plain_result(
                 f"请选择要对接的客服（回复序号）：\n{servicer_list}\n\n回复 0 取消请求"
             )
-        else:
-            # 单客服模式
-            target_servicer = self.servicers_id[0] if len(self.servicers_id) == 1 else None
+        elif mode == "queue":
+            yield event.plain_result(
+                f"客服正在服务中🔴\n"
+                f"您已加入等待队列，当前排队人数：{queue_count}\n"
+                f"您的位置：第 {position} 位\n\n"
+                f"💡 使用 /取消排队 可退出队列"
+            )
             
-            if target_servicer and self.is_servicer_busy(target_servicer):
-                # 客服忙碌，加入队列
-                self.add_to_queue(target_servicer, sender_id, send_name, group_id)
-                position = self.get_queue_position(target_servicer, sender_id)
-                queue_count = self.queue_manager.get_size(target_servicer)
-                
-                yield event.plain_result(
-                    f"客服正在服务中🔴\n"
-                    f"您已加入等待队列，当前排队人数：{queue_count}\n"
-                    f"您的位置：第 {position} 位\n\n"
-                    f"💡 使用 /取消排队 可退出队列"
-                )
-                
+            await self.send(
+                event,
+                message=f"📋 {send_name}({sender_id}) 已加入排队，当前队列：{queue_count} 人",
+                user_id=target_servicer,
+            )
+        else:
+            yield event.plain_result("正在等待客服👤接入...")
+            for servicer_id in self.servicers_id:
                 await self.send(
                     event,
-                    message=f"📋 {send_name}({sender_id}) 已加入排队，当前队列：{queue_count} 人",
-                    user_id=target_servicer,
+                    message=f"{send_name}({sender_id}) 请求转人工",
+                    user_id=servicer_id,
                 )
-            else:
-                # 客服空闲，创建会话
-                self.session_manager.create_session(sender_id, {
-                    "servicer_id": "",
-                    "status": "waiting",
-                    "group_id": group_id,
-                })
-                yield event.plain_result("正在等待客服👤接入...")
-                for servicer_id in self.servicers_id:
-                    await self.send(
-                        event,
-                        message=f"{send_name}({sender_id}) 请求转人工",
-                        user_id=servicer_id,
-                    )
 
     @filter.command("转人机", priority=1)
     async def transfer_to_bot(self, event: AiocqhttpMessageEvent):
         sender_id = event.get_sender_id()
         sender_name = event.get_sender_name()
         
-        # 检查是否在选择客服状态
-        if sender_id in self.selection_map:
-            del self.selection_map[sender_id]
+        async with self.session_locks.hold(sender_id):
+            # 检查是否在选择客服状态
+            if sender_id in self.selection_map:
+                del self.selection_map[sender_id]
+                state = "selecting"
+            # 检查是否在排队中
+            elif self.remove_from_queue(sender_id):
+                state = "queued"
+            else:
+                session = self.session_map.pop(sender_id, None)
+                state = session["status"] if session else None
+                if state == "connected":
+                    # 清理计时器
+                    self.timeout_manager.stop_timer(sender_id)
+        
+        if state in ("selecting", "queued", "waiting"):
+            self._record_event("cancel", sender_id, stage=state)
+            await self._release_shared(sender_id)
+        elif state == "connected":
+            self._record_event("user_end", sender_id, session["servicer_id"])
+            await self._release_shared(sender_id, session["servicer_id"])
+        
+        if state == "selecting":
             yield event.plain_result("已取消客服选择")
             return
         
-        # 检查是否在排队中
-        removed = self.remove_from_queue(sender_id)
-        if removed:
+        if state == "queued":
             yield event.plain_result("已退出排队，我现在是人机啦！")
             return
-        
-        session = self.session_map.get(sender_id)
 
-        if not session:
+        if not state:
             yield event.plain_result("⚠ 您当前没有人工服务请求")
             return
 
-        if session["status"] == "waiting":
+        if state == "waiting":
             # 用户在等待状态取消请求
-            del self.session_map[sender_id]
             yield event.plain_result("已取消人工客服请求，我现在是人机啦！")
             # 通知所有客服人员该用户已取消请求
             for servicer_id in self.servicers_id:
@@ -373,25 +940,23 @@ class HumanServicePlugin(Star):
                     message=f"❗{sender_name}({sender_id}) 已取消人工请求",
                     user_id=servicer_id,
                 )
-        elif session["status"] == "connected":
+        elif state == "connected":
             # 用户在对话中结束会话
-            servicer_name = self.get_servicer_name(session["servicer_id"])
             await self.send(
                 event,
                 message=f"❗{sender_name} 已结束对话",
                 user_id=session["servicer_id"],
             )
-            del self.session_map[sender_id]
-            # 清理计时器
-            self.timeout_manager.stop_timer(sender_id)
             yield event.plain_result("好的，我现在是人机啦！")
     
     @filter.command("取消排队", priority=1)
     async def cancel_queue(self, event: AiocqhttpMessageEvent):
         sender_id = event.get_sender_id()
         
-        removed = self.remove_from_queue(sender_id)
+        async with self.session_locks.hold(sender_id):
+            removed = self.remove_from_queue(sender_id)
         if removed:
+            await self._release_shared(sender_id)
             yield event.plain_result("✅ 已退出排队")
         else:
             yield event.plain_result("⚠ 您当前不在排队中")
@@ -421,45 +986,298 @@ class HumanServicePlugin(Star):
         if sender_id not in self.servicers_id:
             return
         
-        # 获取命令参数（AstrBot会自动移除命令部分）
-        # 尝试多种方式获取参数
-        message_text = event.message_str.strip()
-        
-        # 如果消息还包含命令本身，移除它
-        if message_text.startswith("/拉黑"):
-            target_id = message_text.replace("/拉黑", "", 1).strip()
-        elif message_text.startswith("拉黑"):
-            target_id = message_text.replace("拉黑", "", 1).strip()
-        else:
-            # 可能AstrBot已经移除了命令，直接使用消息内容
-            target_id = message_text
+        # 参数：QQ号 [拉黑时长]
+        args = self._get_command_args(event, "拉黑").split()
+        target_id = args[0] if args else ""
         
         # 验证QQ号格式
         if not target_id or not target_id.isdigit():
-            yield event.plain_result("⚠ 请提供正确的QQ号\n使用格式：/拉黑 QQ号\n示例：/拉黑 123456")
+            yield event.plain_result(
+                "⚠ 请提供正确的QQ号\n使用格式：/拉黑 QQ号 [时长]\n"
+                "示例：/拉黑 123456（永久）、/拉黑 123456 2h（2小时后自动解除）"
+            )
             return
         
-        # 添加到黑名单
-        self.add_to_blacklist(target_id, sender_id)
+        duration = 0
+        if len(args) > 1:
+            duration = parse_duration(args[1])
+            if not duration:
+                yield event.plain_result("⚠ 时长格式不正确\n支持：30s、10m、2h、7d 或纯数字（秒）")
+                return
+        
+        session = await self._apply_blacklist(event, target_id, sender_id, duration)
+        self._record_event("blacklist", target_id, sender_id, duration=duration, had_session=bool(session))
+        await self._publish_shared("blacklist_add", user_id=target_id, servicer_id=sender_id, duration=duration)
+        
+        expire_tip = f"{format_duration(duration)}后自动解除" if duration else ""
+        if self.share_blacklist:
+            scope_tip = f"全局，{expire_tip}" if expire_tip else "全局"
+            yield event.plain_result(f"✅ 已将用户 {target_id} 加入黑名单（{scope_tip}）")
+        else:
+            scope_tip = f"（{expire_tip}）" if expire_tip else ""
+            yield event.plain_result(f"✅ 已将用户 {target_id} 加入您的黑名单{scope_tip}")
+    
+    async def _apply_blacklist(
+        self, event: AiocqhttpMessageEvent, target_id: str, servicer_id: str, duration: int
+    ) -> dict | None:
+        """拉黑用户，并结束其在本实例中的对话或排队（本地 /拉黑 和其他实例同步的拉黑共用）
+
+        Returns:
+            被结束的会话，用户没有进行中的会话时为None
+        """
+        await self._blacklist_ready()
+        async with self.session_locks.hold(target_id):
+            self.add_to_blacklist(target_id, servicer_id, duration)
+            
+            # 如果用户正在对话或排队，移除
+            session = self.session_map.pop(target_id, None)
+            if session:
+                self.timeout_manager.stop_timer(target_id)
+            queued = next(
+                (item for queue in self.servicer_queue.values() for item in queue if str(item["user_id"]) == target_id),
+                None,
+            )
+            self.remove_from_queue(target_id)
+        
+        session_servicer = session.get("servicer_id") if session else None
+        await self._release_shared(target_id, session_servicer)
         
-        # 如果用户正在对话或排队，移除
-        if target_id in self.session_map:
-            session = self.session_map[target_id]
+        if session:
             await self.send(
                 event,
                 message="您已被客服拉黑，对话已结束",
                 group_id=session.get("group_id"),
                 user_id=target_id,
             )
-            del self.session_map[target_id]
+            # 拉黑来自其他客服（或其他实例）时，通知正在服务该用户的客服
+            if session_servicer and session_servicer != servicer_id:
+                await self.send(
+                    event,
+                    message=f"⚠ 用户 {self.get_user_display(target_id)} 已被拉黑，对话已结束",
+                    user_id=session_servicer,
+                )
+        elif queued:
+            await self.send(
+                event,
+                message="您已被客服拉黑，已退出排队",
+                group_id=queued.get("group_id"),
+                user_id=target_id,
+            )
+        return session
+    
+    @filter.command("重载配置", priority=1)
+    async def reload_plugin_config(self, event: AiocqhttpMessageEvent):
+        sender_id = event.get_sender_id()
+        if sender_id not in self.servicers_id:
+            return
         
-        self.remove_from_queue(target_id)
+        try:
+            config = await asyncio.to_thread(self._load_config_from_disk)
+        except (OSError, ValueError) as e:
+            yield event.plain_result(f"❌ 读取配置失败：{e}")
+            return
         
-        if self.share_blacklist:
-            yield event.plain_result(f"✅ 已将用户 {target_id} 加入黑名单（全局）")
+        changes, errors = await self.reload_config(config)
+        if errors:
+            error_list = "\n".join(f"• {error}" for error in errors)
+            yield event.plain_result(f"❌ 新配置校验失败，未做任何修改：\n{error_list}")
+        elif not changes:
+            yield event.plain_result("✅ 配置没有变化")
+        else:
+            change_list = "\n".join(f"• {change}" for change in changes)
+            yield event.plain_result(f"✅ 配置已重载，进行中的会话不受影响：\n{change_list}")
+    
+    @filter.command("性能分析", priority=1)
+    async def profile_handlers(self, event: AiocqhttpMessageEvent):
+        sender_id = event.get_sender_id()
+        if sender_id not in self.servicers_id:
+            return
+        
+        # 参数：[秒数] [事件数] 或 停止
+        args = self._get_command_args(event, "性能分析").split()
+        if args and args[0] == "停止":
+            if not self.profiler:
+                yield event.plain_result("⚠ 当前没有进行中的性能分析")
+                return
+            yield event.plain_result(await self._finish_profiling())
+            return
+        
+        if self.profiler:
+            yield event.plain_result("⚠ 性能分析已在进行中，可使用 /性能分析 停止 提前结束")
+            return
+        
+        if not all(arg.isdigit() for arg in args[:2]):
+            yield event.plain_result(
+                "⚠ 参数格式不正确\n使用格式：/性能分析 [秒数] [事件数]\n"
+                "示例：/性能分析 60 500（分析60秒或500个事件，先到为准）"
+            )
+            return
+        duration = min(int(args[0]) if args else self.PROFILE_DEFAULT_SECONDS, self.PROFILE_MAX_SECONDS)
+        max_events = int(args[1]) if len(args) > 1 else 0
+        
+        from .profiler import HandlerProfiler
+        
+        profiler = HandlerProfiler(sender_id, duration, max_events)
+        try:
+            profiler.start()
+        except ValueError as e:
+            yield event.plain_result(f"❌ 无法开启性能分析：{e}")
+            return
+        self.profiler = profiler
+        self._profiler_task = asyncio.create_task(self._finish_profiling_later(event, duration))
+        
+        event_tip = f"或 {max_events} 个事件" if max_events else ""
+        yield event.plain_result(
+            f"🔍 已开启性能分析，将在 {duration} 秒{event_tip}后自动结束并发送结果\n"
+            f"💡 使用 /性能分析 停止 可提前结束"
+        )
+    
+    async def _finish_profiling_later(self, event: AiocqhttpMessageEvent, duration: int):
+        await asyncio.sleep(duration)
+        self._profiler_task = None
+        if self.profiler:
+            summary = await self._finish_profiling()
+            await self.send(event, message=summary, user_id=event.get_sender_id())
+    
+    async def _finish_profiling(self) -> str:
+        """停止性能分析，返回热点函数摘要"""
+        profiler, self.profiler = self.profiler, None
+        if self._profiler_task and self._profiler_task is not asyncio.current_task():
+            self._profiler_task.cancel()
+        self._profiler_task = None
+        
+        output_path = self.data_dir / f"profile_{time.strftime('%Y%m%d_%H%M%S')}.prof"
+        return profiler.stop(str(output_path))
+    
+    @filter.command("缓存统计", priority=1)
+    async def show_cache_stats(self, event: AiocqhttpMessageEvent):
+        sender_id = event.get_sender_id()
+        if sender_id not in self.servicers_id:
+            return
+        
+        media = self.media_cache
+        media_lookups = media.hits + media.misses
+        media_hit_rate = f"{media.hits / media_lookups:.1%}" if media_lookups else "-"
+        nickname = self.nickname_resolver.cache
+        nickname_lookups = nickname.hits + nickname.misses
+        nickname_hit_rate = f"{nickname.hits / nickname_lookups:.1%}" if nickname_lookups else "-"
+        
+        yield event.plain_result(
+            f"📊 缓存统计\n"
+            f"🖼 媒体缓存：{len(media)} 项，{media.total_bytes / 1024:.1f} KB，"
+            f"命中 {media.hits} / 未命中 {media.misses}（命中率 {media_hit_rate}），淘汰 {media.evictions}\n"
+            f"👤 昵称缓存：{len(nickname)} 项，命中率 {nickname_hit_rate}\n"
+            f"🔁 消息去重：记录 {len(self.message_deduplicator)} 条，已丢弃重复 {self.message_deduplicator.duplicate_count} 条"
+        )
+    
+    @filter.command("添加快捷回复", priority=1)
+    async def add_quick_reply(self, event: AiocqhttpMessageEvent):
+        async for result in self._add_quick_reply(event, "添加快捷回复", shared=False):
+            yield result
+    
+    @filter.command("添加公共快捷回复", priority=1)
+    async def add_shared_quick_reply(self, event: AiocqhttpMessageEvent):
+        async for result in self._add_quick_reply(event, "添加公共快捷回复", shared=True):
+            yield result
+    
+    async def _add_quick_reply(self, event: AiocqhttpMessageEvent, command: str, shared: bool):
+        sender_id = event.get_sender_id()
+        if sender_id not in self.servicers_id:
+            return
+        
+        # 参数：触发词 内容（内容可以包含空格和换行）
+        parts = self._get_command_args(event, command).split(maxsplit=1)
+        prefix = self.quick_replies.TRIGGER_PREFIX
+        if len(parts) < 2 or not parts[0].startswith(prefix) or len(parts[0]) == len(prefix):
+            yield event.plain_result(
+                f"⚠ 参数格式不正确\n使用格式：/{command} {prefix}触发词 回复内容\n"
+                f"示例：/{command} {prefix}退款 请提供您的订单号，我们将尽快为您处理"
+            )
+            return
+        
+        trigger, content = parts
+        await self._quick_replies_ready()
+        self.quick_replies.add(trigger, content, None if shared else sender_id)
+        scope_tip = "公共快捷回复（所有客服可用）" if shared else "个人快捷回复"
+        yield event.plain_result(f"✅ 已添加{scope_tip}：{trigger}\n对话中发送 {trigger} 即可自动展开")
+    
+    @filter.command("删除快捷回复", priority=1)
+    async def remove_quick_reply(self, event: AiocqhttpMessageEvent):
+        sender_id = event.get_sender_id()
+        if sender_id not in self.servicers_id:
+            return
+        
+        trigger = self._get_command_args(event, "删除快捷回复")
+        if not trigger:
+            yield event.plain_result("⚠ 请提供要删除的触发词\n使用格式：/删除快捷回复 触发词")
+            return
+        
+        # 优先删除个人快捷回复，其次删除公共快捷回复
+        await self._quick_replies_ready()
+        if self.quick_replies.remove(trigger, sender_id):
+            yield event.plain_result(f"✅ 已删除个人快捷回复：{trigger}")
+        elif self.quick_replies.remove(trigger):
+            yield event.plain_result(f"✅ 已删除公共快捷回复：{trigger}")
         else:
-            servicer_name = self.get_servicer_name(sender_id)
-            yield event.plain_result(f"✅ 已将用户 {target_id} 加入您的黑名单")
+            yield event.plain_result(f"⚠ 快捷回复 {trigger} 不存在")
+    
+    @filter.command("快捷回复列表", priority=1)
+    async def list_quick_replies(self, event: AiocqhttpMessageEvent):
+        sender_id = event.get_sender_id()
+        if sender_id not in self.servicers_id:
+            return
+        
+        await self._quick_replies_ready()
+        personal, shared = self.quick_replies.list_replies(sender_id)
+        if not personal and not shared:
+            yield event.plain_result("📋 暂无快捷回复\n💡 使用 /添加快捷回复 #触发词 内容 添加")
+            return
+        
+        lines = []
+        for title, replies in (("👤 个人快捷回复", personal), ("👥 公共快捷回复", shared)):
+            if replies:
+                lines.append(title)
+                for trigger, content in replies.items():
+                    preview = content if len(content) <= 30 else content[:30] + "..."
+                    lines.append(f"  {trigger} → {preview}")
+        yield event.plain_result("\n".join(lines))
+    
+    @filter.command("客服统计", priority=1)
+    async def show_analytics(self, event: AiocqhttpMessageEvent):
+        sender_id = event.get_sender_id()
+        if sender_id not in self.servicers_id:
+            return
+        
+        if not self.enable_analytics:
+            yield event.plain_result("⚠ 统计功能未启用")
+            return
+        
+        # 参数：日（今天，默认）或 周（最近7天）
+        period = self._get_command_args(event, "客服统计")
+        today_start = time.mktime(time.strptime(time.strftime("%Y-%m-%d"), "%Y-%m-%d"))
+        if period in ("周", "week"):
+            title, since = "📊 最近7天客服统计", today_start - 6 * 86400
+        else:
+            title, since = "📊 今日客服统计", today_start
+        
+        from .analytics import COUNTER_NAMES
+        
+        summary = self.analytics.summarize(since)
+        if not summary:
+            yield event.plain_result(f"{title}\n暂无数据")
+            return
+        
+        # 第一行为全部客服合计，之后按客服列出（"" 为未分配客服的请求）
+        groups = [("全部", sum(summary.values(), Counter()))]
+        groups += [(self.get_servicer_name(sid), summary[sid]) for sid in self.servicers_id if sid in summary]
+        if "" in summary:
+            groups.append(("未分配", summary[""]))
+        lines = [title]
+        for name, counters in groups:
+            items = [f"{label} {counters[key]}" for key, label in COUNTER_NAMES.items() if counters[key]]
+            lines.append(f"【{name}】" + ("，".join(items) if items else "无"))
+        lines.append("💡 使用 /客服统计 周 查看最近7天")
+        yield event.plain_result("\n".join(lines))
     
     @filter.command("kfhelp", priority=1)
     async def show_help(self, event: AiocqhttpMessageEvent):
@@ -556,21 +1374,30 @@ class HumanServicePlugin(Star):
         sender_id = event.get_sender_id()
         if sender_id not in self.servicers_id:
             return
+        await self._blacklist_ready()
         
         # 如果是共用黑名单或单客服
         if self.share_blacklist or len(self.servicers_id) == 1:
-            # 直接显示黑名单
-            blacklist = self.blacklist_manager.get_blacklist(sender_id if not self.share_blacklist else None)
-            title = "📋 黑名单列表（共用）" if self.share_blacklist else "📋 您的黑名单列表"
+            # 分页显示黑名单，参数为页码
+            page_arg = self._get_command_args(event, "查看黑名单")
+            page = int(page_arg) if page_arg.isdigit() else 1
             
-            if not blacklist:
+            scope_id = sender_id if not self.share_blacklist else None
+            if not self.blacklist_manager.get_count(scope_id):
                 yield event.plain_result("✅ 黑名单为空")
                 return
             
-            # 使用BlacklistFormatter格式化
-            blacklist_text = await BlacklistFormatter.format_blacklist(blacklist, event, title)
-            if blacklist_text:
-                yield event.plain_result(blacklist_text)
+            blacklist, total_pages = self.blacklist_manager.get_page(scope_id, page, self.BLACKLIST_PAGE_SIZE)
+            page = min(max(page, 1), total_pages)
+            title = "📋 黑名单列表（共用）" if self.share_blacklist else "📋 您的黑名单列表"
+            title += f" 第 {page}/{total_pages} 页"
+            
+            blacklist_text = await self.format_blacklist(
+                event, blacklist, title, scope_id, (page - 1) * self.BLACKLIST_PAGE_SIZE
+            )
+            if total_pages > 1:
+                blacklist_text += "\n\n💡 使用 /查看黑名单 页码 翻页"
+            yield event.plain_result(blacklist_text)
         else:
             # 多客服独立黑名单，显示客服列表供选择
             self.blacklist_view_selection[sender_id] = {"status": "selecting"}
@@ -583,27 +1410,71 @@ class HumanServicePlugin(Star):
             
             servicer_list = "\n".join(servicer_list_items)
             yield event.plain_result(
-                f"请选择要查看的客服黑名单（回复序号）：\n{servicer_list}\n\n回复 0 取消"
+                f"请选择要查看的客服黑名单（回复序号，翻页回复 \"序号 页码\"）：\n{servicer_list}\n\n回复 0 取消"
             )
     
+    async def select_blacklist_view(self, event: AiocqhttpMessageEvent, sender_id: str, message_text: str) -> str:
+        """处理多客服独立黑名单的选择（回复 "序号" 或 "序号 页码"），昵称同样通过 format_blacklist 批量查询"""
+        parts = message_text.split()
+        if not parts or not all(part.isdigit() for part in parts[:2]):
+            return "⚠ 请输入数字进行选择，回复 0 取消"
+        choice = int(parts[0])
+        if choice == 0:
+            self.blacklist_view_selection.pop(sender_id, None)
+            return "✅ 已取消查看黑名单"
+        if not 1 <= choice <= len(self.servicers_id):
+            return f"⚠ 无效的序号，请输入 1-{len(self.servicers_id)} 之间的数字，回复 0 取消"
+        self.blacklist_view_selection.pop(sender_id, None)
+        
+        servicer_id = self.servicers_id[choice - 1]
+        servicer_name = self.get_servicer_name(servicer_id)
+        if not self.blacklist_manager.get_count(servicer_id):
+            return f"✅ {servicer_name} 的黑名单为空"
+        
+        page = int(parts[1]) if len(parts) > 1 else 1
+        blacklist, total_pages = self.blacklist_manager.get_page(servicer_id, page, self.BLACKLIST_PAGE_SIZE)
+        page = min(max(page, 1), total_pages)
+        blacklist_text = await self.format_blacklist(
+            event,
+            blacklist,
+            f"📋 {servicer_name} 的黑名单 第 {page}/{total_pages} 页",
+            servicer_id,
+            (page - 1) * self.BLACKLIST_PAGE_SIZE,
+        )
+        if total_pages > 1:
+            blacklist_text += "\n\n💡 使用 /查看黑名单 后回复 \"序号 页码\" 翻页"
+        return blacklist_text
+    
+    async def format_blacklist(
+        self,
+        event: AiocqhttpMessageEvent,
+        blacklist: list[str],
+        title: str,
+        servicer_id: str | None = None,
+        start_index: int = 0,
+    ) -> str:
+        """格式化黑名单，昵称通过缓存批量查询，查询不到时只显示QQ号"""
+        names = await self.nickname_resolver.resolve_many(event.bot, blacklist)
+        
+        now = time.time()
+        lines = [title]
+        for idx, user_id in enumerate(blacklist, start_index + 1):
+            name = names.get(user_id, user_id)
+            line = f"{idx}. {name}({user_id})" if name != user_id else f"{idx}. {user_id}"
+            expire_at = self.blacklist_manager.get_expire_time(user_id, servicer_id)
+            if expire_at > 0:
+                line += f" ⏰ 剩余{format_duration(max(int(expire_at - now), 1))}"
+            lines.append(line)
+        return "\n".join(lines)
+    
     @filter.command("取消拉黑", priority=1)
     async def unblacklist_user(self, event: AiocqhttpMessageEvent):
         sender_id = event.get_sender_id()
         if sender_id not in self.servicers_id:
             return
+        await self._blacklist_ready()
         
-        # 获取命令参数（AstrBot会自动移除命令部分）
-        # 尝试多种方式获取参数
-        message_text = event.message_str.strip()
-        
-        # 如果消息还包含命令本身，移除它
-        if message_text.startswith("/取消拉黑"):
-            target_id = message_text.replace("/取消拉黑", "", 1).strip()
-        elif message_text.startswith("取消拉黑"):
-            target_id = message_text.replace("取消拉黑", "", 1).strip()
-        else:
-            # 可能AstrBot已经移除了命令，直接使用消息内容
-            target_id = message_text
+        target_id = self._get_command_args(event, "取消拉黑")
         
         # 验证QQ号格式
         if not target_id or not target_id.isdigit():
@@ -612,6 +1483,8 @@ class HumanServicePlugin(Star):
         
         # 从黑名单移除
         success = self.remove_from_blacklist(target_id, sender_id)
+        if success:
+            await self._publish_shared("blacklist_remove", user_id=target_id, servicer_id=sender_id)
         
         if success:
             if self.share_blacklist:
@@ -620,6 +1493,64 @@ class HumanServicePlugin(Star):
                 yield event.plain_result(f"✅ 已将用户 {target_id} 从您的黑名单移除")
         else:
             yield event.plain_result(f"⚠ 用户 {target_id} 不在黑名单中")
+    
+    @filter.command("导入黑名单", priority=1)
+    async def import_blacklist(self, event: AiocqhttpMessageEvent):
+        sender_id = event.get_sender_id()
+        if sender_id not in self.servicers_id:
+            return
+        await self._blacklist_ready()
+        
+        # 参数：文件路径 [拉黑时长]
+        args = self._get_command_args(event, "导入黑名单").split()
+        if not args:
+            yield event.plain_result(
+                "⚠ 请提供要导入的文件路径\n使用格式：/导入黑名单 文件路径 [时长]\n"
+                "文件中每行一个QQ号，也可用逗号或空格分隔"
+            )
+            return
+        
+        duration = 0
+        if len(args) > 1:
+            duration = parse_duration(args[1])
+            if not duration:
+                yield event.plain_result("⚠ 时长格式不正确\n支持：30s、10m、2h、7d 或纯数字（秒）")
+                return
+        
+        try:
+            # 大文件在线程中解析，名单只在事件循环中修改
+            entries, skipped = await asyncio.to_thread(
+                self.blacklist_manager.parse_import_file, args[0], duration
+            )
+        except (OSError, UnicodeDecodeError) as e:
+            yield event.plain_result(f"❌ 读取文件失败：{e}")
+            return
+        imported = self.blacklist_manager.apply_import(entries, sender_id)
+        
+        scope_tip = "全局黑名单" if self.share_blacklist else "您的黑名单"
+        yield event.plain_result(
+            f"✅ 已导入 {imported} 个QQ号到{scope_tip}"
+            + (f"，跳过 {skipped} 个无效条目" if skipped else "")
+            + (f"\n⏰ {format_duration(duration)}后自动解除" if duration else "")
+        )
+    
+    @filter.command("导出黑名单", priority=1)
+    async def export_blacklist(self, event: AiocqhttpMessageEvent):
+        sender_id = event.get_sender_id()
+        if sender_id not in self.servicers_id:
+            return
+        await self._blacklist_ready()
+        
+        export_path = self.data_dir / f"blacklist_export_{sender_id}_{int(time.time())}.txt"
+        # 在事件循环中生成导出内容，只在线程中写文件
+        lines = self.blacklist_manager.export_lines(sender_id)
+        try:
+            count = await asyncio.to_thread(self.blacklist_manager.write_export, str(export_path), lines)
+        except OSError as e:
+            yield event.plain_result(f"❌ 导出失败：{e}")
+            return
+        
+        yield event.plain_result(f"✅ 已导出 {count} 个QQ号\n📄 文件路径：{export_path}")
 
     @filter.command("接入对话", priority=1)
     async def accept_conversation(
@@ -636,24 +1567,34 @@ class HumanServicePlugin(Star):
                 if match := re.search(r"\((\d+)\)", text):
                     target_id = match.group(1)
 
-        session = self.session_map.get(target_id)
+        # 检查与接入在锁内完成，避免多个客服同时接入同一用户
+        async with self.session_locks.hold(target_id, sender_id):
+            session = self.session_map.get(target_id)
+            accepted = bool(session) and session["status"] == "waiting"
+            # 多实例部署时，同一客服同时只能在一个机器人账号中服务
+            busy_elsewhere = accepted and not await self._claim_shared_servicer(sender_id, target_id)
+            if busy_elsewhere:
+                accepted = False
+            elif accepted:
+                session["status"] = "connected"
+                session["servicer_id"] = sender_id
+                
+                # 记录对话开始时间
+                self.timeout_manager.start_timer(target_id)
+                
+                # 初始化聊天记录
+                if self.enable_chat_history:
+                    self.chat_history[target_id] = []
 
-        if not session or session["status"] != "waiting":
+        if busy_elsewhere:
+            yield event.plain_result("⚠ 您正在其他客服账号中服务用户，请先结束该对话")
+            return
+        if not accepted:
             yield event.plain_result(f"用户({target_id})未请求人工")
             return
-
-        if session["status"] == "connected":
-            yield event.plain_result("您正在与该用户对话")
-
-        session["status"] = "connected"
-        session["servicer_id"] = sender_id
-        
-        # 记录对话开始时间
-        self.timeout_manager.start_timer(target_id)
         
-        # 初始化聊天记录
-        if self.enable_chat_history:
-            self.chat_history[target_id] = []
+        self._record_event("accept", target_id, sender_id)
+        await self._claim_shared_user(target_id, "connected")
 
         # 生成接入提示
         servicer_name = self.get_servicer_name(sender_id)
@@ -687,14 +1628,19 @@ class HumanServicePlugin(Star):
                 if match := re.search(r"\((\d+)\)", text):
                     target_id = match.group(1)
 
-        session = self.session_map.get(target_id)
+        async with self.session_locks.hold(target_id):
+            session = self.session_map.get(target_id)
+            rejected = bool(session) and session["status"] == "waiting"
+            if rejected:
+                # 删除会话
+                del self.session_map[target_id]
 
-        if not session or session["status"] != "waiting":
+        if not rejected:
             yield event.plain_result(f"用户({target_id})未请求人工或已被接入")
             return
-
-        # 删除会话
-        del self.session_map[target_id]
+        
+        self._record_event("reject", target_id, sender_id)
+        await self._release_shared(target_id)
         
         # 通知用户
         await self.send(
@@ -725,7 +1671,9 @@ class HumanServicePlugin(Star):
         
         history = self.chat_history.get(target_user_id, [])
         
-        # 使用ChatHistoryExporter导出
+        # 使用ChatHistoryExporter导出（仅在导出时加载）
+        from .helpers import ChatHistoryExporter
+        
         success, message = await ChatHistoryExporter.export_as_forward(history, event, sender_id)
         
         if success:
@@ -749,10 +1697,27 @@ class HumanServicePlugin(Star):
             yield event.plain_result("当前无对话需要结束")
             return
         
-        session = self.session_manager.get_session(uid)
-        servicer_name = self.get_servicer_name(sender_id)
+        async with self.session_locks.hold(uid, sender_id):
+            # 获取锁期间会话可能已超时或被用户结束，需要重新确认
+            session = self.session_manager.get_session(uid)
+            if not session or session.get("servicer_id") != sender_id:
+                session = None
+            else:
+                # 清理会话和数据
+                self.session_manager.delete_session(uid)
+                self.timeout_manager.stop_timer(uid)
+                if uid in self.chat_history:
+                    del self.chat_history[uid]
+        
+        if not session:
+            yield event.plain_result("当前无对话需要结束")
+            return
+        
+        self._record_event("end", uid, sender_id)
+        await self._release_shared(uid, sender_id)
         
         # 通知用户
+        servicer_name = self.get_servicer_name(sender_id)
         await self.send(
             event,
             message=f"客服【{servicer_name}】已结束对话",
@@ -760,19 +1725,15 @@ class HumanServicePlugin(Star):
             user_id=uid,
         )
         
-        # 清理会话和数据
-        self.session_manager.delete_session(uid)
-        self.timeout_manager.stop_timer(uid)
-        if uid in self.chat_history:
-            del self.chat_history[uid]
-        
         # 使用CommandHandler处理队列中的下一位
         has_next = await self.command_handler.prepare_next_user_from_queue(
-            event, sender_id, f"✅ 已结束与用户 {uid} 的对话"
+            event, sender_id, f"✅ 已结束与用户 {self.get_user_display(uid)} 的对话"
         )
         
         if not has_next:
-            yield event.plain_result(f"✅ 已结束与用户 {uid} 的对话\n📋 当前队列为空")
+            yield event.plain_result(
+                f"✅ 已结束与用户 {self.get_user_display(uid)} 的对话\n{await self._queue_empty_tip(sender_id)}"
+            )
 
     async def send(
         self,
@@ -791,10 +1752,26 @@ class HumanServicePlugin(Star):
                 # 发送原文 + 翻译
                 message = f"{message}\n\n[翻译] {translation}"
         
-        if group_id and str(group_id) != "0":
-            await event.bot.send_group_msg(group_id=int(group_id), message=message)
-        elif user_id:
-            await event.bot.send_private_msg(user_id=int(user_id), message=message)
+        await self._deliver(event, message, delivery_target(group_id, user_id))
+
+    async def _deliver(self, event: AiocqhttpMessageEvent, message, target: DeliveryTarget):
+        """发送一条消息，群号有效时发到群聊，否则私聊，返回平台接口的结果"""
+        if target.is_group:
+            return await event.bot.send_group_msg(group_id=target.group_id, message=message)
+        elif target.user_id:
+            return await event.bot.send_private_msg(user_id=target.user_id, message=message)
+
+    async def _deliver_forward(self, event: AiocqhttpMessageEvent, contents: list, target: DeliveryTarget):
+        """将多条消息作为合并转发发送"""
+        self_id = event.get_self_id()
+        nodes = [
+            {"type": "node", "data": {"name": "人工客服", "uin": str(self_id), "content": content}}
+            for content in contents
+        ]
+        if target.is_group:
+            await event.bot.send_group_forward_msg(group_id=target.group_id, messages=nodes)
+        elif target.user_id:
+            await event.bot.send_private_forward_msg(user_id=target.user_id, messages=nodes)
 
     async def send_ob(
         self,
@@ -805,10 +1782,30 @@ class HumanServicePlugin(Star):
         is_from_servicer: bool = False,
     ):
         """向用户发onebot格式的消息，兼容群聊或私聊"""
-        ob_message = await event._parse_onebot_json(
-            MessageChain(chain=event.message_obj.message)
+        # 转发给会话用户时直接使用会话保存的投递目标
+        target = (
+            is_from_servicer and self.session_map.get_target(str(user_id))
+        ) or delivery_target(group_id, user_id)
+        # 合并发送时消息可能与其他消息合并，无法在发送失败时单独重发，只使用完整的消息段
+        ob_message, fresh_media, referenced = await self._convert_message(
+            event, use_references=not self.message_coalescer
         )
         
+        # 统计转发消息数（按客服归类）
+        if self.enable_analytics:
+            if is_from_servicer:
+                self.analytics.incr("msg_to_user", event.get_sender_id())
+            else:
+                self.analytics.incr("msg_to_servicer", str(user_id))
+        
+        # 客服发送快捷回复触发词时，先展开为预设内容，再添加前后缀和翻译
+        quick_reply = None
+        if is_from_servicer and is_pure_text_message(ob_message):
+            await self._quick_replies_ready()
+            quick_reply = self.quick_replies.expand(extract_text_from_message(ob_message), event.get_sender_id())
+            if quick_reply:
+                ob_message = [{"type": "text", "data": {"text": quick_reply.text}}]
+        
         # 提取原始文本用于翻译
         original_text = extract_text_from_message(ob_message)
         
@@ -824,57 +1821,221 @@ class HumanServicePlugin(Star):
                 if self.message_suffix:
                     ob_message = add_suffix_to_message(ob_message, self.message_suffix)
         
+        # 合并发送模式：原文先进入缓冲占好位置，译文在后台翻译，发送时再取结果，保证顺序和配对
+        if self.message_coalescer:
+            translation = None
+            if self.enable_translation:
+                translation = asyncio.create_task(
+                    self._translate_forwarded(original_text, is_from_servicer, quick_reply)
+                )
+
+            async def send(message):
+                await self._deliver(event, message, target)
+
+            async def forward(contents):
+                await self._deliver_forward(event, contents, target)
+
+            await self.message_coalescer.add(target.key, ob_message, translation, send, forward)
+            return
+        
         # 先发送主消息
-        if group_id and str(group_id) != "0":
-            await event.bot.send_group_msg(group_id=int(group_id), message=ob_message)
-        elif user_id:
-            await event.bot.send_private_msg(user_id=int(user_id), message=ob_message)
+        await self._deliver_media(event, ob_message, fresh_media, referenced, target)
         
         # 如果启用了翻译且有文本内容，发送翻译
-        if self.enable_translation and original_text and not self.enable_random_reply:
-            # 判断翻译方向
-            if is_from_servicer:
-                # 客服 -> 用户：翻译为目标语言
-                target_lang = self.translation_target_language
+        translation = await self._translate_forwarded(original_text, is_from_servicer, quick_reply)
+        if translation:
+            await self._deliver(event, f"[翻译] {translation}", target)
+
+    async def _convert_message(
+        self, event: AiocqhttpMessageEvent, use_references: bool = False
+    ) -> tuple[list | str, list[tuple[int, str]], bool]:
+        """将事件消息转换为OneBot格式，媒体消息段优先使用缓存
+
+        use_references=True 时优先使用已记录的平台文件引用。
+        返回 (消息, [(消息段序号, 缓存键)] 尚未记录引用的媒体, 是否使用了引用)
+        """
+        chain = event.message_obj.message
+        keys = [MediaSegmentCache.make_key(comp) for comp in chain]
+        
+        if any(keys):
+            # 媒体全部命中缓存且其余都是纯文本时，无需再次解析整条消息
+            segments = []
+            for comp, key in zip(chain, keys):
+                if key:
+                    segment = self.media_cache.get(key, reference=use_references)
+                elif isinstance(comp, Plain) and comp.text:
+                    segment = {"type": "text", "data": {"text": comp.text}}
+                else:
+                    segment = None
+                if segment is None:
+                    break
+                segments.append(segment)
             else:
-                # 用户 -> 客服：翻译为主语言
-                target_lang = self.translation_main_language
-            
+                fresh = [(i, key) for i, key in enumerate(keys) if key and not self.media_cache.has_reference(key)]
+                referenced = use_references and len(fresh) < sum(1 for key in keys if key)
+                return segments, fresh, referenced
+        
+        ob_message = await event._parse_onebot_json(MessageChain(chain=chain))
+        
+        # 组件与消息段一一对应时缓存媒体消息段
+        fresh = []
+        if any(keys) and isinstance(ob_message, list) and len(ob_message) == len(chain):
+            for index, (key, segment) in enumerate(zip(keys, ob_message)):
+                if key and not self.media_cache.has_reference(key):
+                    self.media_cache.put(key, segment)
+                    fresh.append((index, key))
+        return ob_message, fresh, False
+    
+    async def _deliver_media(
+        self,
+        event: AiocqhttpMessageEvent,
+        ob_message,
+        fresh_media: list[tuple[int, str]],
+        referenced: bool,
+        target: DeliveryTarget,
+    ):
+        """发送转换后的消息，成功后记录新媒体的平台文件引用
+
+        按引用发送失败时改用完整的消息段重发，重发成功说明平台不接受引用，之后不再使用引用。
+        """
+        media = self.media_cache
+        try:
+            result = await self._deliver(event, ob_message, target)
+        except Exception as e:
+            if not referenced:
+                raise
+            ob_message, fresh_media, _ = await self._convert_message(event)
+            await self._deliver(event, ob_message, target)
+            media.disable_references()
+            logger.warning(f"[人工客服] 平台不接受按文件标识转发媒体，之后将发送完整内容：{e}")
+            return
+        
+        if fresh_media and media.references_enabled and isinstance(result, dict) and result.get("message_id"):
+            await self._record_media_references(event, result["message_id"], len(ob_message), fresh_media)
+    
+    async def _record_media_references(
+        self, event: AiocqhttpMessageEvent, message_id, segment_count: int, fresh_media: list[tuple[int, str]]
+    ):
+        """读取已发送的消息，记录平台为其中媒体分配的文件标识（失败时忽略，下次转发仍发送完整内容）"""
+        try:
+            sent = await event.bot.get_msg(message_id=message_id)
+        except Exception as e:
+            logger.debug(f"[人工客服] 读取已发送消息 {message_id} 失败，未记录媒体文件标识：{e}")
+            return
+        # 消息段与发送时一一对应才能确定每个文件标识属于哪个媒体
+        segments = (sent or {}).get("message")
+        if not isinstance(segments, list) or len(segments) != segment_count:
+            return
+        for index, key in fresh_media:
+            if isinstance(segments[index], dict) and (reference := MediaSegmentCache.make_reference(segments[index])):
+                self.media_cache.set_reference(key, reference)
+    
+    async def _translate_forwarded(self, original_text: str, is_from_servicer: bool, quick_reply=None) -> str | None:
+        """翻译转发的消息，无需翻译或译文与原文相同时返回None
+
+        快捷回复展开的消息优先使用按语言缓存的译文，不再调用翻译API
+        """
+        if not (self.enable_translation and original_text and not self.enable_random_reply):
+            return None
+        
+        # 判断翻译方向
+        if is_from_servicer:
+            # 客服 -> 用户：翻译为目标语言
+            target_lang = self.translation_target_language
+        else:
+            # 用户 -> 客服：翻译为主语言
+            target_lang = self.translation_main_language
+        
+        translation = quick_reply and self.quick_replies.get_translation(quick_reply, target_lang)
+        if not translation:
             translation = await self.translate_text(original_text, target_lang)
-            if translation and translation != original_text:
-                # 发送翻译
-                translation_msg = f"[翻译] {translation}"
-                if group_id and str(group_id) != "0":
-                    await event.bot.send_group_msg(group_id=int(group_id), message=translation_msg)
-                elif user_id:
-                    await event.bot.send_private_msg(user_id=int(user_id), message=translation_msg)
+            if translation and quick_reply:
+                self.quick_replies.set_translation(quick_reply, target_lang, translation)
+        if translation and translation != original_text:
+            return translation
+        return None
 
-    @filter.event_message_type(filter.EventMessageType.ALL, priority=0)
-    async def silence_mode_filter(self, event: AiocqhttpMessageEvent):
-        """活动沉默模式拦截器 - 最高优先级"""
+    def _is_duplicate_event(self, event: AiocqhttpMessageEvent) -> bool:
+        """检查事件是否为重复投递，同一事件只判定一次"""
+        duplicate = event.get_extra("human_service_duplicate")
+        if duplicate is not None:
+            return duplicate
+        
+        message_id = event.message_obj.message_id
+        if message_id:
+            duplicate = self.message_deduplicator.is_duplicate(f"{event.get_self_id()}:{message_id}")
+        else:
+            duplicate = False
+        event.set_extra("human_service_duplicate", duplicate)
+        return duplicate
+
+    def _is_idle_group_event(self, event: AiocqhttpMessageEvent) -> bool:
+        """群聊消息所在的群没有进行中的会话，且发送者不是客服、也没有待处理的状态"""
+        group_id = event.get_group_id()
+        if not group_id or self.session_map.has_group(group_id):
+            return False
         sender_id = event.get_sender_id()
+        return not (
+            sender_id in self.session_map
+            or sender_id in self.selection_map
+            or sender_id in self.blacklist_view_selection
+            or sender_id in self.servicers_id
+        )
+    
+    @staticmethod
+    def _get_command_args(event: AiocqhttpMessageEvent, command: str) -> str:
+        """获取命令参数（兼容消息中是否仍包含命令本身）"""
         message_text = event.message_str.strip()
         
-        # 使用SilenceModeManager判断是否应该阻止
-        should_block = self.silence_mode_manager.should_block_message(
-            sender_id, 
-            message_text,
-            self.session_map,
-            self.selection_map,
-            self.blacklist_view_selection
-        )
+        # 如果消息还包含命令本身，移除它；否则AstrBot已经移除了命令，直接使用消息内容
+        for prefix in (f"/{command}", command):
+            if message_text.startswith(prefix):
+                return message_text[len(prefix):].strip()
+        return message_text
+
+    @filter.event_message_type(filter.EventMessageType.ALL, priority=0)
+    async def silence_mode_filter(self, event: AiocqhttpMessageEvent):
+        """活动沉默模式拦截器 - 最高优先级"""
+        # 重复投递的消息直接丢弃，不再路由或调用API
+        if self._is_duplicate_event(event):
+            event.stop_event()
+            return
         
-        if should_block:
+        if self.silence_rules.should_block(event.get_sender_id(), event.message_str.strip()):
             event.stop_event()
             # 返回空结果，阻止后续处理（包括AstrBot本体的AI）
             return
     
+    async def _run_checks(self, event: AiocqhttpMessageEvent):
+        """检查对话、排队和选择超时，并处理其他实例的共享状态变更"""
+        self._last_checks = time.monotonic()
+        await self.check_conversation_timeout(event)
+        await self.check_queue_timeout(event)
+        self.check_selection_timeout()
+        await self.check_shared_changes(event)
+    
     @filter.event_message_type(filter.EventMessageType.ALL)
     async def handle_match(self, event: AiocqhttpMessageEvent):
         """监听对话消息转发和客服选择"""
-        # 检查对话和排队超时
-        await self.check_conversation_timeout(event)
-        await self.check_queue_timeout(event)
+        if self._is_duplicate_event(event):
+            return
+        
+        # 没有进行中人工服务的群聊消息直接丢弃，这类消息只按间隔触发超时检查
+        if self._is_idle_group_event(event):
+            if time.monotonic() - self._last_checks >= self.IDLE_CHECK_INTERVAL:
+                await self._run_checks(event)
+            return
+        
+        await self._run_checks(event)
+        
+        # 性能分析达到事件数上限时结束并发送结果
+        if self.profiler and self.profiler.count_event():
+            requester_id = self.profiler.requester_id
+            summary = await self._finish_profiling()
+            await self.send(event, message=summary, user_id=requester_id)
+        
+        # 记录发送者昵称，供后续通知和黑名单显示使用
+        self.nickname_resolver.remember(event.get_sender_id(), event.get_sender_name())
         
         chain = event.get_messages()
         if not chain or any(isinstance(seg, (Reply)) for seg in chain):
@@ -882,17 +2043,15 @@ class HumanServicePlugin(Star):
         sender_id = event.get_sender_id()
         message_text = event.message_str.strip()
         
-        # 处理客服查看黑名单时的选择 - 使用MessageRouter
+        # 处理客服查看黑名单时的选择
         if sender_id in self.blacklist_view_selection:
-            async for result in self.message_router.handle_blacklist_view_selection(event, sender_id, message_text):
-                yield result
+            await self._blacklist_ready()
+            yield event.plain_result(await self.select_blacklist_view(event, sender_id, message_text))
             event.stop_event()
             return
         
         # 处理用户选择客服
         if sender_id in self.selection_map:
-            selection = self.selection_map[sender_id]
-            
             if not message_text.isdigit():
                 yield event.plain_result("⚠ 请输入数字进行选择")
                 event.stop_event()
@@ -900,19 +2059,32 @@ class HumanServicePlugin(Star):
             
             choice = int(message_text)
             
-            if choice == 0:
-                # 取消选择
-                del self.selection_map[sender_id]
+            # 选择在锁内处理，避免与 /转人机、排队分配等同时修改该用户的状态。
+            # 例外：handle_servicer_selection 在写入会话或排队状态后会直接通知客服，状态写入与通知
+            # 无法从外部拆开，因此这是唯一在持有锁时发送消息的地方；只锁定该用户所在的分段，
+            # 发送期间同一用户（及同分段用户）的其他事件会等待，其余会话不受影响
+            async with self.session_locks.hold(sender_id):
+                # 等待锁期间选择可能已被取消或过期，需要重新获取
+                selection = self.selection_map.get(sender_id)
+                if selection is None:
+                    outcome = "gone"
+                elif choice == 0:
+                    # 取消选择
+                    del self.selection_map[sender_id]
+                    outcome = "cancelled"
+                else:
+                    # 使用CommandHandler处理选择
+                    success, should_stop = await self.command_handler.handle_servicer_selection(
+                        event, sender_id, choice, selection
+                    )
+                    outcome = "selected"
+            
+            if outcome == "cancelled":
+                self._record_event("cancel", sender_id, stage="selecting")
+                await self._release_shared(sender_id)
                 yield event.plain_result("已取消客服选择")
                 event.stop_event()
-                return
-            
-            # 使用CommandHandler处理选择
-            success, should_stop = await self.command_handler.handle_servicer_selection(
-                event, sender_id, choice, selection
-            )
-            
-            if should_stop:
+            elif outcome == "gone" or should_stop:
                 event.stop_event()
             return
         
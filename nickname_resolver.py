@@ -0,0 +1,99 @@
+"""
+人工客服插件 - 昵称解析
+带缓存的QQ昵称查询，批量查询时限制并发并设置超时，超时的条目回退为显示QQ号
+"""
+import asyncio
+
+from .caches import TTLCache
+
+
+class NicknameResolver:
+    """昵称解析器（插件内共用一份缓存）"""
+
+    def __init__(self, ttl: float = 3600, max_size: int = 10000, concurrency: int = 8, timeout: float = 3.0):
+        self.cache = TTLCache(ttl, max_size)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        # 正在查询中的请求，同一QQ号的并发查询只调用一次API
+        self._pending: dict[str, asyncio.Task] = {}
+        # 每个请求的等待者数量，超时的调用只在没有其他等待者时取消请求
+        self._waiters: dict[asyncio.Task, int] = {}
+
+    def remember(self, user_id: str, nickname: str):
+        """记录已知的昵称（例如消息事件中携带的发送者昵称）"""
+        if user_id and nickname:
+            self.cache.set(str(user_id), nickname)
+
+    def get_cached(self, user_id: str) -> str | None:
+        return self.cache.get(str(user_id))
+
+    def display(self, user_id: str) -> str:
+        """返回 "昵称(QQ号)" 形式的显示文本，昵称未知时只返回QQ号"""
+        nickname = self.get_cached(user_id)
+        return f"{nickname}({user_id})" if nickname else str(user_id)
+
+    async def resolve(self, bot, user_id: str) -> str:
+        """查询单个用户昵称，失败或超时时返回QQ号"""
+        names = await self.resolve_many(bot, [user_id])
+        return names[str(user_id)]
+
+    async def resolve_many(self, bot, user_ids: list[str], deadline: float = 10.0) -> dict[str, str]:
+        """批量查询昵称
+
+        缓存未命中的条目并发查询（并发数受限），整体耗时不超过 deadline 秒，
+        未能在时限内查到的条目使用QQ号代替。
+        """
+        names: dict[str, str] = {}
+        misses = []
+        for user_id in map(str, user_ids):
+            nickname = self.cache.get(user_id)
+            if nickname:
+                names[user_id] = nickname
+            elif user_id not in names:
+                names[user_id] = user_id
+                misses.append(user_id)
+
+        if misses:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            tasks = [self._lookup(bot, user_id, semaphore) for user_id in misses]
+            try:
+                done, _ = await asyncio.wait(tasks, timeout=deadline)
+            finally:
+                for task in tasks:
+                    self._release(task)
+            for task in done:
+                if not task.cancelled() and task.exception() is None and task.result():
+                    user_id, nickname = task.result()
+                    names[user_id] = nickname
+        return names
+
+    def _lookup(self, bot, user_id: str, semaphore: asyncio.Semaphore) -> asyncio.Task:
+        task = self._pending.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(bot, user_id, semaphore))
+            self._pending[user_id] = task
+            task.add_done_callback(lambda _: self._pending.pop(user_id, None))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        return task
+
+    def _release(self, task: asyncio.Task):
+        """结束对请求的等待，没有其他调用在等待时取消未完成的请求"""
+        count = self._waiters.get(task, 0) - 1
+        if count > 0:
+            self._waiters[task] = count
+            return
+        self._waiters.pop(task, None)
+        if not task.done():
+            task.cancel()
+
+    async def _fetch(self, bot, user_id: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                info = await asyncio.wait_for(bot.get_stranger_info(user_id=int(user_id)), self.timeout)
+            except Exception:
+                return None
+        nickname = (info or {}).get("nickname")
+        if not nickname:
+            return None
+        self.cache.set(user_id, nickname)
+        return user_id, nickname
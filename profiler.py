@@ -0,0 +1,60 @@
+"""
+人工客服插件 - 性能分析
+由客服命令临时开启 cProfile，在限定时长或事件数后停止，保存分析文件并生成热点函数摘要
+"""
+import cProfile
+import os
+import pstats
+import time
+
+
+class HandlerProfiler:
+    """一次性能分析会话
+
+    只在分析期间创建和启用，未开启分析时插件中不存在任何分析开销。
+    """
+
+    def __init__(self, requester_id: str, duration: int, max_events: int, plugin_dir: str | None = None):
+        self.requester_id = requester_id
+        self.duration = duration
+        self.max_events = max_events
+        self.plugin_dir = plugin_dir or os.path.dirname(os.path.abspath(__file__))
+        self.event_count = 0
+        self.started_at = 0.0
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        """开始分析（同一线程中已有其他分析器运行时会抛出 ValueError）"""
+        self.started_at = time.monotonic()
+        self._profile.enable()
+
+    def count_event(self) -> bool:
+        """记录一个事件，达到事件数上限时返回True"""
+        self.event_count += 1
+        return 0 < self.max_events <= self.event_count
+
+    def stop(self, output_path: str, top_n: int = 10) -> str:
+        """停止分析，写入分析文件，返回热点函数摘要"""
+        self._profile.disable()
+        elapsed = time.monotonic() - self.started_at
+        self._profile.dump_stats(output_path)
+
+        stats = pstats.Stats(self._profile)
+        # 只统计插件自身的函数，按累计耗时排序
+        entries = [
+            (filename, lineno, funcname, ncalls, tottime, cumtime)
+            for (filename, lineno, funcname), (_, ncalls, tottime, cumtime, _) in stats.stats.items()
+            if os.path.abspath(filename).startswith(self.plugin_dir) and not filename.endswith("profiler.py")
+        ]
+        entries.sort(key=lambda entry: entry[5], reverse=True)
+
+        lines = [f"📊 性能分析完成：{elapsed:.1f} 秒，{self.event_count} 个事件"]
+        if not entries:
+            lines.append("期间没有执行插件代码")
+        for idx, (filename, lineno, funcname, ncalls, tottime, cumtime) in enumerate(entries[:top_n], 1):
+            lines.append(
+                f"{idx}. {funcname} ({os.path.basename(filename)}:{lineno}) "
+                f"调用{ncalls}次 累计{cumtime * 1000:.1f}ms 自身{tottime * 1000:.1f}ms"
+            )
+        lines.append(f"📄 分析文件：{output_path}")
+        return "\n".join(lines)
@@ -0,0 +1,217 @@
+"""
+人工客服插件 - 快捷回复
+客服发送触发词（如 #退款）时展开为预设内容，使用前缀树按消息长度线性匹配，
+展开内容的译文按目标语言缓存，重复使用时无需再调用翻译API
+"""
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+
+
+@dataclass
+class QuickReplyMatch:
+    """一次触发词匹配结果"""
+
+    scope: str
+    trigger: str
+    text: str
+    # 触发词后是否还有其他内容（有则展开结果不能直接使用缓存的译文）
+    has_extra: bool
+
+
+class QuickReplyStore:
+    """快捷回复存储
+
+    回复内容保存在 {范围: {触发词: 内容}} 中，范围为 SHARED（公共）或客服QQ号，
+    每个范围维护一棵前缀树。
+
+    保存方式与黑名单相同：事件循环中 save_delay 秒内的多次修改合并为一次，由后台任务在线程中写入；
+    autoload=False 时由调用方通过 load_async() 在线程中加载，保存推迟到加载完成后进行。
+    """
+
+    SHARED = "*"
+    # 触发词必须以该字符开头，避免普通消息被误展开
+    TRIGGER_PREFIX = "#"
+    # 前缀树节点中保存完整触发词的键
+    _END = ""
+
+    def __init__(self, data_file: str | None = None, save_delay: float = 1.0, autoload: bool = True):
+        self.data_file = data_file
+        self.save_delay = save_delay
+        self._replies: dict[str, dict[str, str]] = {}
+        self._tries: dict[str, dict] = {}
+        # {(范围, 触发词, 语言): 译文}
+        self._translations: dict[tuple[str, str, str], str] = {}
+        self._dirty = False
+        self._save_task: asyncio.Task | None = None
+        self._loaded = False
+        if autoload:
+            self.load()
+
+    def add(self, trigger: str, content: str, servicer_id: str | None = None):
+        """添加或覆盖快捷回复，servicer_id 为空时添加为公共回复"""
+        scope = str(servicer_id) if servicer_id else self.SHARED
+        self._replies.setdefault(scope, {})[trigger] = content
+        self._insert(scope, trigger)
+        self._drop_translations(scope, trigger)
+        self.save()
+
+    def remove(self, trigger: str, servicer_id: str | None = None) -> bool:
+        """删除快捷回复，不存在时返回False"""
+        scope = str(servicer_id) if servicer_id else self.SHARED
+        replies = self._replies.get(scope, {})
+        if trigger not in replies:
+            return False
+        del replies[trigger]
+        self._rebuild_trie(scope)
+        self._drop_translations(scope, trigger)
+        self.save()
+        return True
+
+    def list_replies(self, servicer_id: str) -> tuple[dict[str, str], dict[str, str]]:
+        """返回 (个人快捷回复, 公共快捷回复)"""
+        return dict(self._replies.get(str(servicer_id), {})), dict(self._replies.get(self.SHARED, {}))
+
+    def expand(self, text: str, servicer_id: str) -> QuickReplyMatch | None:
+        """展开消息开头的触发词
+
+        触发词后必须是消息结尾或空白，其后的内容换行追加到展开结果之后。
+        个人回复与公共回复都匹配时取较长的触发词，长度相同时个人回复优先。
+        """
+        if not text.startswith(self.TRIGGER_PREFIX):
+            return None
+
+        best = None
+        for scope in (str(servicer_id), self.SHARED):
+            trigger = self._longest_match(scope, text)
+            if trigger and (best is None or len(trigger) > len(best[1])):
+                best = (scope, trigger)
+        if best is None:
+            return None
+
+        scope, trigger = best
+        extra = text[len(trigger):].strip()
+        content = self._replies[scope][trigger]
+        return QuickReplyMatch(scope, trigger, f"{content}\n{extra}" if extra else content, bool(extra))
+
+    def get_translation(self, match: QuickReplyMatch, language: str) -> str | None:
+        if match.has_extra:
+            return None
+        return self._translations.get((match.scope, match.trigger, language))
+
+    def set_translation(self, match: QuickReplyMatch, language: str, translation: str):
+        if not match.has_extra:
+            self._translations[(match.scope, match.trigger, language)] = translation
+
+    # ---------- 前缀树 ----------
+
+    def _insert(self, scope: str, trigger: str):
+        node = self._tries.setdefault(scope, {})
+        for char in trigger:
+            node = node.setdefault(char, {})
+        node[self._END] = trigger
+
+    def _rebuild_trie(self, scope: str):
+        self._tries[scope] = {}
+        for trigger in self._replies.get(scope, {}):
+            self._insert(scope, trigger)
+
+    def _longest_match(self, scope: str, text: str) -> str | None:
+        node = self._tries.get(scope)
+        if not node:
+            return None
+        matched = None
+        for char in text:
+            if self._END in node and char.isspace():
+                matched = node[self._END]
+            node = node.get(char)
+            if node is None:
+                return matched
+        return node.get(self._END, matched)
+
+    def _drop_translations(self, scope: str, trigger: str):
+        for key in [key for key in self._translations if key[0] == scope and key[1] == trigger]:
+            del self._translations[key]
+
+    # ---------- 持久化 ----------
+
+    def load(self):
+        """从数据文件加载快捷回复（同步读取，事件循环中请使用 load_async）"""
+        self._replies = {}
+        self._tries = {}
+        self._merge(self._read_data_file())
+        self._loaded = True
+
+    async def load_async(self):
+        """在线程中读取数据文件，再在事件循环中合并（已有的触发词保持不变）
+
+        数据文件无法解析时将其另存为 .broken 文件后重新抛出异常，之后可以正常保存。
+        """
+        try:
+            self._merge(await asyncio.to_thread(self._read_data_file))
+        except Exception:
+            await asyncio.to_thread(self._set_aside_data_file)
+            raise
+        finally:
+            self._loaded = True
+            if self._dirty:
+                self.save()
+
+    def _read_data_file(self) -> dict:
+        if not self.data_file or not os.path.exists(self.data_file):
+            return {}
+        with open(self.data_file, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _set_aside_data_file(self):
+        if self.data_file and os.path.exists(self.data_file):
+            os.replace(self.data_file, f"{self.data_file}.broken")
+
+    def _merge(self, data: dict):
+        for scope, replies in data.get("replies", {}).items():
+            current = self._replies.setdefault(scope, {})
+            for trigger, content in replies.items():
+                if trigger not in current:
+                    current[trigger] = content
+                    self._insert(scope, trigger)
+
+    def save(self):
+        """标记已修改；在事件循环中运行时延迟合并保存，否则立即写入（加载完成前只做标记）"""
+        self._dirty = True
+        if not self._loaded:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._dirty = False
+            self._write(self._snapshot())
+            return
+        if self._save_task is None or self._save_task.done():
+            self._save_task = loop.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(self.save_delay)
+        while self._dirty:
+            self._dirty = False
+            await asyncio.to_thread(self._write, self._snapshot())
+
+    async def flush(self):
+        """等待未完成的保存（插件卸载时调用）"""
+        if self._save_task and not self._save_task.done():
+            await self._save_task
+        if self._dirty and self._loaded:
+            self._dirty = False
+            await asyncio.to_thread(self._write, self._snapshot())
+
+    def _snapshot(self) -> dict:
+        return {scope: dict(replies) for scope, replies in self._replies.items()}
+
+    def _write(self, replies: dict):
+        """保存快捷回复（先写临时文件再替换）"""
+        if not self.data_file:
+            return
+        tmp_file = f"{self.data_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "replies": replies}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.data_file)
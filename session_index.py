@@ -0,0 +1,89 @@
+"""
+人工客服插件 - 会话索引
+维护 群号 → 进行中用户 的索引，使没有人工服务的群聊消息可以直接丢弃；
+会话写入时将发送目标规范化为投递描述并随会话保存，转发给用户的消息直接复用，无需每次判断群聊或私聊
+"""
+from collections.abc import MutableMapping
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class DeliveryTarget:
+    """消息投递目标，group_id 为0表示私聊"""
+
+    group_id: int
+    user_id: int
+
+    @property
+    def is_group(self) -> bool:
+        return self.group_id != 0
+
+    @property
+    def key(self) -> str:
+        """同一投递目标的唯一键（群聊中多位用户共用同一个群）"""
+        return str(self.group_id) if self.group_id else f"u{self.user_id}"
+
+
+def delivery_target(group_id: int | str | None, user_id: int | str | None) -> DeliveryTarget:
+    """规范化发送目标：群号有效时发到群聊，否则私聊"""
+    group = int(group_id) if group_id and str(group_id) != "0" else 0
+    return DeliveryTarget(group, int(user_id) if user_id else 0)
+
+
+class SessionMap(MutableMapping):
+    """会话字典：{用户QQ号: 会话数据}，同时维护每个会话的投递目标和群号到进行中用户的索引
+
+    会话的群号在创建后不会改变，因此只需在写入和删除整条会话时更新投递目标和索引。
+    """
+
+    def __init__(self):
+        self._sessions: dict[str, dict] = {}
+        # {用户QQ号: 投递目标}，写入会话时计算
+        self._targets: dict[str, DeliveryTarget] = {}
+        # {群号: {用户QQ号}}，只包含群聊中发起的会话
+        self._groups: dict[str, set[str]] = {}
+
+    def __setitem__(self, user_id, session):
+        if user_id in self._sessions:
+            self._unindex(user_id)
+        self._sessions[user_id] = session
+        target = self._targets[user_id] = delivery_target(session.get("group_id"), user_id)
+        if target.is_group:
+            self._groups.setdefault(str(target.group_id), set()).add(user_id)
+
+    def __getitem__(self, user_id):
+        return self._sessions[user_id]
+
+    def __delitem__(self, user_id):
+        self._unindex(user_id)
+        del self._sessions[user_id]
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._sessions
+
+    def __iter__(self):
+        return iter(list(self._sessions))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _unindex(self, user_id):
+        target = self._targets.pop(user_id)
+        if not target.is_group:
+            return
+        users = self._groups.get(str(target.group_id))
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self._groups[str(target.group_id)]
+
+    def get_target(self, user_id: str) -> DeliveryTarget | None:
+        """获取会话用户的投递目标，没有会话时返回None"""
+        return self._targets.get(user_id)
+
+    def has_group(self, group_id: int | str) -> bool:
+        """群中是否有进行中的会话（等待接入或对话中）"""
+        return str(group_id) in self._groups
+
+    def get_group_users(self, group_id: int | str) -> set[str]:
+        return set(self._groups.get(str(group_id), ()))
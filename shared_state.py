@@ -0,0 +1,307 @@
+"""
+人工客服插件 - 多实例共享状态
+多个机器人账号（多个 AstrBot 实例）服务同一批用户时，通过本机共享的 SQLite 数据库协调：
+用户和客服的租约保证同一用户只在一个实例中排队或对话、同一客服同时只服务一位用户；
+排队记录保存在共享队列中，客服空闲时可原子地取出其他实例中等待的用户；
+黑名单变更、排队分配等通过变更记录表通知其他实例
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from astrbot.api import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    instance_id TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT '',
+    expire_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL UNIQUE,
+    servicer_id TEXT NOT NULL,
+    instance_id TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    -- 被其他实例取出的时间，0 表示未分配
+    assigned REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS queue_servicer ON queue (servicer_id, seq);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    instance_id TEXT NOT NULL,
+    target TEXT NOT NULL DEFAULT '',
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class SharedStateStore:
+    """基于 SQLite 的多实例共享状态
+
+    租约键为 "user:QQ号" 或 "servicer:QQ号"，持有实例需定期续约，实例异常退出后租约在
+    lease_ttl 秒后过期，其他实例即可接管。所有数据库操作在线程中执行，不阻塞事件循环。
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        instance_id: str,
+        lease_ttl: float = 120,
+        poll_interval: float = 1.0,
+        change_retention: float = 3600,
+    ):
+        self.db_path = str(db_path)
+        self.instance_id = instance_id
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.change_retention = change_retention
+        # 其他实例中正在服务用户的客服（由后台任务刷新，供同步代码直接查询）
+        self.remote_busy_servicers: set[str] = set()
+        # 其他实例发来的变更，由插件在处理消息时取出执行
+        self.pending_changes: deque[dict] = deque()
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+        self._data_version = None
+        # {租约键: 最近一次由本实例获取的时间}，获取后尚未写入本地状态的租约在宽限期内不会被同步释放
+        self._claimed_at: dict[str, float] = {}
+        self.claim_grace = lease_ttl / 3
+
+        db_dir = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        # isolation_level=None：由各操作自行用 BEGIN IMMEDIATE 控制事务
+        self._conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        # 只接收启动之后的变更
+        self._last_seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    @staticmethod
+    def user_key(user_id: str) -> str:
+        return f"user:{user_id}"
+
+    @staticmethod
+    def servicer_key(servicer_id: str) -> str:
+        return f"servicer:{servicer_id}"
+
+    async def _call(self, func: Callable, *args):
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func: Callable, *args):
+        with self._lock:
+            return func(*args)
+
+    def _transaction(self, func: Callable, *args):
+        """在写事务中执行，BEGIN IMMEDIATE 保证多个实例的读改写互斥"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(*args)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        return result
+
+    # ---------- 租约 ----------
+
+    async def claim(self, key: str, state: str = "") -> str:
+        """获取或续约租约，返回当前持有租约的实例ID（等于自身ID表示获取成功）"""
+        return await self._call(self._transaction, self._claim, key, state)
+
+    def _claim(self, key: str, state: str) -> str:
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO leases (key, instance_id, state, expire_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "instance_id = excluded.instance_id, state = excluded.state, expire_at = excluded.expire_at "
+            "WHERE leases.instance_id = excluded.instance_id OR leases.expire_at < ?",
+            (key, self.instance_id, state, now + self.lease_ttl, now),
+        )
+        owner = self._conn.execute("SELECT instance_id FROM leases WHERE key = ?", (key,)).fetchone()[0]
+        if owner == self.instance_id:
+            self._claimed_at[key] = now
+        return owner
+
+    async def release(self, *keys: str):
+        """释放自身持有的租约"""
+        await self._call(self._release, keys)
+
+    def _release(self, keys):
+        for key in keys:
+            self._claimed_at.pop(key, None)
+        self._conn.executemany(
+            "DELETE FROM leases WHERE key = ? AND instance_id = ?",
+            [(key, self.instance_id) for key in keys],
+        )
+
+    def _sync_leases(self, keys: set[str], claimed_before: float = float("inf")):
+        """使租约与本地状态一致：续约仍在使用的租约，补回丢失的租约，释放其余租约
+
+        keys 是在事件循环中先于本次同步取得的快照，快照之后（或之前不久）获取的租约可能还没有
+        对应的本地状态，因此只释放在 claimed_before 之前获取的租约，其余的留到下一轮再判断。
+        """
+        now = time.time()
+        owned = {row[0] for row in self._conn.execute(
+            "SELECT key FROM leases WHERE instance_id = ?", (self.instance_id,)
+        )}
+        self._conn.executemany(
+            "UPDATE leases SET expire_at = ? WHERE key = ? AND instance_id = ?",
+            [(now + self.lease_ttl, key, self.instance_id) for key in owned & keys],
+        )
+        for key in owned & keys:
+            self._claimed_at.pop(key, None)
+        for key in keys - owned:
+            self._claim(key, "")
+        self._release([key for key in owned - keys if self._claimed_at.get(key, 0) < claimed_before])
+        # 顺带清理过期租约和旧的变更记录
+        self._conn.execute("DELETE FROM leases WHERE expire_at < ?", (now,))
+        self._conn.execute("DELETE FROM changes WHERE created_at < ?", (now - self.change_retention,))
+        self._collect_queue(now)
+
+    def _collect_queue(self, now: float):
+        """清理其他实例遗留的排队记录
+
+        所属实例已不再持有用户租约（实例异常退出或用户已离开）的记录直接删除；
+        分配后超过租约有效期仍未被所属实例处理的记录也删除，所属实例仍在运行时会在下次同步时
+        重新写入队尾，用户可以再次被分配。
+        """
+        self._conn.execute(
+            "DELETE FROM queue WHERE instance_id != ? AND NOT EXISTS ("
+            "SELECT 1 FROM leases WHERE leases.key = ? || queue.user_id "
+            "AND leases.instance_id = queue.instance_id AND leases.expire_at >= ?)",
+            (self.instance_id, self.user_key(""), now),
+        )
+        self._conn.execute(
+            "DELETE FROM queue WHERE assigned > 0 AND assigned < ?", (now - self.lease_ttl,)
+        )
+
+    # ---------- 共享队列 ----------
+
+    def _sync_queue(self, entries: list[tuple[str, str]]):
+        """使共享队列中本实例的记录与本地队列一致，entries 为按排队顺序排列的 (用户QQ号, 客服QQ号)"""
+        wanted = dict(entries)
+        current = dict(self._conn.execute(
+            "SELECT user_id, servicer_id FROM queue WHERE instance_id = ?", (self.instance_id,)
+        ).fetchall())
+        if current != wanted:
+            self._transaction(self._write_queue, current, entries)
+
+    def _write_queue(self, current: dict[str, str], entries: list[tuple[str, str]]):
+        wanted = dict(entries)
+        self._conn.executemany(
+            "DELETE FROM queue WHERE user_id = ? AND instance_id = ?",
+            [(user_id, self.instance_id) for user_id, servicer_id in current.items()
+             if wanted.get(user_id) != servicer_id],
+        )
+        # 新记录按本地顺序追加到队尾，已有记录保持原来的位置
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO queue (user_id, servicer_id, instance_id, enqueued_at) VALUES (?, ?, ?, ?)",
+            [(user_id, servicer_id, self.instance_id, now) for user_id, servicer_id in entries
+             if current.get(user_id) != servicer_id],
+        )
+
+    async def dequeue(self, servicer_id: str) -> dict | None:
+        """原子地取出排在某位客服队列最前面的其他实例的用户，多个实例同时调用也不会取到同一用户
+
+        只取所属实例仍持有用户租约的记录，已退出实例遗留的记录不会被分配。
+        取出的记录只标记为已分配，由所属实例将用户移出本地队列后删除，期间不会被重复取出。
+        """
+        return await self._call(self._transaction, self._dequeue, str(servicer_id))
+
+    def _dequeue(self, servicer_id: str) -> dict | None:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT queue.seq, queue.user_id, queue.instance_id, queue.enqueued_at FROM queue "
+            "JOIN leases ON leases.key = ? || queue.user_id AND leases.instance_id = queue.instance_id "
+            "WHERE queue.servicer_id = ? AND queue.instance_id != ? AND queue.assigned = 0 "
+            "AND leases.expire_at >= ? ORDER BY queue.seq LIMIT 1",
+            (self.user_key(""), servicer_id, self.instance_id, now),
+        ).fetchone()
+        if not row:
+            return None
+        self._conn.execute("UPDATE queue SET assigned = ? WHERE seq = ?", (now, row[0]))
+        return {"user_id": row[1], "instance_id": row[2], "enqueued_at": row[3]}
+
+    # ---------- 变更通知 ----------
+
+    async def publish(self, kind: str, target: str = "", **payload):
+        """发布变更，target 为空时通知所有其他实例"""
+        await self._call(
+            self._conn.execute,
+            "INSERT INTO changes (instance_id, target, kind, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+            (self.instance_id, target, kind, json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+
+    def _poll(self, force: bool = False):
+        """读取其他实例的新变更和客服租约（数据库自上次读取后未被其他连接修改时直接跳过）"""
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version and not force:
+            return
+        self._data_version = data_version
+
+        rows = self._conn.execute(
+            "SELECT seq, kind, payload FROM changes WHERE seq > ? AND instance_id != ? AND target IN ('', ?) "
+            "ORDER BY seq",
+            (self._last_seq, self.instance_id, self.instance_id),
+        ).fetchall()
+        for seq, kind, payload in rows:
+            self.pending_changes.append({"kind": kind, **json.loads(payload)})
+            self._last_seq = seq
+
+        prefix = self.servicer_key("")
+        self.remote_busy_servicers = {
+            key[len(prefix):]
+            for (key,) in self._conn.execute(
+                "SELECT key FROM leases WHERE key LIKE ? AND instance_id != ? AND expire_at >= ?",
+                (f"{prefix}%", self.instance_id, time.time()),
+            )
+        }
+
+    # ---------- 后台任务 ----------
+
+    def start(self, lease_keys: Callable[[], set[str]], queue_entries: Callable[[], list[tuple[str, str]]]):
+        """启动后台同步任务
+
+        Args:
+            lease_keys: 返回本实例当前应持有的租约键
+            queue_entries: 返回本地队列中按顺序排列的 (用户QQ号, 客服QQ号)
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(lease_keys, queue_entries))
+
+    async def _run(self, lease_keys: Callable, queue_entries: Callable):
+        # 每 1/3 租约有效期续约一次，并强制刷新客服租约（其他实例的租约可能已过期）
+        renew_every = max(1, int(self.lease_ttl / 3 / self.poll_interval))
+        rounds = 0
+        while True:
+            try:
+                renew = rounds % renew_every == 0
+                await self._call(self._sync_queue, queue_entries())
+                await self._call(self._poll, renew)
+                if renew:
+                    # 先确定释放的截止时间再取快照，宽限期内获取的租约不会因快照过旧被释放
+                    claimed_before = time.time() - self.claim_grace
+                    await self._call(self._transaction, self._sync_leases, lease_keys(), claimed_before)
+            except sqlite3.Error as e:
+                # 数据库暂时被锁定等错误不中断后台任务，下一轮重试
+                logger.warning(f"[人工客服] 共享状态同步失败：{e}")
+            rounds += 1
+            await asyncio.sleep(self.poll_interval)
+
+    async def close(self):
+        """停止后台任务，释放本实例的全部租约和排队记录（插件卸载时调用）"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self._call(self._transaction, self._sync_leases, set())
+        await self._call(self._sync_queue, [])
+        await self._call(self._conn.close)
@@ -0,0 +1,89 @@
+"""
+人工客服插件 - 活动沉默模式规则
+启动时将放行规则编译为命令前缀树和用户集合，每条消息只需几次哈希查询即可得出是否拦截
+"""
+from collections.abc import Mapping
+
+
+class CommandTrie:
+    """命令前缀树：判断消息是否以某个命令开头"""
+
+    # 节点中表示命令结束的标记
+    _END = ""
+
+    def __init__(self, commands=()):
+        self._root: dict = {}
+        for command in commands:
+            self.add(command)
+
+    def add(self, command: str):
+        command = command.strip()
+        if not command:
+            return
+        node = self._root
+        for char in command:
+            node = node.setdefault(char, {})
+        node[self._END] = True
+
+    def match(self, text: str) -> bool:
+        """消息以完整命令开头（命令后为结尾或空白）时返回True"""
+        node = self._root
+        for char in text:
+            if self._END in node and char.isspace():
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return self._END in node
+
+
+class SilenceRuleEngine:
+    """活动沉默模式规则引擎
+
+    放行规则：
+    - 客服的所有消息
+    - 正在对话或等待接入、选择客服、查看黑名单中的用户消息
+    - 本插件的命令，以及配置中额外放行的其他插件命令
+    其余消息全部拦截。
+    """
+
+    # 本插件的全部命令
+    PLUGIN_COMMANDS = (
+        "转人工", "转人机", "取消排队", "排队状态", "kfhelp",
+        "接入对话", "拒绝接入", "结束对话", "导出记录", "翻译测试",
+        "拉黑", "取消拉黑", "查看黑名单", "导入黑名单", "导出黑名单",
+    )
+
+    def __init__(
+        self,
+        enabled: bool,
+        servicers_id: list[str],
+        captured_maps: tuple[Mapping, ...],
+        allowed_commands: list[str] = (),
+        wake_prefixes: list[str] = ("/",),
+    ):
+        self.captured_maps = captured_maps
+        self.compile(enabled, servicers_id, allowed_commands, wake_prefixes)
+
+    def compile(self, enabled: bool, servicers_id: list[str], allowed_commands: list[str] = (), wake_prefixes: list[str] = ("/",)):
+        """编译规则（启动或配置变更时调用）"""
+        self.enabled = enabled
+        self._servicers = frozenset(str(sid) for sid in servicers_id)
+        self._trie = CommandTrie((*self.PLUGIN_COMMANDS, *allowed_commands))
+        # 长前缀优先，避免 "//" 这类前缀只被去掉一半
+        self._wake_prefixes = tuple(sorted((p for p in wake_prefixes if p), key=len, reverse=True))
+
+    def should_block(self, sender_id: str, message_text: str) -> bool:
+        """判断消息是否应被拦截"""
+        if not self.enabled or sender_id in self._servicers:
+            return False
+
+        for captured in self.captured_maps:
+            if sender_id in captured:
+                return False
+
+        for prefix in self._wake_prefixes:
+            if message_text.startswith(prefix):
+                message_text = message_text[len(prefix):]
+                break
+        return not self._trie.match(message_text)
@@ -0,0 +1,14 @@
+"""
+测试配置：将插件目录注册为包，模块之间的相对导入（from .utils import ...）可以正常解析
+"""
+import sys
+import types
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+PACKAGE_NAME = "human_service"
+
+if PACKAGE_NAME not in sys.modules:
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [str(PLUGIN_DIR)]
+    sys.modules[PACKAGE_NAME] = package
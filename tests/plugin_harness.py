@@ -0,0 +1,364 @@
+"""
+插件测试环境：在没有 AstrBot 和 managers/helpers 包时安装最小实现，构造真实的插件实例并直接调用处理函数
+
+安装的 AstrBot 桩与 benchmarks/bench_startup.py 相同；managers/helpers 的桩按插件的调用方式实现了
+会话、排队、计时的基本状态转换。插件目录中已有这些包时使用真实实现。
+"""
+import asyncio
+import importlib
+import importlib.util
+import logging
+import sys
+import time
+import types
+
+from conftest import PACKAGE_NAME, PLUGIN_DIR
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+# ---------- AstrBot ----------
+
+class Star:
+    def __init__(self, context):
+        self.context = context
+
+
+class StarTools:
+    data_dir = None
+
+    @classmethod
+    def get_data_dir(cls, name):
+        return cls.data_dir
+
+
+class Component:
+    def __init__(self, text="", **fields):
+        self.text = text
+        self.__dict__.update(fields)
+
+
+class Plain(Component):
+    pass
+
+
+class Reply(Component):
+    pass
+
+
+class MessageChain:
+    def __init__(self, chain=None):
+        self.chain = chain or []
+
+
+def _install_astrbot():
+    def passthrough(*args, **kwargs):
+        return lambda func: func
+
+    event_filter = types.SimpleNamespace(
+        command=passthrough,
+        event_message_type=passthrough,
+        EventMessageType=types.SimpleNamespace(ALL="all"),
+    )
+    for name in (
+        "astrbot", "astrbot.core", "astrbot.core.config", "astrbot.core.message",
+        "astrbot.core.platform", "astrbot.core.platform.sources", "astrbot.core.platform.sources.aiocqhttp",
+    ):
+        _module(name, __path__=[])
+    _module("astrbot.api", logger=logging.getLogger("astrbot"), __path__=[])
+    _module("astrbot.api.event", filter=event_filter)
+    _module("astrbot.api.star", Context=object, Star=Star, StarTools=StarTools, register=passthrough)
+    _module("astrbot.core.config.astrbot_config", AstrBotConfig=dict)
+    _module("astrbot.core.message.components", Plain=Plain, Reply=Reply)
+    _module("astrbot.core.message.message_event_result", MessageChain=MessageChain)
+    _module("astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event", AiocqhttpMessageEvent=object)
+
+
+# ---------- managers / helpers ----------
+
+class SessionManager:
+    def __init__(self):
+        self.session_map = {}
+        self.selection_map = {}
+        self.blacklist_view_selection = {}
+
+    def create_session(self, user_id, data):
+        self.session_map[user_id] = data
+
+    def get_session(self, user_id):
+        return self.session_map.get(user_id)
+
+    def delete_session(self, user_id):
+        return self.session_map.pop(user_id, None) is not None
+
+    def get_user_by_servicer(self, servicer_id):
+        return next(
+            (uid for uid, session in self.session_map.items()
+             if session.get("servicer_id") == servicer_id and session.get("status") == "connected"),
+            None,
+        )
+
+    def is_servicer_busy(self, servicer_id):
+        return self.get_user_by_servicer(servicer_id) is not None
+
+
+class QueueManager:
+    def __init__(self, servicers_id):
+        self.servicer_queue = {sid: [] for sid in servicers_id}
+
+    def add(self, servicer_id, user_id, user_name, group_id):
+        self.servicer_queue.setdefault(servicer_id, []).append(
+            {"user_id": user_id, "name": user_name, "group_id": group_id, "join_time": time.time()}
+        )
+
+    def get_position(self, servicer_id, user_id):
+        for position, item in enumerate(self.servicer_queue.get(servicer_id, []), 1):
+            if item["user_id"] == user_id:
+                return position
+        return 0
+
+    def get_size(self, servicer_id):
+        return len(self.servicer_queue.get(servicer_id, []))
+
+    def remove(self, user_id):
+        for queue in self.servicer_queue.values():
+            for item in queue:
+                if item["user_id"] == user_id:
+                    queue.remove(item)
+                    return True
+        return False
+
+    def check_timeout(self, timeout):
+        expired = []
+        now = time.time()
+        for servicer_id, queue in self.servicer_queue.items():
+            for item in [item for item in queue if now - item["join_time"] > timeout]:
+                queue.remove(item)
+                expired.append({**item, "servicer_id": servicer_id})
+        return expired
+
+
+class TimeoutManager:
+    def __init__(self, conversation_timeout, warning_seconds):
+        self.conversation_timeout = conversation_timeout
+        self.warning_seconds = warning_seconds
+        self.timers = {}
+        self.warned = set()
+
+    def start_timer(self, user_id):
+        self.timers[user_id] = time.time()
+        self.warned.discard(user_id)
+
+    def stop_timer(self, user_id):
+        self.timers.pop(user_id, None)
+        self.warned.discard(user_id)
+
+    def get_remaining_time(self, user_id):
+        return self.conversation_timeout - (time.time() - self.timers.get(user_id, time.time()))
+
+    def get_users_need_warning(self):
+        return [
+            uid for uid in self.timers
+            if uid not in self.warned and 0 < self.get_remaining_time(uid) <= self.warning_seconds
+        ]
+
+    def mark_warned(self, user_id):
+        self.warned.add(user_id)
+
+    def get_timeout_users(self):
+        return [uid for uid in self.timers if self.get_remaining_time(uid) <= 0]
+
+
+class CommandHandler:
+    def __init__(self, plugin):
+        self.plugin = plugin
+
+    async def handle_transfer_to_human(self, event, sender_id, send_name, group_id):
+        plugin = self.plugin
+        await asyncio.sleep(0)
+        if sender_id in plugin.servicers_id:
+            return False, "⚠ 客服不能转人工", None
+        if sender_id in plugin.session_map or sender_id in plugin.selection_map:
+            return False, "⚠ 您已在人工服务中", None
+        if any(item["user_id"] == sender_id for queue in plugin.servicer_queue.values() for item in queue):
+            return False, "⚠ 您已在排队中", None
+        if plugin.is_user_blacklisted(sender_id):
+            return False, "⚠ 您已被拉黑", None
+        return True, "", None
+
+    def format_servicer_list(self, servicers):
+        return [f"{i}. {self.plugin.get_servicer_name(sid)}" for i, sid in enumerate(servicers, 1)], servicers
+
+    async def handle_servicer_selection(self, event, sender_id, choice, selection):
+        plugin = self.plugin
+        servicers = selection["available_servicers"]
+        if not 1 <= choice <= len(servicers):
+            await plugin.send(event, message="⚠ 序号无效", group_id=selection["group_id"], user_id=sender_id)
+            return False, True
+        servicer_id = servicers[choice - 1]
+        del plugin.selection_map[sender_id]
+        if plugin.is_servicer_busy(servicer_id):
+            plugin.add_to_queue(servicer_id, sender_id, selection["name"], selection["group_id"])
+        else:
+            plugin.session_manager.create_session(sender_id, {
+                "servicer_id": "",
+                "status": "waiting",
+                "group_id": selection["group_id"],
+            })
+        await plugin.send(event, message=f"{selection['name']}({sender_id}) 请求转人工", user_id=servicer_id)
+        return True, True
+
+    async def prepare_next_user_from_queue(self, event, servicer_id, message):
+        plugin = self.plugin
+        queue = plugin.servicer_queue.get(servicer_id, [])
+        if not queue:
+            return False
+        item = queue.pop(0)
+        plugin.session_manager.create_session(item["user_id"], {
+            "servicer_id": "",
+            "status": "waiting",
+            "group_id": item["group_id"],
+        })
+        await plugin.send(event, message=f"{message}\n下一位：{item['user_id']}", user_id=servicer_id)
+        return True
+
+
+class MessageRouter:
+    def __init__(self, plugin):
+        self.plugin = plugin
+
+    async def route_servicer_to_user(self, event, sender_id):
+        return False
+
+    async def route_user_to_servicer(self, event, sender_id):
+        return False
+
+    async def handle_blacklist_view_selection(self, event, sender_id, message_text):
+        return
+        yield
+
+
+class HelpTextBuilder:
+    pass
+
+
+def _install_managers():
+    if not (PLUGIN_DIR / "managers").is_dir():
+        _module(
+            f"{PACKAGE_NAME}.managers", __path__=[],
+            QueueManager=QueueManager, SessionManager=SessionManager, TimeoutManager=TimeoutManager,
+            CommandHandler=CommandHandler, TranslationService=object,
+        )
+    if not (PLUGIN_DIR / "helpers").is_dir():
+        _module(
+            f"{PACKAGE_NAME}.helpers", __path__=[],
+            HelpTextBuilder=HelpTextBuilder, MessageRouter=MessageRouter, ChatHistoryExporter=object,
+        )
+
+
+def _astrbot_installed() -> bool:
+    module = sys.modules.get("astrbot")
+    if module is not None:
+        # 其他测试可能已安装只含日志对象的桩模块
+        return getattr(module, "__file__", None) is not None
+    return importlib.util.find_spec("astrbot") is not None
+
+
+def load_main():
+    """导入插件主模块（必要时先安装桩）"""
+    if not _astrbot_installed() and "astrbot.api.star" not in sys.modules:
+        _install_astrbot()
+    _install_managers()
+    return importlib.import_module(f"{PACKAGE_NAME}.main")
+
+
+# ---------- 事件 ----------
+
+class FakeBot:
+    """记录发出的消息，每次发送都会让出事件循环，使并发的处理函数交错执行"""
+
+    def __init__(self, rng=None):
+        self.rng = rng
+        self.sent: list[tuple[str, int, str]] = []
+
+    async def _pause(self):
+        await asyncio.sleep(self.rng.random() / 2000 if self.rng else 0)
+
+    async def send_group_msg(self, group_id, message):
+        await self._pause()
+        self.sent.append(("group", group_id, str(message)))
+
+    async def send_private_msg(self, user_id, message):
+        await self._pause()
+        self.sent.append(("private", user_id, str(message)))
+
+
+class FakeEvent:
+    _next_id = 0
+
+    def __init__(self, bot: FakeBot, sender_id: str, text: str = "", group_id: str = "", name: str = ""):
+        FakeEvent._next_id += 1
+        self.bot = bot
+        self.sender_id = sender_id
+        self.sender_name = name or f"用户{sender_id}"
+        self.group_id = group_id
+        self.message_str = text
+        self.message_obj = types.SimpleNamespace(message=[Plain(text)], message_id=str(FakeEvent._next_id))
+        self.stopped = False
+        self._extras = {}
+
+    def get_sender_id(self):
+        return self.sender_id
+
+    def get_sender_name(self):
+        return self.sender_name
+
+    def get_group_id(self):
+        return self.group_id
+
+    def get_self_id(self):
+        return "10000"
+
+    def get_messages(self):
+        return self.message_obj.message
+
+    def get_extra(self, key):
+        return self._extras.get(key)
+
+    def set_extra(self, key, value):
+        self._extras[key] = value
+
+    def plain_result(self, text):
+        return text
+
+    def stop_event(self):
+        self.stopped = True
+
+
+class StubContext:
+    def get_config(self):
+        return {"admins_id": ["10000"], "wake_prefix": ["/"]}
+
+
+def make_plugin(tmp_path, **config):
+    """构造插件实例，config 覆盖默认配置"""
+    main = load_main()
+    StarTools.data_dir = tmp_path
+    settings = {
+        "servicers_id": ["900", "901"],
+        "enable_analytics": False,
+        "enable_chat_history": True,
+        "enable_translation": False,
+    }
+    settings.update(config)
+    return main.HumanServicePlugin(StubContext(), settings)
+
+
+async def run(handler) -> list[str]:
+    """执行处理函数（异步生成器），返回它产出的回复"""
+    return [reply async for reply in handler if reply is not None]
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import time
+
+from human_service.analytics import AnalyticsStore
+
+
+def test_snapshot_does_not_share_daily_totals(tmp_path):
+    store = AnalyticsStore(str(tmp_path / "analytics.json"))
+    day = time.strftime("%Y-%m-%d")
+    store._daily[day] = {"10001": {"accepted": 1}}
+
+    snapshot = store._snapshot()
+    store._daily[day]["10001"]["accepted"] += 1
+    store._daily["2000-01-01"] = {}
+
+    assert snapshot["daily"] == {day: {"10001": {"accepted": 1}}}
+
+
+def test_cancel_counts_as_abandoned(tmp_path):
+    store = AnalyticsStore(str(tmp_path / "analytics.json"))
+    store.record_event("cancel")
+    store.record_event("cancel")
+
+    assert store.summarize(time.time() - 3600)[""]["abandoned"] == 2
+
+
+def test_load_async_merges_counts_recorded_before_load(tmp_path):
+    data_file = tmp_path / "analytics.json"
+    hour = int(time.time() // 3600)
+    data_file.write_text(json.dumps({"version": 1, "hours": {str(hour): {"": {"requests": 3}}}, "daily": {}}))
+    store = AnalyticsStore(str(data_file), autoload=False)
+
+    async def main():
+        store.record_event("transfer")
+        await store.save_async()
+        # 加载完成前不会保存，文件中的计数不会被覆盖
+        assert json.loads(data_file.read_text())["hours"][str(hour)][""]["requests"] == 3
+        await store.load_async()
+        await store.close()
+
+    asyncio.run(main())
+    assert store.summarize(time.time() - 3600)[""]["requests"] == 4
+    assert json.loads(data_file.read_text())["hours"][str(hour)][""]["requests"] == 4
+
+
+def test_broken_data_file_is_set_aside(tmp_path):
+    data_file = tmp_path / "analytics.json"
+    data_file.write_text("{broken")
+    store = AnalyticsStore(str(data_file), autoload=False)
+
+    async def main():
+        store.record_event("accept", "900")
+        try:
+            await store.load_async()
+        except ValueError:
+            pass
+        await store.close()
+
+    asyncio.run(main())
+    assert (tmp_path / "analytics.json.broken").read_text() == "{broken"
+    assert json.loads(data_file.read_text())["hours"]
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+from human_service.audit_log import AuditLogger
+from human_service.audit_report import build_report, collect_files, format_report, percentile, read_records
+
+
+def read_lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_buffer_overflow_drops_oldest_records(tmp_path):
+    logger = AuditLogger(tmp_path, flush_interval=60, buffer_size=3)
+
+    async def main():
+        for index in range(5):
+            logger.emit("transfer", user_id=str(index))
+        await logger.close()
+
+    asyncio.run(main())
+    assert logger.dropped_count == 2
+    assert [record["user_id"] for record in read_lines(tmp_path / "audit.jsonl")] == ["2", "3", "4"]
+
+
+def test_size_rotation_keeps_backup_count(tmp_path):
+    logger = AuditLogger(tmp_path, max_bytes=1, backup_count=2)
+    for index in range(4):
+        logger._write([{"event": "transfer", "user_id": str(index)}])
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["audit.jsonl", "audit.jsonl.1", "audit.jsonl.2"]
+    assert read_lines(tmp_path / "audit.jsonl")[0]["user_id"] == "3"
+    assert read_lines(tmp_path / "audit.jsonl.1")[0]["user_id"] == "2"
+    assert read_lines(tmp_path / "audit.jsonl.2")[0]["user_id"] == "1"
+
+    files = collect_files([str(tmp_path)])
+    assert [record["user_id"] for record in read_records(files)] == ["1", "2", "3"]
+
+
+def test_rotation_without_backups_starts_a_new_file(tmp_path):
+    logger = AuditLogger(tmp_path, max_bytes=1, backup_count=0)
+    logger._write([{"event": "transfer", "user_id": "1"}])
+    logger._write([{"event": "transfer", "user_id": "2"}])
+
+    assert [path.name for path in tmp_path.iterdir()] == ["audit.jsonl"]
+    assert read_lines(tmp_path / "audit.jsonl") == [{"event": "transfer", "user_id": "2"}]
+
+
+def test_build_report_pairs_wait_and_handling():
+    records = [
+        {"ts": 0, "event": "transfer", "user_id": "1"},
+        {"ts": 5, "event": "queue", "user_id": "1"},
+        {"ts": 10, "event": "accept", "user_id": "1", "servicer_id": "900"},
+        {"ts": 70, "event": "end", "user_id": "1", "servicer_id": "900"},
+        # 放弃等待的用户不计入等待时长
+        {"ts": 0, "event": "transfer", "user_id": "2"},
+        {"ts": 3, "event": "cancel", "user_id": "2"},
+        {"ts": 20, "event": "transfer", "user_id": "3"},
+        {"ts": 22, "event": "accept", "user_id": "3", "servicer_id": "901"},
+        {"ts": 32, "event": "timeout", "user_id": "3"},
+        # 没有接入的结束事件不计入处理时长
+        {"ts": 40, "event": "end", "user_id": "4"},
+    ]
+
+    report = build_report(records)
+    assert report["wait"] == {"900": [10], "901": [2]}
+    assert report["handle"] == {"900": [60], "901": [10]}
+    assert report["counts"]["transfer"] == 3 and report["counts"]["end"] == 2
+    assert "全部: n=2" in format_report(report)
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 90) == 90
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) == 0.0
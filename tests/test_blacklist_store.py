@@ -0,0 +1,118 @@
+import asyncio
+import json
+import time
+
+from human_service.blacklist_store import BlacklistStore
+
+
+def make_store(tmp_path, share_blacklist=True):
+    return BlacklistStore(["900", "901"], share_blacklist, tmp_path / "blacklist.json")
+
+
+def test_import_comma_separated_ids(tmp_path):
+    source = tmp_path / "ids.txt"
+    source.write_text("10001,10002\n10003 10004；10005\nabc\n", encoding="utf-8")
+    store = make_store(tmp_path)
+
+    assert store.import_file(str(source)) == (5, 1)
+    for user_id in ("10001", "10002", "10003", "10004", "10005"):
+        assert store.is_blacklisted(user_id)
+        assert store.get_expire_time(user_id) == 0
+
+
+def test_export_roundtrip_keeps_expiry(tmp_path):
+    store = make_store(tmp_path)
+    store.add("10001")
+    store.add("10002", duration=3600)
+    export_path = tmp_path / "export.txt"
+    assert store.export_file(str(export_path)) == 2
+    assert export_path.read_text(encoding="utf-8").splitlines()[0] == BlacklistStore.EXPORT_HEADER
+
+    other = BlacklistStore(["900"], True, tmp_path / "other.json")
+    assert other.import_file(str(export_path)) == (2, 0)
+    assert other.get_expire_time("10001") == 0
+    assert abs(other.get_expire_time("10002") - store.get_expire_time("10002")) < 1
+
+
+def test_export_format_skips_expired_entries(tmp_path):
+    source = tmp_path / "export.txt"
+    source.write_text(
+        f"{BlacklistStore.EXPORT_HEADER}\n10001,{int(time.time()) - 10}\n10002,{int(time.time()) + 3600}\n",
+        encoding="utf-8",
+    )
+    store = make_store(tmp_path)
+
+    assert store.import_file(str(source)) == (1, 1)
+    assert not store.is_blacklisted("10001")
+    assert store.is_blacklisted("10002")
+
+
+def test_filter_servicers_uses_reverse_index(tmp_path):
+    store = make_store(tmp_path, share_blacklist=False)
+    store.add("10001", "900")
+
+    assert store.filter_servicers("10001", ["900", "901"]) == ["901"]
+    assert store.filter_servicers("10002", ["900", "901"]) == ["900", "901"]
+    assert not store.is_blacklisted("10001")
+    store.add("10001", "901")
+    assert store.is_blacklisted("10001")
+
+
+def test_saves_are_batched_in_event_loop(tmp_path):
+    store = make_store(tmp_path)
+    writes = []
+    original_write = store._write
+
+    def counting_write(lists):
+        writes.append(lists)
+        original_write(lists)
+
+    store._write = counting_write
+
+    async def main():
+        store.save_delay = 0.05
+        for index in range(100):
+            store.add(str(10000 + index))
+        assert not writes
+        await store.flush()
+
+    asyncio.run(main())
+    assert len(writes) == 1
+    data = json.loads((tmp_path / "blacklist.json").read_text(encoding="utf-8"))
+    assert len(data["lists"][BlacklistStore.SHARED]) == 100
+
+
+def test_load_async_merges_with_changes_made_before_load(tmp_path):
+    data_file = tmp_path / "blacklist.json"
+    data_file.write_text(json.dumps({"version": 1, "lists": {"*": {"10001": 0, "10002": 0}}}), encoding="utf-8")
+    store = BlacklistStore(["900"], True, data_file, save_delay=0, autoload=False)
+
+    async def main():
+        store.add("10003")
+        assert not data_file.read_text(encoding="utf-8").count("10003")
+        await store.load_async()
+        await store.flush()
+
+    asyncio.run(main())
+    assert store.get_blacklist() == ["10003", "10001", "10002"]
+    assert set(json.loads(data_file.read_text(encoding="utf-8"))["lists"]["*"]) == {"10001", "10002", "10003"}
+
+
+def test_broken_data_file_is_set_aside(tmp_path):
+    data_file = tmp_path / "blacklist.json"
+    data_file.write_text("{broken", encoding="utf-8")
+    store = BlacklistStore(["900"], True, data_file, save_delay=0, autoload=False)
+
+    async def main():
+        try:
+            await store.load_async()
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("解析失败应抛出异常")
+        store.add("10001")
+        await store.flush()
+
+    asyncio.run(main())
+    assert (tmp_path / "blacklist.json.broken").read_text(encoding="utf-8") == "{broken"
+    assert json.loads(data_file.read_text(encoding="utf-8"))["lists"] == {"*": {"10001": 0}}
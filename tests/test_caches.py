@@ -0,0 +1,138 @@
+import time
+
+from human_service.caches import ExpiringDict, MediaSegmentCache
+
+
+class Component:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class Image(Component):
+    pass
+
+
+class Video(Component):
+    pass
+
+
+class File(Component):
+    @property
+    def file(self):
+        raise AssertionError("读取 File.file 会同步下载文件")
+
+
+class Plain(Component):
+    pass
+
+
+def key(component):
+    return MediaSegmentCache.make_key(component)
+
+
+def test_files_with_same_name_do_not_collide():
+    first = File(name="report.pdf", file_="", url="https://example.com/a/report.pdf")
+    second = File(name="report.pdf", file_="", url="https://example.com/b/report.pdf")
+
+    assert key(first) and key(second)
+    assert key(first) != key(second)
+
+
+def test_file_display_name_alone_is_not_cached():
+    assert key(File(name="report.pdf", file_="", url="")) is None
+    assert key(Video(file="movie.mp4")) is None
+
+
+def test_same_file_id_shares_key():
+    assert key(File(name="report.pdf", file_id="abc", url="")) == key(File(name="report.pdf", file_id="abc", url=""))
+
+
+def test_segment_fields_are_part_of_key():
+    url = "https://example.com/download?fileid=1"
+    assert key(Image(file="a.image", url=url, subType=0)) != key(Image(file="a.image", url=url, subType=1))
+    assert key(Video(url=url, cover="")) != key(Video(url=url, cover="cover.jpg"))
+
+
+def test_volatile_url_params_are_ignored():
+    first = Image(file="a.image", url="https://example.com/download?fileid=1&rkey=x")
+    second = Image(file="a.image", url="https://example.com/download?fileid=1&rkey=y")
+    other = Image(file="a.image", url="https://example.com/download?fileid=2&rkey=x")
+
+    assert key(first) == key(second)
+    assert key(first) != key(other)
+
+
+def test_image_file_name_identifies_content():
+    assert key(Image(file="ABCDEF.image")) != key(Image(file="123456.image"))
+
+
+def test_non_media_components_are_not_cached():
+    assert key(Plain(text="report.pdf")) is None
+
+
+def test_expiring_dict_reports_expired_entries():
+    expired = []
+    data = ExpiringDict(ttl=0.01, on_expire=lambda key, value: expired.append((key, value)))
+    data["a"] = 1
+    data["b"] = 2
+    time.sleep(0.02)
+    data["c"] = 3
+
+    assert "a" not in data
+    assert data.purge() == 1
+    assert expired == [("a", 1), ("b", 2)]
+    assert data.evicted_count == 2
+    assert list(data) == ["c"]
+
+
+def test_expiring_dict_delete_is_not_expiry():
+    expired = []
+    data = ExpiringDict(ttl=60, on_expire=lambda key, value: expired.append(key))
+    data["a"] = 1
+    del data["a"]
+
+    assert data.purge() == 0
+    assert expired == []
+
+
+def test_expiring_dict_ttl_change_applies_to_existing_entries():
+    data = ExpiringDict(ttl=60)
+    data["a"] = 1
+    time.sleep(0.05)
+    data["b"] = 2
+    data.ttl = 0.03
+
+    assert data.purge() == 1
+    assert "b" in data
+    assert list(data) == ["b"]
+
+    data.ttl = 0
+    time.sleep(0.05)
+    assert data.purge() == 0
+    assert list(data) == ["b"]
+
+
+def test_media_reference_is_used_only_when_requested():
+    cache = MediaSegmentCache()
+    segment = {"type": "image", "data": {"file": "base64://AAAA"}}
+    cache.put("k", segment)
+
+    assert MediaSegmentCache.make_reference({"type": "image", "data": {"file": "base64://AAAA"}}) is None
+    assert MediaSegmentCache.make_reference({"type": "image", "data": {"file": "https://x/a.png?rkey=1"}}) is None
+    reference = MediaSegmentCache.make_reference({"type": "image", "data": {"file": "ABCD.image", "url": "https://x"}})
+    assert reference == {"type": "image", "data": {"file": "ABCD.image"}}
+
+    cache.set_reference("k", {"type": "record", "data": {"file": "ABCD.amr"}})
+    assert not cache.has_reference("k")
+    cache.set_reference("k", reference)
+    assert cache.has_reference("k")
+    assert cache.get("k", reference=True) == reference
+    assert cache.get("k") == segment
+
+    total = cache.total_bytes
+    cache.disable_references()
+    assert not cache.has_reference("k")
+    assert cache.get("k", reference=True) == segment
+    assert cache.total_bytes < total
+    cache.set_reference("k", reference)
+    assert not cache.has_reference("k")
@@ -0,0 +1,65 @@
+import asyncio
+
+from human_service.coalescer import MessageCoalescer
+
+
+def text(content: str) -> list:
+    return [{"type": "text", "data": {"text": content}}]
+
+
+async def translate_after(delay: float, translation: str) -> str:
+    await asyncio.sleep(delay)
+    return translation
+
+
+def run_burst(translations: list) -> list:
+    """在同一窗口内依次加入消息，返回实际发出的内容"""
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def forward(contents):
+        sent.append(contents)
+
+    async def main():
+        coalescer = MessageCoalescer(window_ms=50)
+        # 各条消息的处理并发进行，与 AstrBot 并发处理事件一致
+        await asyncio.gather(*[
+            coalescer.add("u1", text(f"msg{index}"), asyncio.create_task(translate_after(delay, translation)), send, forward)
+            for index, (delay, translation) in enumerate(translations)
+        ])
+        await asyncio.sleep(0.3)
+        await coalescer.flush_all()
+
+    asyncio.run(main())
+    return sent
+
+
+def test_idle_message_is_sent_before_its_translation():
+    assert run_burst([(0.01, "t0")]) == [text("msg0"), "[翻译] t0"]
+
+
+def test_slow_translation_keeps_message_order():
+    # 第一条消息的译文最慢完成，后续消息仍排在它之后
+    sent = run_burst([(0.1, "t0"), (0.12, "t1"), (0.0, "t2")])
+    assert sent[0] == text("msg0")
+    assert sent[1] == "[翻译] t0"
+    assert sent[2] == "msg1\n[翻译] t1\nmsg2\n[翻译] t2"
+
+
+def test_failed_translation_still_sends_original():
+    async def fail():
+        raise RuntimeError("translation api down")
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def main():
+        coalescer = MessageCoalescer(window_ms=50)
+        await coalescer.add("u1", text("hello"), asyncio.create_task(fail()), send, send)
+
+    asyncio.run(main())
+    assert sent == [text("hello")]
@@ -0,0 +1,198 @@
+import asyncio
+import random
+
+from human_service.locks import StripedLockRegistry
+from plugin_harness import FakeBot, FakeEvent, make_plugin, run
+
+
+class Lifecycle:
+    """按插件记录的状态变化事件检查每位用户的状态转换是否合法
+
+    请求（选择客服后）→ 接入 → 结束/超时/用户结束，或请求 → 取消/拒绝；
+    同一请求被接入两次、结束不存在的对话等都会记为违规。
+    """
+
+    def __init__(self):
+        self.state: dict[str, tuple[str, str | None]] = {}
+        self.violations: list[str] = []
+        self.counts: dict[str, int] = {}
+
+    def record(self, event_type: str, user_id: str, servicer_id: str | None = None, **fields):
+        user_id = str(user_id)
+        self.counts[event_type] = self.counts.get(event_type, 0) + 1
+        state, current = self.state.get(user_id, ("idle", None))
+        if event_type in ("transfer", "queue"):
+            if state != "idle":
+                self.violations.append(f"{user_id}: {event_type} while {state}")
+            self.state[user_id] = ("pending", None)
+        elif event_type == "accept":
+            if state != "pending":
+                self.violations.append(f"{user_id}: accepted by {servicer_id} while {state} ({current})")
+            self.state[user_id] = ("connected", servicer_id)
+        elif event_type in ("end", "timeout", "user_end"):
+            if state != "connected" or (servicer_id and servicer_id != current):
+                self.violations.append(f"{user_id}: {event_type} by {servicer_id} while {state} ({current})")
+            self.state[user_id] = ("idle", None)
+        elif event_type in ("cancel", "reject"):
+            if state != "pending":
+                self.violations.append(f"{user_id}: {event_type} while {state}")
+            self.state[user_id] = ("idle", None)
+
+
+def make_stress_plugin(tmp_path, rng):
+    # 启用共享状态：租约读写在线程中执行，检查与修改之间确实会让出事件循环
+    plugin = make_plugin(
+        tmp_path,
+        servicers_id=[str(900 + i) for i in range(20)],
+        enable_servicer_selection=True,
+        conversation_timeout=0,
+        queue_timeout=0,
+        shared_state_db=str(tmp_path / "shared.db"),
+    )
+    plugin.session_locks = StripedLockRegistry(stripes=16)
+    lifecycle = Lifecycle()
+    plugin._record_event = lifecycle.record
+    return plugin, lifecycle, FakeBot(rng)
+
+
+def test_interleaved_handlers_keep_state_consistent(tmp_path):
+    rng = random.Random(42)
+    users = [str(100000 + i) for i in range(40)]
+    servicers = [str(900 + i) for i in range(20)]
+    plugin, lifecycle, bot = make_stress_plugin(tmp_path, rng)
+
+    def user_event(user_id, text):
+        return FakeEvent(bot, user_id, text)
+
+    def servicer_event(servicer_id, text):
+        return FakeEvent(bot, servicer_id, text)
+
+    async def main():
+        await asyncio.gather(*[run(plugin.transfer_to_human(user_event(u, "/转人工"))) for u in users])
+
+        events = []
+        for _ in range(2000):
+            kind = rng.choice(("select", "select", "select", "accept", "accept", "accept", "end", "timeout", "bot", "reject", "request", "request"))
+            user_id, servicer_id = rng.choice(users), rng.choice(servicers)
+            if kind == "select":
+                choice = str(rng.randint(0, len(servicers)))
+                events.append(run(plugin.handle_match(user_event(user_id, choice))))
+            elif kind == "accept":
+                events.append(run(plugin.accept_conversation(servicer_event(servicer_id, "/接入对话"), user_id)))
+            elif kind == "end":
+                events.append(run(plugin.end_conversation(servicer_event(servicer_id, "/结束对话"))))
+            elif kind == "timeout":
+                events.append(plugin._timeout_conversation(user_event(user_id, ""), user_id))
+            elif kind == "bot":
+                events.append(run(plugin.transfer_to_bot(user_event(user_id, "/转人机"))))
+            elif kind == "reject":
+                events.append(run(plugin.reject_conversation(servicer_event(servicer_id, "/拒绝接入"), user_id)))
+            else:
+                events.append(run(plugin.transfer_to_human(user_event(user_id, "/转人工"))))
+        await asyncio.wait_for(asyncio.gather(*events), timeout=60)
+        await plugin.terminate()
+
+    asyncio.run(main())
+
+    assert not lifecycle.violations, lifecycle.violations[:5]
+    assert lifecycle.counts.get("accept", 0) > 20
+    # 本地状态互相一致：对话中的用户有计时器，等待中的用户没有，用户不会同时处于多个状态
+    connected = {uid for uid, session in plugin.session_map.items() if session["status"] == "connected"}
+    assert set(plugin.conversation_timers) == connected
+    queued = [item["user_id"] for queue in plugin.servicer_queue.values() for item in queue]
+    assert len(queued) == len(set(queued))
+    assert not set(queued) & set(plugin.session_map)
+    assert not set(plugin.selection_map) & (set(queued) | set(plugin.session_map))
+    for uid in connected:
+        assert lifecycle.state[uid] == ("connected", plugin.session_map[uid]["servicer_id"])
+
+
+def test_contended_waiting_users_have_one_outcome(tmp_path):
+    rng = random.Random(7)
+    plugin, lifecycle, bot = make_stress_plugin(tmp_path, rng)
+    users = [str(100 + i) for i in range(20)]
+
+    async def main():
+        for user_id in users:
+            await run(plugin.transfer_to_human(FakeEvent(bot, user_id, "/转人工")))
+            await run(plugin.handle_match(FakeEvent(bot, user_id, "1")))
+        # 每位等待中的用户同时被多位客服接入、拒绝，用户自己也在取消
+        events = []
+        for user_id in users:
+            events += [
+                run(plugin.accept_conversation(FakeEvent(bot, str(900 + i), "/接入对话"), user_id)) for i in range(10)
+            ]
+            events += [
+                run(plugin.reject_conversation(FakeEvent(bot, str(910 + i), "/拒绝接入"), user_id)) for i in range(5)
+            ]
+            events += [run(plugin.transfer_to_bot(FakeEvent(bot, user_id, "/转人机"))) for _ in range(2)]
+        rng.shuffle(events)
+        await asyncio.wait_for(asyncio.gather(*events), timeout=60)
+        await plugin.terminate()
+
+    asyncio.run(main())
+
+    assert not lifecycle.violations, lifecycle.violations[:5]
+    outcomes = lifecycle.counts.get("accept", 0) + lifecycle.counts.get("reject", 0) + lifecycle.counts.get("cancel", 0)
+    assert outcomes == len(users)
+
+
+def test_multi_key_holds_in_opposite_order_do_not_deadlock():
+    locks = StripedLockRegistry(stripes=8)
+    completed = []
+
+    async def worker(first: str, second: str):
+        for _ in range(20):
+            async with locks.hold(first, second):
+                await asyncio.sleep(0)
+            completed.append((first, second))
+
+    async def main():
+        pairs = [(str(a), str(b)) for a in range(10) for b in range(10) if a != b]
+        await asyncio.wait_for(asyncio.gather(*[worker(a, b) for a, b in pairs]), timeout=30)
+        return len(pairs)
+
+    pairs = asyncio.run(main())
+    assert len(completed) == pairs * 20
+
+
+def test_same_key_is_mutually_exclusive():
+    locks = StripedLockRegistry()
+    counter = {"value": 0}
+
+    async def increment():
+        async with locks.hold("100", "900"):
+            value = counter["value"]
+            await asyncio.sleep(0)
+            counter["value"] = value + 1
+
+    async def main():
+        await asyncio.gather(*[increment() for _ in range(500)])
+
+    asyncio.run(main())
+    assert counter["value"] == 500
+
+
+def test_empty_keys_are_ignored_and_distinct_keys_run_in_parallel():
+    locks = StripedLockRegistry(stripes=64)
+
+    async def hold_for(key, seconds):
+        async with locks.hold(key, None, ""):
+            await asyncio.sleep(seconds)
+
+    async def main():
+        keys = []
+        stripes = set()
+        candidate = 0
+        while len(keys) < 4:
+            stripe = locks._stripe(str(candidate))
+            if stripe not in stripes:
+                stripes.add(stripe)
+                keys.append(str(candidate))
+            candidate += 1
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*[hold_for(key, 0.1) for key in keys])
+        return loop.time() - started
+
+    assert asyncio.run(main()) < 0.3
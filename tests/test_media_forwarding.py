@@ -0,0 +1,86 @@
+import asyncio
+
+from plugin_harness import FakeBot, FakeEvent, Plain, make_plugin
+
+
+class Image:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class MediaEvent(FakeEvent):
+    def __init__(self, bot, sender_id, chain):
+        super().__init__(bot, sender_id)
+        self.message_obj.message = chain
+        self.conversions = 0
+
+    async def _parse_onebot_json(self, chain):
+        self.conversions += 1
+        return [
+            {"type": "image", "data": {"file": "base64://" + comp.file}} if isinstance(comp, Image)
+            else {"type": "text", "data": {"text": comp.text}}
+            for comp in chain.chain
+        ]
+
+
+class PlatformBot(FakeBot):
+    """发送后可通过 get_msg 读回消息，平台为图片分配文件标识"""
+
+    def __init__(self, accept_references=True):
+        super().__init__()
+        self.accept_references = accept_references
+        self.messages = {}
+        self.files = []
+
+    async def send_private_msg(self, user_id, message):
+        if not self.accept_references and any(
+            segment["type"] == "image" and not segment["data"]["file"].startswith("base64://") for segment in message
+        ):
+            raise RuntimeError("file not found")
+        await super().send_private_msg(user_id, message)
+        self.files.append(message[0]["data"]["file"])
+        message_id = len(self.messages) + 1
+        self.messages[message_id] = [
+            {"type": "image", "data": {"file": "PLATFORM.image", "url": "https://x/y?rkey=1"}}
+            if segment["type"] == "image" else segment
+            for segment in message
+        ]
+        return {"message_id": message_id}
+
+    async def get_msg(self, message_id):
+        return {"message": self.messages[message_id]}
+
+
+def image_event(bot):
+    return MediaEvent(bot, "900", [Image(file="abc.image", url="https://x/abc?rkey=1"), Plain("看这张")])
+
+
+def forward_twice(tmp_path, bot):
+    plugin = make_plugin(tmp_path, enable_message_coalescing=False)
+    plugin.session_map["100"] = {"servicer_id": "900", "status": "connected", "group_id": ""}
+    events = [image_event(bot), image_event(bot), image_event(bot)]
+
+    async def main():
+        for event in events:
+            await plugin.send_ob(event, user_id="100", is_from_servicer=True)
+        await plugin.terminate()
+
+    asyncio.run(main())
+    return plugin, events
+
+
+def test_repeated_media_is_forwarded_by_platform_file_id(tmp_path):
+    bot = PlatformBot()
+    plugin, events = forward_twice(tmp_path, bot)
+
+    assert bot.files == ["base64://abc.image", "PLATFORM.image", "PLATFORM.image"]
+    assert [event.conversions for event in events] == [1, 0, 0]
+    assert plugin.media_cache.has_reference(plugin.media_cache.make_key(events[0].message_obj.message[0]))
+
+
+def test_media_falls_back_to_full_content_when_references_fail(tmp_path):
+    bot = PlatformBot(accept_references=False)
+    plugin, events = forward_twice(tmp_path, bot)
+
+    assert bot.files == ["base64://abc.image"] * 3
+    assert not plugin.media_cache.references_enabled
@@ -0,0 +1,95 @@
+import asyncio
+
+from human_service.nickname_resolver import NicknameResolver
+from plugin_harness import FakeBot, FakeEvent, make_plugin, run
+
+
+class SlowBot:
+    def __init__(self, delays: dict[str, float]):
+        self.delays = delays
+        self.calls = []
+        self.cancelled = []
+
+    async def get_stranger_info(self, user_id):
+        self.calls.append(str(user_id))
+        try:
+            await asyncio.sleep(self.delays.get(str(user_id), 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(str(user_id))
+            raise
+        return {"nickname": f"昵称{user_id}"}
+
+
+def test_concurrent_lookups_share_one_request():
+    resolver = NicknameResolver()
+    bot = SlowBot({"1": 0.01})
+
+    async def main():
+        return await asyncio.gather(resolver.resolve(bot, "1"), resolver.resolve(bot, "1"))
+
+    assert asyncio.run(main()) == ["昵称1", "昵称1"]
+    assert bot.calls == ["1"]
+
+
+def test_deadline_does_not_cancel_lookup_shared_with_another_caller():
+    resolver = NicknameResolver()
+    bot = SlowBot({"1": 0.05})
+
+    async def main():
+        impatient = asyncio.create_task(resolver.resolve_many(bot, ["1"], deadline=0.01))
+        patient = asyncio.create_task(resolver.resolve_many(bot, ["1"], deadline=1))
+        return await impatient, await patient
+
+    impatient, patient = asyncio.run(main())
+    assert impatient == {"1": "1"}
+    assert patient == {"1": "昵称1"}
+    assert bot.calls == ["1"] and bot.cancelled == []
+
+
+def test_deadline_cancels_lookup_nobody_waits_for():
+    resolver = NicknameResolver()
+    bot = SlowBot({"1": 1, "2": 0})
+
+    async def main():
+        names = await resolver.resolve_many(bot, ["1", "2"], deadline=0.05)
+        await asyncio.sleep(0)
+        return names
+
+    assert asyncio.run(main()) == {"1": "1", "2": "昵称2"}
+    assert bot.cancelled == ["1"]
+    assert not resolver._pending and not resolver._waiters
+
+
+class NicknameBot(FakeBot):
+    def __init__(self):
+        super().__init__()
+        self.lookups = []
+
+    async def get_stranger_info(self, user_id):
+        self.lookups.append(str(user_id))
+        return {"nickname": f"昵称{user_id}"}
+
+
+def test_per_servicer_blacklist_view_uses_resolver(tmp_path):
+    plugin = make_plugin(tmp_path, share_blacklist=False)
+    bot = NicknameBot()
+
+    async def main():
+        await plugin._blacklist_ready()
+        plugin.blacklist_manager.add("100", "901")
+        plugin.blacklist_manager.add("101", "901", duration=3600)
+        plugin.nickname_resolver.remember("100", "小明")
+        menu = await run(plugin.view_blacklist(FakeEvent(bot, "900", "/查看黑名单")))
+        invalid = await plugin.select_blacklist_view(FakeEvent(bot, "900", "5"), "900", "5")
+        text = await plugin.select_blacklist_view(FakeEvent(bot, "900", "2"), "900", "2")
+        await plugin.terminate()
+        return menu, invalid, text
+
+    menu, invalid, text = asyncio.run(main())
+    assert "2. " in menu[0] and "2 人" in menu[0]
+    assert invalid.startswith("⚠ 无效的序号")
+    lines = text.split("\n")
+    assert lines[1] == "1. 小明(100)"
+    assert lines[2].startswith("2. 昵称101(101) ⏰ 剩余")
+    assert bot.lookups == ["101"]
+    assert "900" not in plugin.blacklist_view_selection
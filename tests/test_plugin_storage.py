@@ -0,0 +1,53 @@
+import asyncio
+
+from plugin_harness import FakeBot, FakeEvent, make_plugin, run
+
+
+def test_broken_blacklist_file_does_not_break_transfer(tmp_path):
+    (tmp_path / "blacklist.json").write_text("{broken", encoding="utf-8")
+    plugin = make_plugin(tmp_path, servicers_id=["900"])
+    bot = FakeBot()
+
+    async def main():
+        first = await run(plugin.transfer_to_human(FakeEvent(bot, "100", "/转人工")))
+        second = await run(plugin.transfer_to_human(FakeEvent(bot, "101", "/转人工")))
+        await plugin.terminate()
+        return first, second
+
+    assert asyncio.run(main()) == (["正在等待客服👤接入..."], ["正在等待客服👤接入..."])
+    assert (tmp_path / "blacklist.json.broken").exists()
+
+
+def test_blacklist_is_loaded_before_transfer_checks(tmp_path):
+    (tmp_path / "blacklist.json").write_text('{"version": 1, "lists": {"*": {"100": 0}}}', encoding="utf-8")
+    plugin = make_plugin(tmp_path, servicers_id=["900"])
+    bot = FakeBot()
+
+    async def main():
+        replies = await run(plugin.transfer_to_human(FakeEvent(bot, "100", "/转人工")))
+        await plugin.terminate()
+        return replies
+
+    assert asyncio.run(main()) == ["⚠ 您已被拉黑"]
+
+
+def test_broken_analytics_file_does_not_break_conversations(tmp_path):
+    (tmp_path / "analytics.json").write_text("{broken", encoding="utf-8")
+    plugin = make_plugin(tmp_path, servicers_id=["900"], enable_analytics=True)
+    bot = FakeBot()
+
+    async def main():
+        await run(plugin.transfer_to_human(FakeEvent(bot, "100", "/转人工")))
+        await run(plugin.accept_conversation(FakeEvent(bot, "900", "/接入对话"), "100"))
+        await plugin._timeout_conversation(FakeEvent(bot, "100"), "100")
+        summary = plugin.analytics.summarize(0)
+        await plugin.terminate()
+        return summary
+
+    summary = asyncio.run(main())
+    assert "100" not in plugin.session_map
+    assert (100, "⏰ 对话时间已到，本次服务自动结束。如需继续咨询，请重新转人工") in {
+        (user_id, message) for _, user_id, message in bot.sent
+    }
+    assert summary["900"]["accepted"] == 1
+    assert (tmp_path / "analytics.json.broken").exists()
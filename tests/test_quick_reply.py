@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+from human_service.quick_reply import QuickReplyStore
+
+
+def make_store():
+    store = QuickReplyStore()
+    store.add("#退", "共用-退")
+    store.add("#退款", "共用-退款")
+    store.add("#退款", "个人-退款", "900")
+    store.add("#退款进度", "个人-退款进度", "901")
+    return store
+
+
+def test_expand_prefers_longest_trigger():
+    store = make_store()
+
+    match = store.expand("#退款进度", "901")
+    assert (match.scope, match.trigger, match.text) == ("901", "#退款进度", "个人-退款进度")
+    assert store.expand("#退款 进度", "901").trigger == "#退款"
+    assert store.expand("#退", "901").trigger == "#退"
+    assert store.expand("#退款进度", "900") is None
+
+
+def test_expand_prefers_personal_reply_on_tie():
+    store = make_store()
+
+    assert store.expand("#退款", "900").scope == "900"
+    assert store.expand("#退款", "901").scope == QuickReplyStore.SHARED
+
+
+def test_expand_appends_trailing_text_after_whitespace():
+    store = make_store()
+
+    match = store.expand("#退款  订单 123 ", "900")
+    assert match.text == "个人-退款\n订单 123" and match.has_extra
+    assert not store.expand("#退款 ", "900").has_extra
+    # 触发词后紧跟其他字符时不展开为较短的触发词
+    assert store.expand("#退款啊", "901") is None
+    assert store.expand("退款", "900") is None
+
+
+def test_translation_cache_is_dropped_when_reply_changes():
+    store = make_store()
+    match = store.expand("#退款", "900")
+    store.set_translation(match, "英文", "refund")
+    shared = store.expand("#退款", "901")
+    store.set_translation(shared, "英文", "shared refund")
+
+    assert store.get_translation(store.expand("#退款", "900"), "英文") == "refund"
+    assert store.get_translation(store.expand("#退款 订单", "900"), "英文") is None
+
+    store.add("#退款", "新的个人-退款", "900")
+    assert store.get_translation(store.expand("#退款", "900"), "英文") is None
+    assert store.get_translation(store.expand("#退款", "901"), "英文") == "shared refund"
+
+    store.remove("#退款")
+    assert store.get_translation(shared, "英文") is None
+
+
+def test_saves_are_debounced_and_written_in_background(tmp_path):
+    data_file = tmp_path / "quick_replies.json"
+    store = QuickReplyStore(data_file, save_delay=0.01)
+    writes = []
+    write = store._write
+    store._write = lambda replies: (writes.append(replies), write(replies))
+
+    async def main():
+        store.add("#a", "A")
+        store.add("#b", "B", "900")
+        assert not data_file.exists()
+        await store.flush()
+
+    asyncio.run(main())
+    assert len(writes) == 1
+    assert json.loads(data_file.read_text(encoding="utf-8"))["replies"] == {"*": {"#a": "A"}, "900": {"#b": "B"}}
+
+
+def test_load_async_merges_with_replies_added_while_loading(tmp_path):
+    data_file = tmp_path / "quick_replies.json"
+    data_file.write_text(json.dumps({"version": 1, "replies": {"*": {"#a": "旧A", "#c": "C"}}}), encoding="utf-8")
+    store = QuickReplyStore(data_file, save_delay=0, autoload=False)
+
+    async def main():
+        store.add("#a", "新A")
+        await store.load_async()
+        await store.flush()
+
+    asyncio.run(main())
+    assert store.expand("#c", "900").text == "C"
+    assert json.loads(data_file.read_text(encoding="utf-8"))["replies"] == {"*": {"#a": "新A", "#c": "C"}}
+
+
+def test_broken_file_is_set_aside(tmp_path):
+    data_file = tmp_path / "quick_replies.json"
+    data_file.write_text("{broken", encoding="utf-8")
+    store = QuickReplyStore(data_file, save_delay=0, autoload=False)
+
+    async def main():
+        try:
+            await store.load_async()
+        except ValueError:
+            pass
+        store.add("#a", "A")
+        await store.flush()
+
+    asyncio.run(main())
+    assert (tmp_path / "quick_replies.json.broken").exists()
+    assert json.loads(data_file.read_text(encoding="utf-8"))["replies"] == {"*": {"#a": "A"}}
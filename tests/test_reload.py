@@ -0,0 +1,28 @@
+import asyncio
+
+from plugin_harness import make_plugin
+
+
+def test_reload_keeps_timer_and_warning_state(tmp_path):
+    config = {
+        "servicers_id": ["900", "901"],
+        "enable_analytics": False,
+        "enable_chat_history": True,
+        "enable_translation": False,
+        "conversation_timeout": 600,
+        "timeout_warning_seconds": 120,
+    }
+    plugin = make_plugin(tmp_path, **config)
+    manager = plugin.timeout_manager
+    manager.start_timer("100")
+    manager.mark_warned("100")
+    started = manager.timers["100"]
+
+    changes, errors = asyncio.run(plugin.reload_config({**config, "conversation_timeout": 900, "selection_timeout": 60}))
+
+    assert not errors and changes
+    assert plugin.timeout_manager is manager
+    assert manager.timers == {"100": started}
+    assert "100" in manager.warned
+    assert manager.get_remaining_time("100") > 600
+    assert plugin.selection_map.ttl == 60
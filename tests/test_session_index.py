@@ -0,0 +1,77 @@
+import asyncio
+
+from human_service.session_index import DeliveryTarget, SessionMap, delivery_target
+from plugin_harness import FakeBot, FakeEvent, make_plugin, run
+
+
+def test_delivery_target_normalizes_group_and_private():
+    assert delivery_target("123", "100") == DeliveryTarget(123, 100)
+    assert delivery_target("0", "100") == DeliveryTarget(0, 100)
+    assert delivery_target(None, 100).key == "u100"
+    assert delivery_target(123, 100).key == "123"
+
+
+def test_session_map_indexes_group_sessions():
+    sessions = SessionMap()
+    sessions["100"] = {"group_id": "123"}
+    sessions["101"] = {"group_id": 123}
+    sessions["102"] = {"group_id": ""}
+
+    assert sessions.has_group("123") and sessions.has_group(123)
+    assert sessions.get_group_users("123") == {"100", "101"}
+    assert sessions.get_target("101") == DeliveryTarget(123, 101)
+    assert sessions.get_target("102") == DeliveryTarget(0, 102)
+    assert not sessions.has_group("0")
+
+    del sessions["100"]
+    assert sessions.get_group_users("123") == {"101"}
+    sessions.pop("101")
+    assert not sessions.has_group("123")
+    assert sessions.get_target("101") is None
+    assert list(sessions) == ["102"]
+
+
+def test_session_map_moves_rewritten_session_to_new_group():
+    sessions = SessionMap()
+    sessions["100"] = {"group_id": "123"}
+    sessions["100"] = {"group_id": "456"}
+
+    assert not sessions.has_group("123")
+    assert sessions.get_group_users("456") == {"100"}
+    assert sessions.get_target("100") == DeliveryTarget(456, 100)
+
+
+def test_idle_group_rules(tmp_path):
+    plugin = make_plugin(tmp_path)
+    bot = FakeBot()
+    plugin.session_map["100"] = {"servicer_id": "900", "status": "connected", "group_id": "123"}
+    plugin.selection_map["101"] = {"group_id": "456"}
+
+    assert not plugin._is_idle_group_event(FakeEvent(bot, "200", group_id="123"))
+    assert not plugin._is_idle_group_event(FakeEvent(bot, "200"))
+    assert not plugin._is_idle_group_event(FakeEvent(bot, "900", group_id="456"))
+    assert not plugin._is_idle_group_event(FakeEvent(bot, "101", group_id="456"))
+    assert plugin._is_idle_group_event(FakeEvent(bot, "200", group_id="456"))
+
+
+def test_idle_group_messages_are_dropped_before_checks(tmp_path):
+    plugin = make_plugin(tmp_path)
+    bot = FakeBot()
+    checks = []
+
+    async def check_conversation_timeout(event):
+        checks.append(event.sender_id)
+
+    plugin.check_conversation_timeout = check_conversation_timeout
+
+    async def main():
+        for _ in range(5):
+            await run(plugin.handle_match(FakeEvent(bot, "200", "你好", group_id="456")))
+        plugin._last_checks -= plugin.IDLE_CHECK_INTERVAL
+        await run(plugin.handle_match(FakeEvent(bot, "201", "你好", group_id="456")))
+        await run(plugin.handle_match(FakeEvent(bot, "202", "你好")))
+        await plugin.terminate()
+
+    asyncio.run(main())
+    assert checks == ["200", "201", "202"]
+    assert bot.sent == []
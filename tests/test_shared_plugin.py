@@ -0,0 +1,67 @@
+import asyncio
+
+from plugin_harness import FakeBot, FakeEvent, make_plugin, run
+
+
+def test_remote_blacklist_ends_local_session_and_queue(tmp_path):
+    plugin = make_plugin(tmp_path, servicers_id=["900", "901"], shared_state_db=str(tmp_path / "shared.db"))
+    bot = FakeBot()
+
+    async def main():
+        store = await plugin._connect_shared_state()
+        plugin.session_manager.create_session("100", {"servicer_id": "900", "status": "connected", "group_id": ""})
+        plugin.timeout_manager.start_timer("100")
+        plugin.add_to_queue("901", "101", "用户101", "")
+        # 其他实例中的客服 950 拉黑了这两位用户
+        store.pending_changes.append({"kind": "blacklist_add", "user_id": "100", "servicer_id": "950", "duration": 0})
+        store.pending_changes.append({"kind": "blacklist_add", "user_id": "101", "servicer_id": "950", "duration": 0})
+        await plugin.check_shared_changes(FakeEvent(bot, "900"))
+        keys = plugin._shared_lease_keys()
+        await plugin.terminate()
+        return keys
+
+    keys = asyncio.run(main())
+
+    assert "100" not in plugin.session_map
+    assert "100" not in plugin.conversation_timers
+    assert plugin.get_queue_position("901", "101") == 0
+    assert plugin.is_user_blacklisted("100") and plugin.is_user_blacklisted("101")
+    assert not keys
+    sent = {(user_id, message) for _, user_id, message in bot.sent}
+    assert (100, "您已被客服拉黑，对话已结束") in sent
+    assert (101, "您已被客服拉黑，已退出排队") in sent
+    assert any(user_id == 900 and "已被拉黑" in message for user_id, message in sent)
+
+
+def test_failed_transfer_releases_user_lease(tmp_path):
+    plugin = make_plugin(tmp_path, shared_state_db=str(tmp_path / "shared.db"))
+    bot = FakeBot()
+    plugin.add_to_blacklist("100", "900")
+
+    async def main():
+        replies = await run(plugin.transfer_to_human(FakeEvent(bot, "100", "/转人工")))
+        store = await plugin._connect_shared_state()
+        owners = await asyncio.to_thread(
+            lambda: store._conn.execute("SELECT key FROM leases").fetchall()
+        )
+        await plugin.terminate()
+        return replies, owners
+
+    replies, owners = asyncio.run(main())
+    assert replies == ["⚠ 您已被拉黑"]
+    assert owners == []
+
+
+def test_unreadable_shared_db_falls_back_to_single_instance(tmp_path):
+    (tmp_path / "shared.db").mkdir()
+    plugin = make_plugin(tmp_path, servicers_id=["900"], shared_state_db=str(tmp_path / "shared.db"))
+    bot = FakeBot()
+
+    async def main():
+        replies = await run(plugin.transfer_to_human(FakeEvent(bot, "100", "/转人工")))
+        await plugin.terminate()
+        return replies
+
+    assert asyncio.run(main()) == ["正在等待客服👤接入..."]
+    assert plugin.shared_state is None
+    assert not plugin.is_servicer_busy("900")
@@ -0,0 +1,92 @@
+import asyncio
+import importlib.util
+import logging
+import sys
+import time
+import types
+
+if importlib.util.find_spec("astrbot") is None:
+    # 共享状态模块只用到 AstrBot 的日志对象
+    sys.modules.setdefault("astrbot", types.ModuleType("astrbot"))
+    sys.modules.setdefault("astrbot.api", types.ModuleType("astrbot.api"))
+    sys.modules["astrbot.api"].logger = logging.getLogger("astrbot")
+
+from human_service.shared_state import SharedStateStore
+
+
+def make_stores(tmp_path, *instance_ids, lease_ttl=120):
+    db_path = tmp_path / "shared.db"
+    return [SharedStateStore(db_path, instance_id, lease_ttl=lease_ttl) for instance_id in instance_ids]
+
+
+def enqueue(store, user_id, servicer_id="900"):
+    store._transaction(store._claim, store.user_key(user_id), "transfer")
+    store._sync_queue([(user_id, servicer_id)])
+
+
+def test_dequeue_skips_rows_without_live_owner_lease(tmp_path):
+    a, b, c = make_stores(tmp_path, "a", "b", "c")
+    enqueue(a, "10001")
+    enqueue(b, "10002")
+    # 实例 a 异常退出：租约已过期，但排队记录还在
+    a._conn.execute("UPDATE leases SET expire_at = ? WHERE instance_id = 'a'", (time.time() - 1,))
+
+    entry = c._transaction(c._dequeue, "900")
+
+    assert entry["user_id"] == "10002"
+    assert c._transaction(c._dequeue, "900") is None
+
+
+def test_sync_collects_orphaned_rows(tmp_path):
+    a, b = make_stores(tmp_path, "a", "b")
+    enqueue(a, "10001")
+    a._conn.execute("UPDATE leases SET expire_at = ? WHERE instance_id = 'a'", (time.time() - 1,))
+
+    b._transaction(b._sync_leases, set())
+
+    assert b._conn.execute("SELECT COUNT(*) FROM queue").fetchone()[0] == 0
+
+
+def test_stale_assigned_rows_are_requeued(tmp_path):
+    a, b = make_stores(tmp_path, "a", "b", lease_ttl=10)
+    enqueue(a, "10001")
+    assert b._transaction(b._dequeue, "900")["user_id"] == "10001"
+    assert b._transaction(b._dequeue, "900") is None
+    # 分配通知丢失，所属实例一直没有处理
+    b._conn.execute("UPDATE queue SET assigned = ?", (time.time() - 11,))
+
+    b._transaction(b._sync_leases, set())
+    a._sync_queue([("10001", "900")])
+
+    assert b._transaction(b._dequeue, "900")["user_id"] == "10001"
+
+
+def test_own_rows_survive_collection(tmp_path):
+    (a,) = make_stores(tmp_path, "a")
+    enqueue(a, "10001")
+
+    a._transaction(a._sync_leases, {a.user_key("10001")})
+
+    assert a._conn.execute("SELECT user_id FROM queue").fetchall() == [("10001",)]
+
+
+def test_close_releases_rows(tmp_path):
+    a, b = make_stores(tmp_path, "a", "b")
+    enqueue(a, "10001")
+
+    asyncio.run(a.close())
+
+    assert b._transaction(b._dequeue, "900") is None
+
+
+def test_sync_keeps_leases_claimed_after_snapshot(tmp_path):
+    a, b = make_stores(tmp_path, "a", "b")
+    snapshot_cutoff = time.time() - a.claim_grace
+    # 本地状态尚未写入时获取的租约不在快照中
+    assert a._transaction(a._claim, a.user_key("10001"), "transfer") == "a"
+
+    a._transaction(a._sync_leases, set(), snapshot_cutoff)
+    assert b._transaction(b._claim, b.user_key("10001"), "transfer") == "a"
+
+    a._transaction(a._sync_leases, set(), time.time() + 1)
+    assert b._transaction(b._claim, b.user_key("10001"), "transfer") == "b"
@@ -0,0 +1,82 @@
+import time
+
+from human_service.silence_rules import CommandTrie, SilenceRuleEngine
+
+
+def test_trie_matches_whole_command_only():
+    trie = CommandTrie(["转人工", "转人机", "拉黑", "取消拉黑", "  "])
+
+    assert trie.match("转人工")
+    assert trie.match("转人工 附加内容")
+    assert trie.match("拉黑\t123456")
+    assert trie.match("取消拉黑 123456")
+    assert not trie.match("转人工吧")
+    assert not trie.match("转人")
+    assert not trie.match("拉黑名单")
+    assert not trie.match("")
+    assert not trie.match(" 转人工")
+
+
+def test_trie_prefers_completed_shorter_command_before_space():
+    trie = CommandTrie(["查看", "查看黑名单"])
+
+    assert trie.match("查看 黑名单")
+    assert trie.match("查看黑名单 2")
+    assert not trie.match("查看黑")
+
+
+def make_engine(wake_prefixes=("/",), allowed=("签到",)):
+    sessions = {"100": {"status": "connected"}}
+    selections = {"200": {}}
+    return SilenceRuleEngine(True, ["900"], (sessions, selections), list(allowed), list(wake_prefixes))
+
+
+def test_wake_prefix_is_stripped_before_matching():
+    engine = make_engine(wake_prefixes=("/", "//", "#"))
+
+    assert not engine.should_block("300", "/转人工")
+    assert not engine.should_block("300", "//转人工")
+    assert not engine.should_block("300", "#签到")
+    assert not engine.should_block("300", "转人工")
+    # 只去掉一个前缀
+    assert engine.should_block("300", "/#签到")
+    assert engine.should_block("300", "/天气")
+
+
+def test_empty_wake_prefix_is_ignored():
+    engine = make_engine(wake_prefixes=("", "/"))
+
+    assert not engine.should_block("300", "/签到")
+    assert engine.should_block("300", "你好")
+
+
+def test_servicers_and_captured_users_are_never_blocked():
+    engine = make_engine()
+
+    assert not engine.should_block("900", "随便聊聊")
+    assert not engine.should_block("100", "你好")
+    assert not engine.should_block("200", "1")
+    assert engine.should_block("300", "你好")
+
+
+def test_disabled_engine_blocks_nothing_and_recompiles():
+    engine = make_engine()
+    engine.compile(False, ["900"])
+    assert not engine.should_block("300", "你好")
+
+    engine.compile(True, ["300"], ["天气"])
+    assert not engine.should_block("300", "你好")
+    assert not engine.should_block("301", "/天气")
+    assert engine.should_block("301", "/签到")
+
+
+def test_throughput_exceeds_ten_thousand_events_per_second():
+    engine = make_engine()
+    events = [(str(300 + i % 500), "/转人工" if i % 2 else "普通聊天消息") for i in range(20_000)]
+
+    started = time.perf_counter()
+    for sender_id, text in events:
+        engine.should_block(sender_id, text)
+    elapsed = time.perf_counter() - started
+
+    assert len(events) / elapsed > 10_000
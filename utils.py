@@ -98,3 +98,31 @@ def replace_with_random_text(ob_message, random_chars: str):
                         return [segment]
     return ob_message
 
+
+
+def parse_duration(text: str) -> Optional[int]:
+    """解析时长文本，返回秒数
+
+    支持纯数字（秒）或带单位的写法：30s、10m、2h、7d，也支持中文单位：秒、分钟、小时、天
+    无法解析时返回None
+    """
+    units = {
+        "s": 1, "秒": 1,
+        "m": 60, "分": 60, "分钟": 60,
+        "h": 3600, "时": 3600, "小时": 3600,
+        "d": 86400, "天": 86400,
+    }
+    text = text.strip().lower()
+    number = text.rstrip("".join(units))
+    unit = text[len(number):]
+    if not number.isdigit() or (unit and unit not in units):
+        return None
+    return int(number) * units.get(unit, 1)
+
+
+def format_duration(seconds: int) -> str:
+    """将秒数格式化为易读的时长文本"""
+    for unit_seconds, unit_name in ((86400, "天"), (3600, "小时"), (60, "分钟")):
+        if seconds >= unit_seconds and seconds % unit_seconds == 0:
+            return f"{seconds // unit_seconds}{unit_name}"
+    return f"{seconds}秒"